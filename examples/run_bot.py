@@ -1,7 +1,7 @@
 import asyncio
 import logging
 
-from lct_dendrology.bot.bot import create_application
+from lct_dendrology.bot.bot import create_application, run_webhook
 from lct_dendrology.cfg import settings
 
 
@@ -27,10 +27,13 @@ def main() -> None:
     # Создаем приложение бота
     application = create_application(settings.telegram_bot_token)
     
-    logger.info("Бот успешно инициализирован. Запуск polling...")
-    
     # Запускаем бота
-    application.run_polling(close_loop=False)
+    if settings.bot_webhook_url:
+        logger.info("Бот успешно инициализирован. Запуск webhook...")
+        asyncio.run(run_webhook(application))
+    else:
+        logger.info("Бот успешно инициализирован. Запуск polling...")
+        application.run_polling(close_loop=False)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,127 @@
+"""
+Дедлайны запросов и отмена заброшенной работы.
+
+Клиент передает абсолютный дедлайн (unix-время в секундах) в заголовке
+X-Request-Deadline. Сервер не начинает обработку просроченных запросов,
+прекращает классификацию кропов после дедлайна или отключения клиента и
+ведет учет сэкономленного и потраченного впустую времени вычислений.
+"""
+
+import threading
+import time
+from typing import Any, Dict, Optional
+
+DEADLINE_HEADER = "X-Request-Deadline"
+
+
+class DeadlineExceeded(Exception):
+    """Дедлайн запроса истек или клиент отключился."""
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        super().__init__(f"Дедлайн запроса истек на этапе: {stage}")
+
+
+class RequestDeadline:
+    """Дедлайн одного запроса с возможностью явной отмены."""
+
+    def __init__(self, deadline: Optional[float] = None):
+        """
+        Args:
+            deadline: Абсолютный дедлайн (unix-время в секундах), None - без дедлайна
+        """
+        self.deadline = deadline
+        self._cancelled = threading.Event()
+
+    @classmethod
+    def from_header(cls, value: Optional[str]) -> "RequestDeadline":
+        """Создает дедлайн из значения заголовка; некорректное значение игнорируется."""
+        try:
+            return cls(float(value)) if value else cls()
+        except ValueError:
+            return cls()
+
+    def cancel(self) -> None:
+        """Отменяет запрос (например, при отключении клиента)."""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def remaining(self) -> Optional[float]:
+        """Оставшееся время в секундах или None, если дедлайн не задан."""
+        return None if self.deadline is None else self.deadline - time.time()
+
+    def expired(self) -> bool:
+        return self.cancelled or (self.deadline is not None and time.time() >= self.deadline)
+
+    def check(self, stage: str) -> None:
+        """
+        Проверяет дедлайн.
+        Raises:
+            DeadlineExceeded: Если дедлайн истек или запрос отменен
+        """
+        if self.expired():
+            raise DeadlineExceeded(stage)
+
+
+class DeadlineStats:
+    """Счетчики сэкономленных и потраченных впустую вычислений."""
+
+    def __init__(self, ewma_alpha: float = 0.2):
+        self.ewma_alpha = ewma_alpha
+        self._lock = threading.Lock()
+        self._processing_ewma: Optional[float] = None
+        self.completed = 0
+        self.dropped_in_queue = 0
+        self.aborted_in_progress = 0
+        self.completed_late = 0
+        self.client_disconnects = 0
+        self.wasted_seconds = 0.0
+        self.saved_seconds = 0.0
+
+    def _expected_processing(self) -> float:
+        return self._processing_ewma or 0.0
+
+    def record_completed(self, spent: float, late: bool = False) -> None:
+        """Обработка завершена; если дедлайн уже истек, все время потрачено впустую."""
+        with self._lock:
+            self.completed += 1
+            if self._processing_ewma is None:
+                self._processing_ewma = spent
+            else:
+                self._processing_ewma += self.ewma_alpha * (spent - self._processing_ewma)
+            if late:
+                self.completed_late += 1
+                self.wasted_seconds += spent
+
+    def record_dropped(self) -> None:
+        """Просроченный запрос снят с очереди до начала обработки."""
+        with self._lock:
+            self.dropped_in_queue += 1
+            self.saved_seconds += self._expected_processing()
+
+    def record_aborted(self, spent: float) -> None:
+        """Обработка прервана после дедлайна: потраченное время потеряно, остаток сэкономлен."""
+        with self._lock:
+            self.aborted_in_progress += 1
+            self.wasted_seconds += spent
+            self.saved_seconds += max(0.0, self._expected_processing() - spent)
+
+    def record_disconnect(self) -> None:
+        with self._lock:
+            self.client_disconnects += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'completed': self.completed,
+                'completed_late': self.completed_late,
+                'dropped_in_queue': self.dropped_in_queue,
+                'aborted_in_progress': self.aborted_in_progress,
+                'client_disconnects': self.client_disconnects,
+                'wasted_seconds': self.wasted_seconds,
+                'saved_seconds': self.saved_seconds,
+                'processing_ewma': self._processing_ewma,
+            }
@@ -0,0 +1,131 @@
+"""
+Индекс недавно обработанных изображений для поиска почти-дубликатов.
+
+Telegram пережимает фотографии при пересылке, поэтому байты повторно
+отправленного снимка отличаются и точный хэш не совпадает. Индекс хранит
+перцептивные хэши миниатюр и позволяет переиспользовать готовый результат
+анализа для визуально того же изображения.
+"""
+
+import copy
+import io
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from PIL import Image
+
+from lct_dendrology.inference.phash import HammingLRU, phash
+
+# Допустимое расхождение соотношения сторон, при котором изображения считаются одинаковыми
+ASPECT_RATIO_TOLERANCE = 0.02
+THUMBNAIL_SIZE = 64
+
+
+def image_fingerprint(image_bytes: bytes) -> Tuple[int, Tuple[int, int]]:
+    """
+    Вычисляет pHash по миниатюре, декодированной с уменьшением (для JPEG - в DCT).
+    Returns:
+        Tuple[int, Tuple[int, int]]: хэш и исходный размер изображения (ширина, высота)
+    """
+    img = Image.open(io.BytesIO(image_bytes))
+    size = img.size
+    img.draft("L", (THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+    return phash(img.convert("L")), size
+
+
+def rescale_detections(analysis: Dict[str, Any], scale_x: float, scale_y: float) -> None:
+    """Масштабирует координаты детекций результата анализа на месте."""
+    for det in analysis.get('detections', []):
+        bbox = det.get('bbox')
+        if bbox:
+            det['bbox'] = {
+                'x1': bbox['x1'] * scale_x,
+                'y1': bbox['y1'] * scale_y,
+                'x2': bbox['x2'] * scale_x,
+                'y2': bbox['y2'] * scale_y
+            }
+        center = det.get('center')
+        if center:
+            det['center'] = {'x': center['x'] * scale_x, 'y': center['y'] * scale_y}
+        if 'width' in det:
+            det['width'] = det['width'] * scale_x
+        if 'height' in det:
+            det['height'] = det['height'] * scale_y
+        if 'area' in det:
+            det['area'] = det['area'] * scale_x * scale_y
+
+
+class DuplicateImageIndex:
+    """Ограниченный индекс результатов анализа с поиском по расстоянию Хэмминга и сроком жизни записей."""
+
+    def __init__(self, max_size: int = 1024, max_distance: int = 6, ttl: float = 3600.0):
+        """
+        Args:
+            max_size: Максимальное количество изображений в индексе
+            max_distance: Максимальное расстояние Хэмминга между pHash для совпадения
+            ttl: Время жизни записи в секундах
+        """
+        self._index = HammingLRU(max_size=max_size, max_distance=max_distance)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key: int, size: Tuple[int, int], version: str) -> Optional[Dict[str, Any]]:
+        """
+        Ищет результат анализа почти-дубликата.
+        Args:
+            key: pHash изображения
+            size: Размер изображения (ширина, высота)
+            version: Версия моделей; результаты других версий не используются
+        Returns:
+            dict: копия результата анализа с пересчитанными под размер координатами или None
+        """
+        found = self._index.get(key)
+        analysis = None
+        if found is not None:
+            distance, (stored_version, stored_size, stored_analysis, created) = found
+            if (
+                stored_version == version
+                and time.monotonic() - created <= self.ttl
+                and self._same_aspect_ratio(size, stored_size)
+            ):
+                analysis = copy.deepcopy(stored_analysis)
+                if size != stored_size:
+                    rescale_detections(analysis, size[0] / stored_size[0], size[1] / stored_size[1])
+                analysis.setdefault('model_info', {})['near_duplicate'] = {
+                    'distance': distance,
+                    'original_size': list(stored_size)
+                }
+        with self._lock:
+            if analysis is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return analysis
+
+    def add(self, key: int, size: Tuple[int, int], version: str, analysis: Dict[str, Any]) -> None:
+        """Сохраняет результат анализа изображения."""
+        self._index.put(key, (version, size, copy.deepcopy(analysis), time.monotonic()))
+
+    @staticmethod
+    def _same_aspect_ratio(size: Tuple[int, int], other: Tuple[int, int]) -> bool:
+        if not all(size) or not all(other):
+            return False
+        ratio = (size[0] / size[1]) / (other[0] / other[1])
+        return abs(ratio - 1.0) <= ASPECT_RATIO_TOLERANCE
+
+    def clear(self) -> None:
+        self._index.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            'size': len(self._index),
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / lookups if lookups else 0.0
+        }
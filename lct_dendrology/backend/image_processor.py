@@ -3,47 +3,339 @@
 """
 
 import logging
-from typing import Dict, Any, Optional
+import os
+import random
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, Any, Optional
 
-from lct_dendrology.inference import YoloDetector, YoloClassifier
+from PIL import Image
+
+from lct_dendrology.inference import (
+    YoloDetector, YoloClassifier, VegetationGate, CropCache, ModelPool, RawPredictionCache
+)
+from lct_dendrology.inference.yolo_detector import RAW_CONFIDENCE_THRESHOLD, apply_thresholds
+from lct_dendrology.inference.joint_detector import JointDetector, species_from_classes
 from lct_dendrology.cfg import settings
+from lct_dendrology.backend.model_registry import ModelRegistry, version_from_path
+from lct_dendrology.backend.duplicate_index import DuplicateImageIndex, image_fingerprint
+from lct_dendrology.backend.load_controller import QUALITY_TIERS
+from lct_dendrology.backend.deadline import RequestDeadline
 
 logger = logging.getLogger(__name__)
 
 
+def available_cpu_count() -> int:
+    """Количество ядер CPU, доступных процессу (с учетом привязки к ядрам)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def configure_torch_threads(pool_size: int, thread_budget: Optional[int] = None) -> int:
+    """
+    Делит бюджет потоков между репликами моделей: по умолчанию каждая реплика
+    использует все ядра, и параллельные реплики вытесняют друг друга.
+    Returns:
+        int: количество потоков на одну реплику
+    """
+    budget = thread_budget or available_cpu_count()
+    threads = max(1, budget // max(1, pool_size))
+    try:
+        import torch
+    except ImportError:
+        return threads
+    torch.set_num_threads(threads)
+    logger.info(f"Потоков вычислений на реплику модели: {threads} (реплик: {pool_size}, бюджет: {budget})")
+    return threads
+
+
+# Обработчик промежуточных результатов: (тип события, данные)
+ProgressCallback = Callable[[str, Dict[str, Any]], None]
+
+
+@dataclass(frozen=True)
+class ModelBundle:
+    """
+    Неизменяемый набор загруженных моделей одной версии.
+    Модели хранятся пулами реплик, поэтому набор безопасно использовать из нескольких потоков.
+    """
+    detector: Any
+    classifier: Any
+    detector_version: str
+    classifier_version: str
+    fast_classifier: Any = None
+    fast_classifier_version: Optional[str] = None
+    # Совместная модель: детектор сразу определяет породу, классификатора нет
+    joint: bool = False
+
+    @property
+    def version(self) -> str:
+        """Составная версия набора моделей (используется в ключах кэшей и метриках)."""
+        version = f"{self.detector_version}+{self.classifier_version}"
+        if self.fast_classifier_version is not None:
+            version += f"+{self.fast_classifier_version}"
+        return version
+
 
 class ImageProcessor:
     """Класс для обработки изображений: детекция и классификация деревьев."""
     def __init__(self):
+        self.registry = ModelRegistry(settings.model_registry_dir) if settings.model_registry_dir else None
+        # Блокировка сериализует перезагрузки; чтение self._bundle атомарно
+        self._reload_lock = threading.Lock()
+        self._watcher_stop = threading.Event()
+        self._watcher_thread: Optional[threading.Thread] = None
+        self.last_reload_error: Optional[str] = None
+        self._stats_lock = threading.Lock()
+        # Накопленная статистика маршрутизации кропов по стадиям каскада
+        self._routing_totals = {'total': 0, 'cached': 0, 'fast': 0, 'heavy': 0, 'skipped': 0}
+        # Статистика фильтра изображений без растительности
+        self._gate_stats = {'checked': 0, 'skipped': 0, 'audited': 0, 'false_skips': 0}
+        # Реплик каждой модели столько же, сколько потоков инференса
+        self.model_pool_size = settings.model_pool_size or settings.inference_workers
+        self.threads_per_replica: Optional[int] = None
         if settings.model_enable_inference:
-            self.detector = YoloDetector(
-                model_path=settings.tree_detector_model_path,
+            self.threads_per_replica = configure_torch_threads(self.model_pool_size, settings.model_thread_budget)
+            self._bundle: Optional[ModelBundle] = self._load_bundle()
+        else:
+            self._bundle = None
+        self.crop_cache = None
+        if settings.crop_cache_enabled:
+            self.crop_cache = CropCache(
+                max_size=settings.crop_cache_size,
+                max_distance=settings.crop_cache_max_distance
+            )
+        self.duplicate_index = None
+        if settings.duplicate_index_enabled:
+            self.duplicate_index = DuplicateImageIndex(
+                max_size=settings.duplicate_index_size,
+                max_distance=settings.duplicate_index_max_distance,
+                ttl=settings.duplicate_index_ttl
+            )
+        self.raw_cache = None
+        if settings.raw_prediction_cache_size > 0:
+            self.raw_cache = RawPredictionCache(max_size=settings.raw_prediction_cache_size)
+        self.gate = None
+        if settings.model_enable_inference and settings.gate_enabled:
+            self.gate = VegetationGate(
+                model_path=settings.gate_model_path,
+                device=settings.model_device,
+                threshold=settings.gate_threshold,
+                thumbnail_size=settings.gate_thumbnail_size,
+                pool_size=self.model_pool_size
+            )
+        self.class_confidence_threshold = settings.classifier_confidence_threshold
+        self.cascade_margin = settings.classifier_cascade_margin
+        self.min_crop_size = settings.classifier_min_crop_size
+        self.min_detection_confidence = settings.classifier_min_detection_confidence
+
+    @property
+    def detector(self):
+        return None if self._bundle is None else self._bundle.detector
+
+    @property
+    def classifier(self):
+        return None if self._bundle is None else self._bundle.classifier
+
+    @property
+    def model_version(self) -> Optional[str]:
+        return None if self._bundle is None else self._bundle.version
+
+    def _resolve_model(self, kind: str, default_path: str, version: Optional[str]):
+        """Возвращает (версия, путь) модели из реестра или из настроек."""
+        if self.registry is not None and self.registry.list_versions(kind):
+            return self.registry.resolve(kind, version)
+        if default_path is None:
+            raise FileNotFoundError(f"Не задан путь к модели {kind}")
+        if version is not None and version != version_from_path(default_path):
+            raise FileNotFoundError(
+                f"Версия {version} модели {kind} недоступна, доступна только {version_from_path(default_path)}"
+            )
+        return version_from_path(default_path), default_path
+
+    def _load_bundle(
+        self,
+        detector_version: Optional[str] = None,
+        classifier_version: Optional[str] = None
+    ) -> ModelBundle:
+        """
+        Загружает детектор и классификатор указанных версий.
+        Если включена совместная модель, загружается только она (версия задается detector_version).
+        """
+        pool_size = self.model_pool_size
+        if settings.joint_model_enabled:
+            joint_version, joint_path = self._resolve_model("joint", settings.joint_model_path, detector_version)
+            detector = ModelPool(lambda: JointDetector(
+                model_path=joint_path,
                 device=settings.model_device,
                 confidence_threshold=settings.tree_detector_confidence_threshold,
                 iou_threshold=settings.tree_detector_iou_threshold
+            ), pool_size)
+            return ModelBundle(detector, None, joint_version, "joint", joint=True)
+        detector_version, detector_path = self._resolve_model(
+            "detector", settings.tree_detector_model_path, detector_version
+        )
+        classifier_version, classifier_path = self._resolve_model(
+            "classifier", settings.classifier_model_path, classifier_version
+        )
+        detector = ModelPool(lambda: YoloDetector(
+            model_path=detector_path,
+            device=settings.model_device,
+            confidence_threshold=settings.tree_detector_confidence_threshold,
+            iou_threshold=settings.tree_detector_iou_threshold
+        ), pool_size)
+        classifier = ModelPool(lambda: YoloClassifier(
+            model_path=classifier_path,
+            device=settings.model_device
+        ), pool_size)
+        fast_classifier = None
+        fast_classifier_version = None
+        if settings.classifier_cascade_enabled:
+            fast_classifier_version, fast_classifier_path = self._resolve_model(
+                "classifier_fast", settings.classifier_fast_model_path, None
             )
-            self.classifier = YoloClassifier(
-                model_path=settings.classifier_model_path,
+            fast_classifier = ModelPool(lambda: YoloClassifier(
+                model_path=fast_classifier_path,
                 device=settings.model_device
-            )
-        else:
-            self.detector = None
-            self.classifier = None
-        self.class_confidence_threshold = settings.classifier_confidence_threshold
+            ), pool_size)
+        return ModelBundle(
+            detector, classifier, detector_version, classifier_version,
+            fast_classifier, fast_classifier_version
+        )
+
+    @staticmethod
+    def _warmup(bundle: ModelBundle) -> None:
+        """Прогоняет модели на пустом изображении, чтобы первый запрос не платил за инициализацию."""
+        blank = Image.new("RGB", (64, 64))
+        for pool in (bundle.detector, bundle.classifier, bundle.fast_classifier):
+            if pool is None:
+                continue
+            # Прогреваем каждую реплику пула
+            for replica in pool.replicas:
+                replica.predict(blank)
+
+    def reload_models(
+        self,
+        detector_version: Optional[str] = None,
+        classifier_version: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Загружает новую версию моделей, прогревает ее и атомарно подменяет текущую.
+        Запросы, начатые до подмены, завершаются на старой версии.
+        Args:
+            detector_version: Версия детектора. По умолчанию последняя в реестре
+            classifier_version: Версия классификатора. По умолчанию последняя в реестре
+        Returns:
+            dict: старая и новая версии моделей
+        """
+        if not settings.model_enable_inference:
+            raise RuntimeError("Инференс модели отключен в настройках")
+        with self._reload_lock:
+            previous = self.model_version
+            try:
+                bundle = self._load_bundle(detector_version, classifier_version)
+                if settings.model_warmup_enabled:
+                    self._warmup(bundle)
+            except Exception as e:
+                self.last_reload_error = str(e)
+                logger.error(f"Ошибка при перезагрузке моделей: {str(e)}")
+                raise
+            self._bundle = bundle
+            self.last_reload_error = None
+            if self.crop_cache is not None:
+                self.crop_cache.clear()
+            if self.duplicate_index is not None:
+                self.duplicate_index.clear()
+            if self.raw_cache is not None:
+                self.raw_cache.clear()
+            logger.info(f"Модели переключены: {previous} -> {bundle.version}")
+            return {'previous_version': previous, 'model_version': bundle.version}
 
-    def process_image(self, image_bytes: bytes) -> Dict[str, Any]:
+    def _check_registry(self) -> None:
+        """Перезагружает модели, если в реестре появились новые версии."""
+        bundle = self._bundle
+        if self.registry is None or bundle is None:
+            return
+        if bundle.joint:
+            joint_version = self.registry.latest_version("joint")
+            if joint_version not in (None, bundle.detector_version):
+                logger.info(f"В реестре обнаружена новая версия совместной модели: {joint_version}")
+                self.reload_models(joint_version)
+            return
+        detector_version = self.registry.latest_version("detector") or bundle.detector_version
+        classifier_version = self.registry.latest_version("classifier") or bundle.classifier_version
+        fast_changed = (
+            bundle.fast_classifier is not None
+            and self.registry.latest_version("classifier_fast") not in (None, bundle.fast_classifier_version)
+        )
+        if fast_changed or (detector_version, classifier_version) != (bundle.detector_version, bundle.classifier_version):
+            logger.info(f"В реестре обнаружены новые версии моделей: {detector_version}+{classifier_version}")
+            self.reload_models(detector_version, classifier_version)
+
+    def _watch_registry(self, interval: float) -> None:
+        while not self._watcher_stop.wait(interval):
+            try:
+                self._check_registry()
+            except Exception as e:
+                logger.error(f"Ошибка при проверке реестра моделей: {str(e)}")
+
+    def start_registry_watcher(self) -> None:
+        """Запускает фоновое отслеживание новых версий в реестре моделей."""
+        interval = settings.model_registry_poll_interval
+        if self.registry is None or interval <= 0 or self._watcher_thread is not None:
+            return
+        self._watcher_stop.clear()
+        self._watcher_thread = threading.Thread(
+            target=self._watch_registry, args=(interval,), name="model-registry-watcher", daemon=True
+        )
+        self._watcher_thread.start()
+        logger.info(f"Отслеживание реестра моделей {self.registry.root} каждые {interval} с")
+
+    def stop_registry_watcher(self) -> None:
+        """Останавливает фоновое отслеживание реестра моделей."""
+        if self._watcher_thread is None:
+            return
+        self._watcher_stop.set()
+        self._watcher_thread.join()
+        self._watcher_thread = None
+
+    def process_image(
+        self,
+        image_bytes: bytes,
+        quality_tier: int = 0,
+        deadline: Optional[RequestDeadline] = None,
+        conf: Optional[float] = None,
+        iou: Optional[float] = None,
+        species_conf: Optional[float] = None,
+        on_progress: Optional[ProgressCallback] = None
+    ) -> Dict[str, Any]:
         """
         Находит деревья на изображении и классифицирует их породу.
         Проверяет, что изображение валидное.
         Args:
             image_bytes: Байты изображения
+            quality_tier: Уровень деградации качества под нагрузкой (0 - полное качество),
+                см. QUALITY_TIERS
+            deadline: Дедлайн запроса; после его истечения обработка прерывается
+            conf: Порог уверенности детектора для этого запроса (по умолчанию из настроек)
+            iou: Порог IoU для NMS для этого запроса (по умолчанию из настроек)
+            species_conf: Порог уверенности классификатора пород для этого запроса
+            on_progress: Вызывается из потока обработки с промежуточными результатами:
+                'detections' - сразу после детекции, 'species' - по мере классификации кропов
         Returns:
             dict: результат анализа
+        Raises:
+            DeadlineExceeded: Если дедлайн истек до завершения обработки
         """
-        from PIL import Image, UnidentifiedImageError
+        from PIL import UnidentifiedImageError
         import io
+        # Фиксируем набор моделей на время запроса: подмена версии его не затронет
+        bundle = self._bundle
         result = {
-            'inference_enabled': settings.model_enable_inference
+            'inference_enabled': settings.model_enable_inference,
+            'model_version': None if bundle is None else bundle.version
         }
         # Проверка валидности изображения
         try:
@@ -64,48 +356,360 @@ class ImageProcessor:
             }
             return result
 
-        # Детектируем деревья
-        detection_result = self.detector.predict(image_bytes)
+        thresholds = {'conf': conf, 'iou': iou, 'species_conf': species_conf}
+        custom_thresholds = any(value is not None for value in thresholds.values())
+        # Поиск почти-дубликата среди недавно обработанных изображений
+        # (результаты хранятся только для порогов по умолчанию)
+        fingerprint = None
+        if self.duplicate_index is not None and not custom_thresholds:
+            fingerprint = image_fingerprint(image_bytes)
+            duplicate = self.duplicate_index.lookup(*fingerprint, bundle.version)
+            if duplicate is not None:
+                logger.info(f"Найден почти-дубликат изображения: {duplicate['model_info']['near_duplicate']}")
+                return duplicate
+
+        self._analyze(
+            bundle, image_bytes, result, quality_tier, deadline or RequestDeadline(),
+            on_progress=on_progress, **thresholds
+        )
+        result['model_info']['quality_tier'] = quality_tier
+        result['model_info']['quality_tier_name'] = QUALITY_TIERS[quality_tier]
+        # Результаты пониженного качества не сохраняются, чтобы не выдавать их позже как полные
+        if fingerprint is not None and quality_tier == 0:
+            self.duplicate_index.add(*fingerprint, bundle.version, result)
+        return result
+
+    def _analyze(
+        self,
+        bundle: ModelBundle,
+        image_bytes: bytes,
+        result: Dict[str, Any],
+        quality_tier: int = 0,
+        deadline: Optional[RequestDeadline] = None,
+        conf: Optional[float] = None,
+        iou: Optional[float] = None,
+        species_conf: Optional[float] = None,
+        on_progress: Optional[ProgressCallback] = None
+    ) -> None:
+        """Заполняет результат анализа: фильтр растительности, детекция и классификация."""
+        import io
+        deadline = deadline or RequestDeadline()
+        # Фильтр изображений без растительности
+        gate_result = self._check_gate(image_bytes)
+        if gate_result is not None and gate_result['skip'] and not gate_result['audit']:
+            result['detections'] = []
+            result['model_info'] = {
+                'status': 'skipped',
+                'message': 'На изображении не обнаружена растительность',
+                'model_version': bundle.version,
+                'gate': gate_result
+            }
+            return
+
+        # Детектируем деревья (под нагрузкой - на уменьшенном входе)
+        deadline.check("detection")
+        imgsz = settings.degraded_detector_imgsz if quality_tier >= 1 else settings.tree_detector_imgsz
+        if conf is None and iou is None:
+            detection_result = bundle.detector.predict(image_bytes, imgsz=imgsz)
+        else:
+            detection_result = self._detect_with_thresholds(bundle, image_bytes, imgsz, conf, iou)
         detections = detection_result.get('detections', [])
-        classified_detections = []
-        # Классифицируем каждое дерево
-        for det in detections:
-            # Вырезаем область дерева по bbox
-            bbox = det.get('bbox')
-            if bbox:
-                img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-                crop = img.crop((bbox['x1'], bbox['y1'], bbox['x2'], bbox['y2']))
-                class_result = self.classifier.predict(crop)
-                conf = class_result.get('confidence', 0)
-                if conf >= self.class_confidence_threshold:
-                    det['species'] = class_result.get('class_name')
-                    det['species_confidence'] = conf
-                else:
+        if gate_result is not None and gate_result['audit']:
+            self._record_gate_audit(gate_result, len(detections))
+        species_threshold = self.class_confidence_threshold if species_conf is None else species_conf
+        if bundle.joint:
+            # Породы уже определены совместной моделью
+            for det in detections:
+                if (det.get('species_confidence') or 0) < species_threshold:
                     det['species'] = None
-                    det['species_confidence'] = conf
-            else:
-                det['species'] = None
-                det['species_confidence'] = None
-            classified_detections.append(det)
-        result['detections'] = classified_detections
+        if on_progress is not None:
+            # Копии: исходные детекции дополняются породами в этом потоке
+            on_progress('detections', {
+                'detections': [dict(det) for det in detections],
+                'model_info': {'model_version': bundle.version, 'detector': detection_result.get('model_info')}
+            })
+        # Декодируем изображение один раз для всех кропов
+        to_classify = [] if bundle.joint else detections
+        img = Image.open(io.BytesIO(image_bytes)).convert("RGB") if to_classify else None
+        routing = {'total': 0, 'cached': 0, 'fast': 0, 'heavy': 0, 'skipped': 0}
+        batch_size = max(1, settings.stream_species_batch_size)
+        pending = []
+        # Классифицируем каждое дерево
+        try:
+            for det in to_classify:
+                # Клиент уже не ждет результата - оставшиеся кропы не классифицируем
+                deadline.check("classification")
+                self._classify_detection(bundle, img, det, routing, quality_tier, species_threshold)
+                if on_progress is not None:
+                    pending.append({
+                        'id': det.get('id'),
+                        'species': det.get('species'),
+                        'species_confidence': det.get('species_confidence')
+                    })
+                    if len(pending) >= batch_size:
+                        on_progress('species', {'detections': pending})
+                        pending = []
+            if pending:
+                on_progress('species', {'detections': pending})
+        finally:
+            self._update_routing(routing)
+        result['detections'] = detections
         result['model_info'] = {
+            'model_version': bundle.version,
             'detector': detection_result.get('model_info'),
             'classifier': {
-                'model_path': getattr(self.classifier, 'model_path', None),
-                'confidence_threshold': self.class_confidence_threshold
+                'model_path': getattr(bundle.classifier, 'model_path', None),
+                'confidence_threshold': species_threshold,
+                'cascade_enabled': bundle.fast_classifier is not None,
+                'joint': bundle.joint,
+                'routing': routing
             }
         }
-        return result
+
+    def _detect_with_thresholds(
+        self,
+        bundle: ModelBundle,
+        image_bytes: bytes,
+        imgsz: Optional[int],
+        conf: Optional[float],
+        iou: Optional[float]
+    ) -> Dict[str, Any]:
+        """
+        Детекция с порогами запроса, не изменяющая общий детектор.
+        Сырые предсказания берутся из кэша, если изображение уже обрабатывалось,
+        и фильтруются заново: повторный прогон модели не нужен.
+        """
+        key = None
+        raw = None
+        if self.raw_cache is not None:
+            key = RawPredictionCache.make_key(image_bytes, bundle.detector_version, imgsz)
+            raw = self.raw_cache.get(key)
+        cache_hit = raw is not None
+        if raw is None:
+            raw = bundle.detector.call('predict_raw', image_bytes, imgsz=imgsz)
+            if key is not None:
+                self.raw_cache.put(key, raw)
+        # Ниже порога сохраненных сырых предсказаний фильтровать нечего
+        conf = settings.tree_detector_confidence_threshold if conf is None else max(conf, RAW_CONFIDENCE_THRESHOLD)
+        iou = settings.tree_detector_iou_threshold if iou is None else iou
+        detections = apply_thresholds(raw, conf, iou, agnostic=bundle.joint)
+        if bundle.joint:
+            species_from_classes(detections)
+        return {
+            'detections': detections,
+            'model_info': {
+                **raw['model_info'],
+                'confidence_threshold': conf,
+                'iou_threshold': iou,
+                'raw_cache_hit': cache_hit
+            }
+        }
+
+    def _check_gate(self, image_bytes: bytes) -> Optional[Dict[str, Any]]:
+        """
+        Проверяет изображение фильтром растительности.
+        Часть отфильтрованных изображений (gate_audit_rate) все равно проходит через
+        детектор, чтобы оценить долю ложных пропусков.
+        """
+        if self.gate is None:
+            return None
+        gate_result = self.gate.check(image_bytes)
+        gate_result['audit'] = gate_result['skip'] and random.random() < settings.gate_audit_rate
+        with self._stats_lock:
+            self._gate_stats['checked'] += 1
+            if gate_result['skip']:
+                self._gate_stats['skipped'] += 1
+            checked, skipped = self._gate_stats['checked'], self._gate_stats['skipped']
+        if gate_result['skip']:
+            logger.info(
+                f"Фильтр растительности: оценка {gate_result['vegetation_score']:.3f}, "
+                f"доля пропусков {skipped / checked:.1%} ({skipped}/{checked})"
+                + (", изображение отправлено на аудит" if gate_result['audit'] else "")
+            )
+        return gate_result
+
+    def _record_gate_audit(self, gate_result: Dict[str, Any], detections_count: int) -> None:
+        """Учитывает результат аудита отфильтрованного изображения."""
+        with self._stats_lock:
+            self._gate_stats['audited'] += 1
+            if detections_count:
+                self._gate_stats['false_skips'] += 1
+            audited, false_skips = self._gate_stats['audited'], self._gate_stats['false_skips']
+        if detections_count:
+            logger.warning(
+                f"Аудит фильтра растительности: ложный пропуск, найдено объектов: {detections_count}, "
+                f"оценка {gate_result['vegetation_score']:.3f}, ложных пропусков {false_skips}/{audited}"
+            )
+        else:
+            logger.info(f"Аудит фильтра растительности: пропуск подтвержден, ложных пропусков {false_skips}/{audited}")
+
+    def get_gate_stats(self) -> Dict[str, Any]:
+        """Возвращает статистику фильтра растительности."""
+        with self._stats_lock:
+            stats = dict(self._gate_stats)
+        stats['enabled'] = self.gate is not None
+        stats['skip_rate'] = stats['skipped'] / stats['checked'] if stats['checked'] else 0.0
+        stats['false_skip_rate'] = stats['false_skips'] / stats['audited'] if stats['audited'] else 0.0
+        return stats
+
+    def _should_classify(self, det: Dict[str, Any]) -> bool:
+        """Проверяет, стоит ли классифицировать детекцию (размер кропа и уверенность детектора)."""
+        bbox = det.get('bbox')
+        if not bbox:
+            return False
+        if det.get('confidence', 1.0) < self.min_detection_confidence:
+            return False
+        min_side = min(bbox['x2'] - bbox['x1'], bbox['y2'] - bbox['y1'])
+        return min_side >= self.min_crop_size
+
+    def _classify_detection(
+        self,
+        bundle: ModelBundle,
+        img: Image.Image,
+        det: Dict[str, Any],
+        routing: Dict[str, int],
+        quality_tier: int = 0,
+        species_threshold: Optional[float] = None
+    ) -> None:
+        """
+        Определяет породу дерева для одной детекции.
+        Сначала ищется близкий кроп в кэше. При включенном каскаде сначала работает
+        быстрый классификатор, а тяжелый вызывается только если уверенность быстрого
+        ниже cascade_margin. На уровне качества 2 тяжелый классификатор не используется,
+        на уровне 3 классификация не выполняется.
+        """
+        routing['total'] += 1
+        classification_disabled = quality_tier >= 3 or (quality_tier == 2 and bundle.fast_classifier is None)
+        if classification_disabled or not self._should_classify(det):
+            routing['skipped'] += 1
+            det['species'] = None
+            det['species_confidence'] = None
+            return
+        # Вырезаем область дерева по bbox
+        bbox = det['bbox']
+        crop = img.crop((bbox['x1'], bbox['y1'], bbox['x2'], bbox['y2']))
+        crop_key = None
+        class_result = None
+        if self.crop_cache is not None:
+            crop_key = self.crop_cache.hash_crop(crop)
+            class_result = self.crop_cache.get(crop_key, bundle.version)
+        if class_result is not None:
+            routing['cached'] += 1
+        else:
+            class_result, complete = self._classify_crop(bundle, crop, routing, allow_heavy=quality_tier < 2)
+            if crop_key is not None and complete:
+                self.crop_cache.put(crop_key, bundle.version, class_result)
+        if species_threshold is None:
+            species_threshold = self.class_confidence_threshold
+        conf = class_result.get('confidence', 0)
+        if conf >= species_threshold:
+            det['species'] = class_result.get('class_name')
+        else:
+            det['species'] = None
+        det['species_confidence'] = conf
+
+    def _classify_crop(
+        self,
+        bundle: ModelBundle,
+        crop: Image.Image,
+        routing: Dict[str, int],
+        allow_heavy: bool = True
+    ):
+        """
+        Классифицирует кроп быстрым и, при необходимости, тяжелым классификатором.
+        Returns:
+            Tuple[dict, bool]: результат классификации и признак того, что он получен
+            полным каскадом (неуверенный ответ быстрого классификатора без проверки
+            тяжелым таковым не считается)
+        """
+        if bundle.fast_classifier is not None:
+            class_result = bundle.fast_classifier.predict(crop)
+            routing['fast'] += 1
+            if class_result.get('confidence', 0) >= self.cascade_margin:
+                return class_result, True
+            if not allow_heavy:
+                return class_result, False
+        routing['heavy'] += 1
+        return bundle.classifier.predict(crop), True
+
+    def _update_routing(self, routing: Dict[str, int]) -> None:
+        with self._stats_lock:
+            for stage, count in routing.items():
+                self._routing_totals[stage] += count
+
+    def get_routing_stats(self) -> Dict[str, Any]:
+        """
+        Возвращает накопленную статистику маршрутизации кропов.
+        Доли считаются от общего числа детекций: cached - взяты из кэша кропов,
+        fast - прошли через быстрый классификатор, heavy - через тяжелый,
+        skipped - не классифицировались.
+        """
+        with self._stats_lock:
+            counts = dict(self._routing_totals)
+        total = counts.pop('total')
+        ratios = {stage: (count / total if total else 0.0) for stage, count in counts.items()}
+        return {'total': total, 'counts': counts, 'ratios': ratios}
+
+    def is_ready(self) -> bool:
+        """Готов ли процессор принимать изображения: модели загружены или инференс отключен."""
+        return not settings.model_enable_inference or self._bundle is not None
 
     def get_detector_info(self) -> Dict[str, Any]:
-        detector_info = None if self.detector is None else self.detector.get_model_info()
+        bundle = self._bundle
+        detector_info = None if bundle is None else bundle.detector.get_model_info()
         classifier_info = {
-            'model_path': None if self.classifier is None else getattr(self.classifier, 'model_path', None),
+            'model_path': None if bundle is None else getattr(bundle.classifier, 'model_path', None),
             'confidence_threshold': self.class_confidence_threshold
         }
         return {
+            'model_version': None if bundle is None else bundle.version,
             'detector_info': detector_info,
             'classifier_info': classifier_info,
+            'classifier_routing': self.get_routing_stats(),
+            'gate': self.get_gate_stats(),
+            'crop_cache': None if self.crop_cache is None else self.crop_cache.get_stats(),
+            'duplicate_index': None if self.duplicate_index is None else self.duplicate_index.get_stats(),
+            'raw_prediction_cache': None if self.raw_cache is None else self.raw_cache.get_stats(),
+            'model_pools': None if bundle is None else self._get_pool_stats(bundle),
+            'threads_per_replica': self.threads_per_replica,
+        }
+
+    def get_input_size(self, quality_tier: int = 0) -> Optional[int]:
+        """
+        Размер входа детектора (длинная сторона) на заданном уровне качества.
+        Клиенту нет смысла присылать изображение больше этого размера.
+        Returns:
+            int или None, если инференс отключен или размер неизвестен
+        """
+        bundle = self._bundle
+        if bundle is None:
+            return None
+        if quality_tier >= 1:
+            return settings.degraded_detector_imgsz
+        if settings.tree_detector_imgsz:
+            return settings.tree_detector_imgsz
+        return bundle.detector.get_model_info().get('imgsz')
+
+    def _get_pool_stats(self, bundle: ModelBundle) -> Dict[str, Any]:
+        """Возвращает загрузку пулов реплик моделей."""
+        pools = {
+            'detector': bundle.detector,
+            'classifier': bundle.classifier,
+            'classifier_fast': bundle.fast_classifier,
+            'gate': None if self.gate is None else self.gate.classifier,
+        }
+        return {name: pool.get_stats() for name, pool in pools.items() if isinstance(pool, ModelPool)}
+
+    def get_models_info(self) -> Dict[str, Any]:
+        """Возвращает активные версии моделей и содержимое реестра."""
+        bundle = self._bundle
+        return {
+            'model_version': None if bundle is None else bundle.version,
+            'detector_version': None if bundle is None else bundle.detector_version,
+            'classifier_version': None if bundle is None else bundle.classifier_version,
+            'registry_dir': None if self.registry is None else str(self.registry.root),
+            'available': {} if self.registry is None else self.registry.describe(),
+            'last_reload_error': self.last_reload_error,
         }
 
 
@@ -0,0 +1,129 @@
+"""
+Адаптивное снижение качества обработки под нагрузкой.
+
+Контроллер следит за количеством запросов в обработке (очередь + выполняющиеся)
+и скользящим средним времени ответа. При перегрузке он по одному шагу повышает
+уровень деградации, при спаде нагрузки - понижает обратно. Смена уровня
+происходит не чаще одного раза в cooldown секунд, чтобы избежать колебаний.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+# Уровни качества: 0 - полное качество
+QUALITY_TIERS = {
+    0: "full",
+    1: "reduced_detector_input",   # уменьшенный вход детектора
+    2: "fast_classification",      # только быстрый классификатор (или без классификации)
+    3: "no_classification",        # классификация пород отключена
+}
+MAX_QUALITY_TIER = max(QUALITY_TIERS)
+
+
+class LoadController:
+    """Выбирает уровень качества обработки по глубине очереди и задержке."""
+
+    def __init__(
+        self,
+        workers: int = 1,
+        queue_high: int = 4,
+        queue_low: int = 1,
+        latency_high: float = 10.0,
+        latency_low: float = 3.0,
+        cooldown: float = 5.0,
+        ewma_alpha: float = 0.2,
+        enabled: bool = True
+    ):
+        """
+        Args:
+            workers: Количество параллельно выполняемых запросов
+            queue_high: Глубина очереди, при которой качество снижается
+            queue_low: Глубина очереди, при которой качество восстанавливается
+            latency_high: Средняя задержка (с), при которой качество снижается
+            latency_low: Средняя задержка (с), при которой качество восстанавливается
+            cooldown: Минимальный интервал между сменами уровня в секундах
+            ewma_alpha: Коэффициент сглаживания задержки
+            enabled: Включена ли адаптация (иначе всегда полное качество)
+        """
+        self.workers = workers
+        self.queue_high = queue_high
+        self.queue_low = queue_low
+        self.latency_high = latency_high
+        self.latency_low = latency_low
+        self.cooldown = cooldown
+        self.ewma_alpha = ewma_alpha
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._latency_ewma: Optional[float] = None
+        self._tier = 0
+        self._last_change = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        """Количество запросов, ожидающих свободного воркера."""
+        return max(0, self._in_flight - self.workers)
+
+    def enter(self) -> None:
+        """Регистрирует поступивший запрос."""
+        with self._lock:
+            self._in_flight += 1
+            self._update()
+
+    def exit(self, latency: float) -> None:
+        """
+        Регистрирует завершение запроса.
+        Args:
+            latency: Полное время обработки запроса, включая ожидание в очереди (с)
+        """
+        with self._lock:
+            self._in_flight -= 1
+            if self._latency_ewma is None:
+                self._latency_ewma = latency
+            else:
+                self._latency_ewma += self.ewma_alpha * (latency - self._latency_ewma)
+            self._update()
+
+    def current_tier(self) -> int:
+        """Возвращает текущий уровень качества."""
+        with self._lock:
+            self._update()
+            return self._tier
+
+    def _update(self) -> None:
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        if now - self._last_change < self.cooldown:
+            return
+        latency = self._latency_ewma or 0.0
+        depth = self.queue_depth
+        if (depth >= self.queue_high or latency >= self.latency_high) and self._tier < MAX_QUALITY_TIER:
+            self._set_tier(self._tier + 1, now, depth, latency)
+        elif depth <= self.queue_low and latency <= self.latency_low and self._tier > 0:
+            self._set_tier(self._tier - 1, now, depth, latency)
+
+    def _set_tier(self, tier: int, now: float, depth: int, latency: float) -> None:
+        logger.warning(
+            f"Уровень качества изменен: {self._tier} -> {tier} ({QUALITY_TIERS[tier]}), "
+            f"очередь: {depth}, средняя задержка: {latency:.2f} с"
+        )
+        self._tier = tier
+        self._last_change = now
+
+    def get_state(self) -> Dict[str, Any]:
+        """Возвращает текущее состояние контроллера."""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'quality_tier': self._tier,
+                'quality_tier_name': QUALITY_TIERS[self._tier],
+                'in_flight': self._in_flight,
+                'queue_depth': self.queue_depth,
+                'latency_ewma': self._latency_ewma,
+            }
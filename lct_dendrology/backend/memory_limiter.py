@@ -0,0 +1,175 @@
+"""
+Ограничение одновременной обработки по оценке потребляемой памяти.
+
+Память на запрос растет с количеством мегапикселей и деревьев на снимке, а не с
+количеством запросов. Поэтому запросы допускаются к обработке по своей оценочной
+стоимости (пиксели из заголовка изображения плюс ожидаемое число кропов) в
+пределах общего бюджета памяти - это взвешенный семафор. Очередь FIFO, но запрос,
+который помещается в бюджет, может обогнать не помещающийся первый в очереди
+(ограниченное число раз, чтобы большие изображения не голодали).
+"""
+
+import asyncio
+import io
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+
+def read_image_size(image_bytes: bytes) -> Optional[Tuple[int, int]]:
+    """Читает размер изображения из заголовка без декодирования пикселей."""
+    try:
+        return Image.open(io.BytesIO(image_bytes)).size
+    except Exception:
+        return None
+
+
+class MemoryBudgetLimiter:
+    """Взвешенный асинхронный семафор с бюджетом памяти в байтах."""
+
+    def __init__(
+        self,
+        budget_mb: float,
+        bytes_per_pixel: float = 12.0,
+        crop_mb: float = 2.0,
+        ewma_alpha: float = 0.1,
+        max_bypass: int = 8,
+        enabled: bool = True
+    ):
+        """
+        Args:
+            budget_mb: Общий бюджет памяти на обрабатываемые изображения в МБ
+            bytes_per_pixel: Оценка памяти на пиксель (декодированное изображение и его копии)
+            crop_mb: Оценка памяти на классификацию одного кропа в МБ
+            ewma_alpha: Коэффициент сглаживания ожидаемого числа деревьев
+            max_bypass: Сколько запросов может обогнать первый в очереди, пока он не помещается
+            enabled: Включено ли ограничение
+        """
+        self.budget = int(budget_mb * MB)
+        self.bytes_per_pixel = bytes_per_pixel
+        self.crop_bytes = int(crop_mb * MB)
+        self.ewma_alpha = ewma_alpha
+        self.max_bypass = max_bypass
+        self.enabled = enabled
+        self.in_use = 0
+        self.expected_crops = 0.0
+        self._waiters: Deque[Tuple[int, asyncio.Future]] = deque()
+        # Сколько раз обогнали текущего первого в очереди
+        self._head_bypassed = 0
+        self.admitted = 0
+        self.bypassed = 0
+        self.waited = 0
+        self.last_wait = 0.0
+        self.max_wait = 0.0
+        self.total_wait = 0.0
+
+    def estimate_cost(self, image_bytes: bytes) -> int:
+        """
+        Оценивает память на обработку изображения в байтах.
+        Стоимость не превышает бюджет, чтобы очень большое изображение могло
+        обрабатываться хотя бы в одиночку.
+        """
+        size = read_image_size(image_bytes)
+        pixels = size[0] * size[1] if size else 0
+        cost = int(pixels * self.bytes_per_pixel + self.expected_crops * self.crop_bytes) + len(image_bytes)
+        return max(1, min(cost, self.budget))
+
+    def record_detections(self, count: int) -> None:
+        """Обновляет ожидаемое число кропов по фактическому количеству детекций."""
+        self.expected_crops += self.ewma_alpha * (count - self.expected_crops)
+
+    def _fits(self, cost: int) -> bool:
+        return self.in_use + cost <= self.budget
+
+    def _can_bypass(self, cost: int) -> bool:
+        return self._fits(cost) and self._head_bypassed < self.max_bypass
+
+    def _bypass(self, cost: int) -> None:
+        self.in_use += cost
+        self._head_bypassed += 1
+        self.bypassed += 1
+
+    async def acquire(self, cost: int) -> None:
+        """Ожидает, пока стоимость запроса поместится в бюджет (в порядке очереди)."""
+        if not self.enabled:
+            return
+        started = time.monotonic()
+        if not self._waiters and self._fits(cost):
+            self.in_use += cost
+        elif self._waiters and self._can_bypass(cost):
+            self._bypass(cost)
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append((cost, future))
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    self.release(cost)
+                else:
+                    if self._waiters[0] == (cost, future):
+                        self._head_bypassed = 0
+                    self._waiters.remove((cost, future))
+                    self._wake()
+                raise
+            self.waited += 1
+        wait = time.monotonic() - started
+        self.admitted += 1
+        self.last_wait = wait
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+    def release(self, cost: int) -> None:
+        if not self.enabled:
+            return
+        self.in_use -= cost
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self._fits(self._waiters[0][0]):
+            cost, future = self._waiters.popleft()
+            self.in_use += cost
+            self._head_bypassed = 0
+            future.set_result(None)
+        # Первый в очереди не помещается: помещающиеся запросы за ним обгоняют его в пределах max_bypass
+        for cost, future in list(self._waiters)[1:]:
+            if self._head_bypassed >= self.max_bypass:
+                break
+            if self._fits(cost):
+                self._waiters.remove((cost, future))
+                self._bypass(cost)
+                future.set_result(None)
+
+    @asynccontextmanager
+    async def reserve(self, image_bytes: bytes):
+        """Резервирует память под обработку изображения на время контекста."""
+        cost = self.estimate_cost(image_bytes)
+        await self.acquire(cost)
+        try:
+            yield cost
+        finally:
+            self.release(cost)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'budget_mb': self.budget / MB,
+            'in_use_mb': self.in_use / MB,
+            'utilization': self.in_use / self.budget if self.budget else 0.0,
+            'waiting': len(self._waiters),
+            'expected_crops': self.expected_crops,
+            'admitted': self.admitted,
+            'waited': self.waited,
+            'bypassed': self.bypassed,
+            'last_wait_seconds': self.last_wait,
+            'max_wait_seconds': self.max_wait,
+            'avg_wait_seconds': self.total_wait / self.admitted if self.admitted else 0.0,
+        }
@@ -0,0 +1,106 @@
+"""
+Локальный реестр версионированных моделей.
+
+Структура директории реестра:
+
+    <registry_dir>/
+        detector/
+            v2.pt
+            v3.pt
+        classifier/
+            v2.pt
+            v3.onnx
+        classifier_fast/
+            v1.pt
+        joint/
+            v1.pt
+
+Версией считается имя файла без расширения. Последней считается версия
+с наибольшим номером при "естественной" сортировке (v10 > v9).
+"""
+
+import logging
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+MODEL_KINDS = ("detector", "classifier", "classifier_fast", "joint")
+MODEL_SUFFIXES = (".pt", ".onnx", ".torchscript", ".engine")
+
+
+def _natural_key(version: str) -> List:
+    """Ключ естественной сортировки версий: v2 < v10."""
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r"(\d+)", version)]
+
+
+def version_from_path(model_path: str) -> str:
+    """Возвращает версию модели, заданной путем вне реестра (имя файла без расширения)."""
+    return Path(model_path).stem
+
+
+class ModelRegistry:
+    """Реестр версий моделей в локальной директории."""
+
+    def __init__(self, root: str):
+        """
+        Args:
+            root: Корневая директория реестра
+        """
+        self.root = Path(root)
+
+    def _kind_dir(self, kind: str) -> Path:
+        if kind not in MODEL_KINDS:
+            raise ValueError(f"Неизвестный тип модели: {kind}")
+        return self.root / kind
+
+    def list_versions(self, kind: str) -> List[str]:
+        """
+        Возвращает отсортированный список доступных версий модели.
+
+        Args:
+            kind: Тип модели (detector/classifier/classifier_fast)
+        Returns:
+            List[str]: версии от старой к новой
+        """
+        kind_dir = self._kind_dir(kind)
+        if not kind_dir.is_dir():
+            return []
+        versions = [
+            path.stem for path in kind_dir.iterdir()
+            if path.is_file() and path.suffix in MODEL_SUFFIXES
+        ]
+        return sorted(versions, key=_natural_key)
+
+    def latest_version(self, kind: str) -> Optional[str]:
+        """Возвращает последнюю версию модели или None, если версий нет."""
+        versions = self.list_versions(kind)
+        return versions[-1] if versions else None
+
+    def resolve(self, kind: str, version: Optional[str] = None) -> Tuple[str, str]:
+        """
+        Находит файл модели заданной версии.
+
+        Args:
+            kind: Тип модели (detector/classifier/classifier_fast)
+            version: Версия модели. По умолчанию последняя
+        Returns:
+            Tuple[str, str]: версия и путь к файлу модели
+        Raises:
+            FileNotFoundError: Если версия не найдена
+        """
+        version = version or self.latest_version(kind)
+        if version is None:
+            raise FileNotFoundError(f"В реестре {self.root} нет моделей типа {kind}")
+        kind_dir = self._kind_dir(kind)
+        for suffix in MODEL_SUFFIXES:
+            path = kind_dir / f"{version}{suffix}"
+            if path.is_file():
+                return version, str(path)
+        raise FileNotFoundError(f"Версия {version} модели {kind} не найдена в {kind_dir}")
+
+    def describe(self) -> Dict[str, List[str]]:
+        """Возвращает список версий для каждого типа модели."""
+        return {kind: self.list_versions(kind) for kind in MODEL_KINDS}
@@ -0,0 +1,222 @@
+"""
+Допуск запросов и справедливое планирование инференса между клиентами.
+
+- ClientRateLimiter ограничивает частоту запросов каждого клиента (token bucket).
+- FairScheduler выдает слоты инференса: сначала строго по приоритету полос
+  (interactive раньше bulk), внутри полосы - взвешенная справедливая очередь
+  (start-time fair queuing), поэтому клиент с сотней фото подряд не задерживает
+  остальных дольше, чем на один свой запрос.
+"""
+
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+CLIENT_ID_HEADER = "X-Client-Id"
+PRIORITY_HEADER = "X-Priority"
+
+# Полосы в порядке убывания приоритета
+LANES = ("interactive", "bulk")
+# Каждые PRUNE_INTERVAL выдач слота теги отставших клиентов удаляются
+PRUNE_INTERVAL = 1000
+
+
+class TokenBucket:
+    """Классический token bucket: rate токенов в секунду, не больше burst."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def try_acquire(self, cost: float = 1.0) -> Tuple[bool, float]:
+        """
+        Пытается списать cost токенов.
+        Returns:
+            Tuple[bool, float]: успех и время в секундах до появления нужных токенов
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return True, 0.0
+        retry_after = (cost - self.tokens) / self.rate if self.rate > 0 else float("inf")
+        return False, retry_after
+
+
+class ClientRateLimiter:
+    """Квоты запросов по идентификатору клиента."""
+
+    def __init__(self, rate_per_minute: float, burst: int, max_clients: int = 10000, enabled: bool = True):
+        """
+        Args:
+            rate_per_minute: Средняя допустимая частота запросов клиента в минуту
+            burst: Максимальное количество запросов подряд
+            max_clients: Сколько клиентов помнить (давно неактивные вытесняются)
+            enabled: Включены ли квоты
+        """
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_clients = max_clients
+        self.enabled = enabled
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def try_acquire(self, client_id: str, cost: float = 1.0) -> Tuple[bool, float]:
+        """
+        Args:
+            client_id: Идентификатор клиента
+            cost: Стоимость запроса в токенах (количество изображений)
+        Returns:
+            Tuple[bool, float]: допущен ли запрос и через сколько секунд повторить
+        """
+        if not self.enabled:
+            return True, 0.0
+        with self._lock:
+            bucket = self._buckets.get(client_id)
+            if bucket is None:
+                bucket = self._buckets[client_id] = TokenBucket(self.rate, self.burst)
+                while len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client_id)
+            allowed, retry_after = bucket.try_acquire(cost)
+            if not allowed:
+                self.rejected += 1
+            return allowed, retry_after
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'enabled': self.enabled, 'clients': len(self._buckets), 'rejected': self.rejected}
+
+
+class _Lane:
+    """Очередь одной полосы приоритета с виртуальным временем WFQ."""
+
+    def __init__(self, max_clients: int = 10000):
+        self.heap: List[Tuple[float, int, float, asyncio.Future]] = []
+        self.virtual_time = 0.0
+        self.finish_tags: Dict[str, float] = {}
+        self.dispatched = 0
+        self.max_clients = max_clients
+
+    def tag(self, client_id: str, cost: float, weight: float) -> Tuple[float, float]:
+        start = max(self.virtual_time, self.finish_tags.get(client_id, 0.0))
+        finish = start + cost / weight
+        self.finish_tags[client_id] = finish
+        return start, finish
+
+    def prune(self) -> None:
+        """
+        Удаляет теги клиентов, отставших от виртуального времени (они эквивалентны новым).
+        Без очереди виртуальное время почти не растет, поэтому число тегов дополнительно
+        ограничено max_clients: забываются клиенты с наименьшими тегами, то есть ближайшие к новым.
+        """
+        tags = {client: tag for client, tag in self.finish_tags.items() if tag > self.virtual_time}
+        if len(tags) > self.max_clients:
+            tags = dict(heapq.nlargest(self.max_clients // 2, tags.items(), key=lambda item: item[1]))
+        self.finish_tags = tags
+
+    def record_dispatch(self) -> None:
+        """Учитывает выданный слот и при необходимости чистит теги."""
+        self.dispatched += 1
+        if self.dispatched % PRUNE_INTERVAL == 0 or len(self.finish_tags) > self.max_clients:
+            self.prune()
+
+
+class FairScheduler:
+    """Выдает ограниченное число слотов инференса с приоритетами и справедливой очередью."""
+
+    def __init__(self, capacity: int, weights: Optional[Dict[str, float]] = None, max_clients: int = 10000):
+        """
+        Args:
+            capacity: Количество одновременно выполняемых запросов
+            weights: Веса клиентов (по умолчанию 1.0); клиент с весом 2 получает вдвое больше слотов
+            max_clients: Сколько тегов клиентов помнить в каждой полосе
+        """
+        self.capacity = capacity
+        self.weights = weights or {}
+        self.running = 0
+        self._lanes = {lane: _Lane(max_clients) for lane in LANES}
+        self._seq = itertools.count()
+
+    @staticmethod
+    def normalize_lane(lane: Optional[str], default: str = "interactive") -> str:
+        lane = (lane or default).lower()
+        return lane if lane in LANES else default
+
+    @property
+    def queued(self) -> int:
+        return sum(
+            1 for lane in self._lanes.values() for *_, future in lane.heap if not future.done()
+        )
+
+    async def acquire(self, client_id: str, lane: str = "interactive", cost: float = 1.0) -> None:
+        """Ожидает свободный слот."""
+        queue = self._lanes[lane]
+        start, finish = queue.tag(client_id, cost, self.weights.get(client_id, 1.0))
+        if self.running < self.capacity and self.queued == 0:
+            self.running += 1
+            queue.virtual_time = start
+            queue.record_dispatch()
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(queue.heap, (finish, next(self._seq), start, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Слот уже выдан, но ожидающий отменен - возвращаем слот
+                self.release()
+            else:
+                future.cancel()
+            raise
+
+    def release(self) -> None:
+        """Освобождает слот и передает его следующему запросу."""
+        self.running -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        while self.running < self.capacity:
+            for name in LANES:
+                queue = self._lanes[name]
+                while queue.heap and queue.heap[0][-1].done():
+                    heapq.heappop(queue.heap)
+                if queue.heap:
+                    _, _, start, future = heapq.heappop(queue.heap)
+                    queue.virtual_time = max(queue.virtual_time, start)
+                    queue.record_dispatch()
+                    self.running += 1
+                    future.set_result(None)
+                    break
+            else:
+                return
+
+    @asynccontextmanager
+    async def slot(self, client_id: str, lane: str = "interactive", cost: float = 1.0):
+        await self.acquire(client_id, lane, cost)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'capacity': self.capacity,
+            'running': self.running,
+            'queued': {
+                name: sum(1 for *_, future in lane.heap if not future.done())
+                for name, lane in self._lanes.items()
+            },
+            'dispatched': {name: lane.dispatched for name, lane in self._lanes.items()},
+            'clients': {name: len(lane.finish_tags) for name, lane in self._lanes.items()},
+        }
@@ -1,13 +1,30 @@
 """FastAPI server for image processing inference."""
 
-from typing import Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Optional
+import asyncio
+import hmac
+import json
 import logging
+import time
 
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import BackgroundTasks, FastAPI, File, Header, Query, Request, UploadFile, HTTPException
+from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 
 from lct_dendrology.cfg import settings
-from lct_dendrology.backend.image_processor import image_processor
+from lct_dendrology.backend.image_processor import ProgressCallback, image_processor
+from lct_dendrology.backend.load_controller import LoadController
+from lct_dendrology.backend.deadline import DEADLINE_HEADER, DeadlineExceeded, DeadlineStats, RequestDeadline
+from lct_dendrology.backend.scheduler import (
+    CLIENT_ID_HEADER,
+    PRIORITY_HEADER,
+    ClientRateLimiter,
+    FairScheduler,
+)
+from lct_dendrology.backend.memory_limiter import MemoryBudgetLimiter
 
 # Configure logging
 logging.basicConfig(
@@ -16,11 +33,96 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Инференс выполняется в отдельных потоках, чтобы не блокировать event loop
+inference_executor = ThreadPoolExecutor(
+    max_workers=settings.inference_workers,
+    thread_name_prefix="inference"
+)
+load_controller = LoadController(
+    workers=settings.inference_workers,
+    queue_high=settings.adaptive_queue_high,
+    queue_low=settings.adaptive_queue_low,
+    latency_high=settings.adaptive_latency_high,
+    latency_low=settings.adaptive_latency_low,
+    cooldown=settings.adaptive_cooldown,
+    enabled=settings.adaptive_quality_enabled
+)
+
+deadline_stats = DeadlineStats()
+rate_limiter = ClientRateLimiter(
+    rate_per_minute=settings.client_rate_limit_per_minute,
+    burst=settings.client_rate_limit_burst,
+    enabled=settings.client_rate_limit_enabled
+)
+# Слоты планировщика соответствуют потокам инференса: очередь живет в планировщике
+scheduler = FairScheduler(capacity=settings.inference_workers, weights=settings.client_weights)
+memory_limiter = MemoryBudgetLimiter(
+    budget_mb=settings.memory_budget_mb,
+    bytes_per_pixel=settings.memory_bytes_per_pixel,
+    crop_mb=settings.memory_per_crop_mb,
+    enabled=settings.memory_limiter_enabled
+)
+
+# Период проверки отключения клиента во время ожидания результата
+DISCONNECT_POLL_INTERVAL = 0.5
+
+
+def run_processing(
+    content: bytes,
+    deadline: RequestDeadline,
+    thresholds: Optional[Dict[str, Optional[float]]] = None,
+    on_progress: Optional[ProgressCallback] = None
+) -> Dict[str, Any]:
+    """
+    Обрабатывает изображение с уровнем качества, выбранным на момент начала выполнения.
+    Просроченные к этому моменту запросы снимаются с очереди без обработки.
+    thresholds - пороги запроса (conf, iou, species_conf), переопределяющие настройки,
+    on_progress - обработчик промежуточных результатов для потокового ответа.
+    """
+    if deadline.expired():
+        deadline_stats.record_dropped()
+        raise DeadlineExceeded("queue")
+    started = time.monotonic()
+    try:
+        result = image_processor.process_image(
+            content, quality_tier=load_controller.current_tier(), deadline=deadline,
+            on_progress=on_progress, **(thresholds or {})
+        )
+    except DeadlineExceeded:
+        deadline_stats.record_aborted(time.monotonic() - started)
+        raise
+    deadline_stats.record_completed(time.monotonic() - started, late=deadline.expired())
+    return result
+
+
+async def wait_or_cancel(request: Request, future: asyncio.Future, deadline: RequestDeadline) -> Any:
+    """Ожидает результат, отменяя обработку при отключении клиента."""
+    while True:
+        done, _ = await asyncio.wait({future}, timeout=DISCONNECT_POLL_INTERVAL)
+        if done:
+            return future.result()
+        if not deadline.cancelled and await request.is_disconnected():
+            logger.info("Клиент отключился, обработка запроса отменяется")
+            deadline_stats.record_disconnect()
+            deadline.cancel()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Запускает и останавливает фоновое отслеживание реестра моделей."""
+    image_processor.start_registry_watcher()
+    try:
+        yield
+    finally:
+        image_processor.stop_registry_watcher()
+
+
 # Create FastAPI application
 app = FastAPI(
     title="LCT Dendrology API",
     description="API для обработки изображений в дендрологических исследованиях",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -45,19 +147,180 @@ async def health_check() -> Dict[str, str]:
     return {"status": "healthy"}
 
 
+@app.get("/ready")
+async def readiness_check() -> JSONResponse:
+    """
+    Готовность к приему изображений для балансировщика: 503, пока модели не загружены.
+    В ответе также очередь планировщика, чтобы клиент мог учитывать загрузку.
+    """
+    ready = image_processor.is_ready()
+    stats = scheduler.get_stats()
+    return JSONResponse(
+        {
+            "status": "ready" if ready else "not_ready",
+            "running": stats['running'],
+            "queued": sum(stats['queued'].values()),
+        },
+        status_code=200 if ready else 503
+    )
+
+
+@app.get("/metrics")
+async def get_metrics() -> Dict[str, Any]:
+    """Возвращает метрики нагрузки и учета дедлайнов."""
+    return {
+        "load": load_controller.get_state(),
+        "deadlines": deadline_stats.get_stats(),
+        "scheduler": scheduler.get_stats(),
+        "rate_limiter": rate_limiter.get_stats(),
+        "memory": memory_limiter.get_stats(),
+    }
+
+
 @app.get("/processor-info")
 async def get_processor_info() -> Dict[str, Any]:
     """Возвращает информацию о состоянии процессора изображений."""
-    return image_processor.get_detector_info()
+    info = image_processor.get_detector_info()
+    info['load'] = load_controller.get_state()
+    info['input_size'] = image_processor.get_input_size(info['load']['quality_tier'])
+    return info
+
+
+class ReloadModelsRequest(BaseModel):
+    """Версии моделей для перезагрузки (по умолчанию последние в реестре)."""
+    detector_version: Optional[str] = None
+    classifier_version: Optional[str] = None
+
+
+def check_admin_token(token: Optional[str]) -> None:
+    """Проверяет токен администратора; без токена в настройках административные эндпоинты закрыты."""
+    if not settings.admin_token:
+        raise HTTPException(status_code=403, detail="Административные эндпоинты отключены: не задан ADMIN_TOKEN")
+    if token is None or not hmac.compare_digest(token.encode(), settings.admin_token.encode()):
+        raise HTTPException(status_code=403, detail="Неверный токен администратора")
+
+
+def _reload_models_task(detector_version: Optional[str], classifier_version: Optional[str]) -> None:
+    """Фоновая перезагрузка моделей; ошибка уже залогирована и сохранена в last_reload_error."""
+    try:
+        image_processor.reload_models(detector_version, classifier_version)
+    except Exception:
+        pass
+
+
+@app.get("/admin/models")
+async def get_models(x_admin_token: Optional[str] = Header(None)) -> Dict[str, Any]:
+    """Возвращает активные версии моделей и доступные версии в реестре."""
+    check_admin_token(x_admin_token)
+    return image_processor.get_models_info()
+
+
+@app.post("/admin/reload-models", status_code=202)
+async def reload_models(
+    background_tasks: BackgroundTasks,
+    request: Optional[ReloadModelsRequest] = None,
+    x_admin_token: Optional[str] = Header(None)
+) -> Dict[str, Any]:
+    """
+    Запускает фоновую загрузку новой версии моделей.
+    После прогрева модели атомарно подменяются, текущие запросы завершаются на старой версии.
+    """
+    check_admin_token(x_admin_token)
+    if not settings.model_enable_inference:
+        raise HTTPException(status_code=409, detail="Инференс модели отключен в настройках")
+    request = request or ReloadModelsRequest()
+    background_tasks.add_task(
+        _reload_models_task,
+        request.detector_version,
+        request.classifier_version
+    )
+    return {
+        "status": "accepted",
+        "model_version": image_processor.model_version,
+        "requested": request.model_dump()
+    }
+
+
+def check_image_file(file: UploadFile) -> None:
+    """Проверяет, что загруженный файл является изображением (иначе HTTPException 400)."""
+    if not file.content_type or not file.content_type.startswith("image/"):
+        raise HTTPException(
+            status_code=400, 
+            detail="Файл должен быть изображением"
+        )
+
+
+def admit_upload(request: Request, file: UploadFile, x_client_id: Optional[str], cost: int = 1) -> str:
+    """
+    Проверяет тип загруженного файла и квоту клиента.
+    cost - количество изображений в запросе: квота расходуется по токену на изображение.
+    Returns:
+        str: идентификатор клиента (по умолчанию IP-адрес)
+    Raises:
+        HTTPException: 400 для файла не-изображения, 429 при превышении квоты
+    """
+    # Проверяем, что файл является изображением
+    check_image_file(file)
+
+    client_id = x_client_id or (request.client.host if request.client else "unknown")
+    allowed, retry_after = rate_limiter.try_acquire(client_id, cost=cost)
+    if not allowed:
+        logger.warning(f"Превышена квота запросов клиента {client_id}")
+        raise HTTPException(
+            status_code=429,
+            detail="Слишком много запросов, попробуйте позже",
+            headers={"Retry-After": str(max(1, round(retry_after)))}
+        )
+    return client_id
+
+
+async def process_content(
+    request: Request,
+    client_id: str,
+    lane: str,
+    content: bytes,
+    deadline: RequestDeadline,
+    thresholds: Dict[str, Optional[float]]
+) -> Dict[str, Any]:
+    """Обрабатывает одно изображение в пуле инференса в очереди клиента и в пределах бюджета памяти."""
+    load_controller.enter()
+    started = time.monotonic()
+    try:
+        # Память резервируется до слота: запрос, ждущий памяти, не занимает поток инференса
+        async with memory_limiter.reserve(content), scheduler.slot(client_id, lane):
+            future = asyncio.get_running_loop().run_in_executor(
+                inference_executor, run_processing, content, deadline, thresholds
+            )
+            analysis_result = await wait_or_cancel(request, future, deadline)
+        memory_limiter.record_detections(len(analysis_result.get('detections', [])))
+        return analysis_result
+    finally:
+        load_controller.exit(time.monotonic() - started)
 
 
 @app.post("/process-image")
-async def process_image(file: UploadFile = File(...)) -> Dict[str, Any]:
+async def process_image(
+    request: Request,
+    file: UploadFile = File(...),
+    x_request_deadline: Optional[str] = Header(None, alias=DEADLINE_HEADER),
+    x_client_id: Optional[str] = Header(None, alias=CLIENT_ID_HEADER),
+    x_priority: Optional[str] = Header(None, alias=PRIORITY_HEADER),
+    conf: Optional[float] = Query(None, ge=0.0, le=1.0),
+    iou: Optional[float] = Query(None, ge=0.0, le=1.0),
+    species_conf: Optional[float] = Query(None, ge=0.0, le=1.0)
+) -> Dict[str, Any]:
     """
     Обрабатывает загруженное изображение и возвращает результат анализа.
     
     Args:
         file: Загруженный файл изображения
+        x_request_deadline: Абсолютный дедлайн запроса (unix-время в секундах)
+        x_client_id: Идентификатор клиента для квот и справедливой очереди
+            (по умолчанию IP-адрес)
+        x_priority: Полоса приоритета: interactive или bulk
+        conf: Порог уверенности детектора для этого запроса
+        iou: Порог IoU для NMS для этого запроса
+        species_conf: Порог уверенности классификатора пород для этого запроса
         
     Returns:
         Dict с результатами анализа изображения
@@ -65,12 +328,8 @@ async def process_image(file: UploadFile = File(...)) -> Dict[str, Any]:
     Raises:
         HTTPException: Если файл не является изображением или произошла ошибка
     """
-    # Проверяем, что файл является изображением
-    if not file.content_type or not file.content_type.startswith("image/"):
-        raise HTTPException(
-            status_code=400, 
-            detail="Файл должен быть изображением"
-        )
+    client_id = admit_upload(request, file, x_client_id)
+    lane = FairScheduler.normalize_lane(x_priority)
     
     try:
         # Читаем содержимое файла
@@ -78,8 +337,12 @@ async def process_image(file: UploadFile = File(...)) -> Dict[str, Any]:
         
         logger.info(f"Получено изображение: {file.filename}, размер: {len(content)} байт")
         
-        # Обрабатываем изображение с помощью процессора
-        analysis_result = image_processor.process_image(content)
+        # Обрабатываем изображение с помощью процессора в пуле инференса
+        deadline = RequestDeadline.from_header(x_request_deadline)
+        analysis_result = await process_content(
+            request, client_id, lane, content, deadline,
+            {'conf': conf, 'iou': iou, 'species_conf': species_conf}
+        )
         
         # Формируем результат
         result = {
@@ -92,6 +355,9 @@ async def process_image(file: UploadFile = File(...)) -> Dict[str, Any]:
         logger.info(f"Обработка завершена для файла: {file.filename}")
         return result
         
+    except DeadlineExceeded as e:
+        logger.warning(f"Обработка файла {file.filename} прервана: {str(e)}")
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"Ошибка при обработке изображения: {str(e)}")
         raise HTTPException(
@@ -100,6 +366,158 @@ async def process_image(file: UploadFile = File(...)) -> Dict[str, Any]:
         )
 
 
+
+@app.post("/process-images")
+async def process_images(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    x_request_deadline: Optional[str] = Header(None, alias=DEADLINE_HEADER),
+    x_client_id: Optional[str] = Header(None, alias=CLIENT_ID_HEADER),
+    x_priority: Optional[str] = Header(None, alias=PRIORITY_HEADER),
+    conf: Optional[float] = Query(None, ge=0.0, le=1.0),
+    iou: Optional[float] = Query(None, ge=0.0, le=1.0),
+    species_conf: Optional[float] = Query(None, ge=0.0, le=1.0)
+) -> Dict[str, Any]:
+    """
+    Обрабатывает несколько изображений (например, альбом) одним запросом.
+
+    Изображения обрабатываются параллельно на всех потоках инференса, по умолчанию
+    в полосе bulk. Квота клиента расходуется по токену на каждое изображение. Ошибка обработки
+    одного изображения не отменяет остальные: для него вместо analysis_result
+    возвращается error (status, detail).
+
+    Параметры совпадают с /process-image.
+
+    Returns:
+        Dict со списком results в порядке файлов запроса
+    """
+    if len(files) > settings.batch_max_images:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Не более {settings.batch_max_images} изображений в одном запросе"
+        )
+    for file in files[1:]:
+        check_image_file(file)
+    client_id = admit_upload(request, files[0], x_client_id, cost=len(files))
+    lane = FairScheduler.normalize_lane(x_priority, default="bulk")
+    contents = [await file.read() for file in files]
+    logger.info(f"Получено изображений для пакетной обработки: {len(files)}, размер: {sum(map(len, contents))} байт")
+    deadline = RequestDeadline.from_header(x_request_deadline)
+    thresholds = {'conf': conf, 'iou': iou, 'species_conf': species_conf}
+
+    outcomes = await asyncio.gather(
+        *(process_content(request, client_id, lane, content, deadline, thresholds) for content in contents),
+        return_exceptions=True
+    )
+    results = []
+    for file, content, outcome in zip(files, contents, outcomes):
+        result = {
+            "filename": file.filename,
+            "file_size": len(content),
+            "content_type": file.content_type,
+        }
+        if isinstance(outcome, DeadlineExceeded):
+            logger.warning(f"Обработка файла {file.filename} прервана: {str(outcome)}")
+            result["error"] = {"status": 504, "detail": str(outcome)}
+        elif isinstance(outcome, Exception):
+            logger.error(f"Ошибка при обработке изображения {file.filename}: {str(outcome)}")
+            result["error"] = {"status": 500, "detail": f"Ошибка при обработке изображения: {str(outcome)}"}
+        else:
+            result["analysis_result"] = outcome
+        results.append(result)
+    logger.info(f"Пакетная обработка завершена: {len(files)} изображений")
+    return {"results": results}
+
+
+def _ndjson(event: Dict[str, Any]) -> bytes:
+    return (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+@app.post("/process-image/stream")
+async def process_image_stream(
+    request: Request,
+    file: UploadFile = File(...),
+    x_request_deadline: Optional[str] = Header(None, alias=DEADLINE_HEADER),
+    x_client_id: Optional[str] = Header(None, alias=CLIENT_ID_HEADER),
+    x_priority: Optional[str] = Header(None, alias=PRIORITY_HEADER),
+    conf: Optional[float] = Query(None, ge=0.0, le=1.0),
+    iou: Optional[float] = Query(None, ge=0.0, le=1.0),
+    species_conf: Optional[float] = Query(None, ge=0.0, le=1.0)
+) -> StreamingResponse:
+    """
+    Потоковый вариант /process-image: ответ в формате NDJSON (одно событие JSON на строку).
+
+    События:
+        detections - найденные объекты без пород, сразу после работы детектора
+        species - породы очередной группы объектов (id, species, species_confidence)
+        result - итоговый результат в том же формате, что и у /process-image
+        error - ошибка обработки (status, detail)
+
+    Параметры совпадают с /process-image.
+    """
+    client_id = admit_upload(request, file, x_client_id)
+    lane = FairScheduler.normalize_lane(x_priority)
+    content = await file.read()
+    logger.info(f"Получено изображение для потоковой обработки: {file.filename}, размер: {len(content)} байт")
+    deadline = RequestDeadline.from_header(x_request_deadline)
+    thresholds = {'conf': conf, 'iou': iou, 'species_conf': species_conf}
+
+    async def events():
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        def on_progress(event: str, payload: Dict[str, Any]) -> None:
+            # Вызывается из потока инференса
+            loop.call_soon_threadsafe(queue.put_nowait, {'event': event, **payload})
+
+        load_controller.enter()
+        started = time.monotonic()
+        getter = None
+        try:
+            async with memory_limiter.reserve(content), scheduler.slot(client_id, lane):
+                future = loop.run_in_executor(
+                    inference_executor, run_processing, content, deadline, thresholds, on_progress
+                )
+                while True:
+                    getter = asyncio.ensure_future(queue.get())
+                    await asyncio.wait({getter, future}, return_when=asyncio.FIRST_COMPLETED)
+                    if not getter.done():
+                        getter.cancel()
+                        break
+                    yield _ndjson(getter.result())
+                # События, поставленные до завершения обработки
+                while not queue.empty():
+                    yield _ndjson(queue.get_nowait())
+                analysis_result = future.result()
+            memory_limiter.record_detections(len(analysis_result.get('detections', [])))
+            yield _ndjson({
+                'event': 'result',
+                'filename': file.filename,
+                'file_size': len(content),
+                'content_type': file.content_type,
+                'analysis_result': analysis_result
+            })
+            logger.info(f"Потоковая обработка завершена для файла: {file.filename}")
+        except DeadlineExceeded as e:
+            logger.warning(f"Обработка файла {file.filename} прервана: {str(e)}")
+            yield _ndjson({'event': 'error', 'status': 504, 'detail': str(e)})
+        except (asyncio.CancelledError, GeneratorExit):
+            # Клиент закрыл соединение: оставшиеся кропы не классифицируем
+            if getter is not None:
+                getter.cancel()
+            logger.info("Клиент отключился, обработка запроса отменяется")
+            deadline_stats.record_disconnect()
+            deadline.cancel()
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка при обработке изображения: {str(e)}")
+            yield _ndjson({'event': 'error', 'status': 500, 'detail': f"Ошибка при обработке изображения: {str(e)}"})
+        finally:
+            load_controller.exit(time.monotonic() - started)
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
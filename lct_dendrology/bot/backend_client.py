@@ -0,0 +1,481 @@
+"""
+Долгоживущий HTTP-клиент бота к бэкенду.
+
+Одна сессия aiohttp на все время работы бота: соединения переиспользуются
+(keep-alive), DNS кэшируется, поэтому серия фотографий не открывает новый сокет
+на каждый запрос. Сбои соединения и ответы 502/503 повторяются с экспоненциальной
+задержкой со случайным разбросом: обработка изображения не меняет состояние
+сервера, поэтому повтор запроса безопасен.
+
+Если бэкендов несколько, запрос уходит на наименее загруженный (по числу
+незавершенных запросов или по EWMA задержки), повтор - на другой. Фоновая
+проверка /ready выводит из ротации неготовые бэкенды и возвращает восстановившиеся.
+Запрос, ответ на который задерживается дольше заданного перцентиля, дублируется
+на второй бэкенд; используется первый ответ, второй запрос отменяется.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import (
+    Any,
+    AsyncContextManager,
+    AsyncIterator,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Ответы, после которых запрос имеет смысл повторить (перезапуск сервера, прокси).
+# 504 не повторяется: сервер возвращает его, когда дедлайн запроса уже истек
+RETRY_STATUSES = (502, 503)
+BALANCING_POLICIES = ("least_outstanding", "ewma")
+READY_PATH = "/ready"
+HEALTH_CHECK_TIMEOUT = 2.0
+# Вес нового измерения в EWMA задержки
+EWMA_ALPHA = 0.3
+# Количество последних задержек каждого пути для перцентиля дублирования
+LATENCY_WINDOW = 200
+# Минимум измерений, после которого запросы начинают дублироваться
+HEDGE_MIN_SAMPLES = 20
+
+
+class Backend:
+    """Состояние одного экземпляра бэкенда."""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.outstanding = 0
+        self.ewma: Optional[float] = None
+        self.healthy = True
+        # Сбои подряд; сбрасываются успешным ответом или проверкой готовности
+        self.failures = 0
+        self.requests = 0
+        self.errors = 0
+
+    def record_success(self, latency: float) -> None:
+        self.ewma = latency if self.ewma is None else EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self.ewma
+        self.failures = 0
+
+    def record_failure(self, eject_after: int = 0) -> None:
+        """
+        Args:
+            eject_after: Количество сбоев подряд, после которого бэкенд выводится из ротации (0 - не выводится)
+        """
+        self.errors += 1
+        self.failures += 1
+        if eject_after and self.failures >= eject_after:
+            self.eject()
+
+    def eject(self) -> None:
+        if self.healthy:
+            logger.warning(f"Бэкенд {self.url} выведен из ротации")
+        self.healthy = False
+
+    def readmit(self) -> None:
+        if not self.healthy:
+            logger.info(f"Бэкенд {self.url} возвращен в ротацию")
+        self.healthy = True
+        self.failures = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'url': self.url,
+            'healthy': self.healthy,
+            'outstanding': self.outstanding,
+            'ewma_latency': self.ewma,
+            'requests': self.requests,
+            'errors': self.errors,
+        }
+
+
+class BackendClient:
+    """Пул соединений к бэкендам с балансировкой, повторами запросов и метриками пула."""
+
+    def __init__(
+        self,
+        base_urls: Union[str, Sequence[str]],
+        timeout: float = 30.0,
+        connection_limit: int = 32,
+        keepalive_timeout: float = 30.0,
+        dns_cache_ttl: int = 300,
+        retries: int = 2,
+        retry_backoff: float = 0.3,
+        balancing: str = "least_outstanding",
+        health_interval: float = 0.0,
+        eject_after: int = 3,
+        hedge_percentile: Optional[float] = None
+    ):
+        """
+        Args:
+            base_urls: Адрес бэкенда или список адресов
+            timeout: Общее время на запрос с учетом повторов в секундах
+            connection_limit: Максимальное количество одновременных соединений
+            keepalive_timeout: Время жизни простаивающего соединения в секундах
+            dns_cache_ttl: Время кэширования DNS в секундах
+            retries: Количество повторов после сбоя
+            retry_backoff: Базовая задержка перед повтором в секундах
+            balancing: Выбор бэкенда: least_outstanding (меньше незавершенных запросов)
+                или ewma (меньше EWMA задержки с учетом незавершенных запросов)
+            health_interval: Интервал проверки /ready в секундах (0 - без проверок и вывода из ротации)
+            eject_after: Количество сбоев подряд, после которого бэкенд выводится из ротации
+            hedge_percentile: Перцентиль задержки (0-100), после которого запрос дублируется
+                на второй бэкенд (None - без дублирования)
+        """
+        if balancing not in BALANCING_POLICIES:
+            raise ValueError(f"Неизвестная политика балансировки: {balancing}")
+        if isinstance(base_urls, str):
+            base_urls = [base_urls]
+        if not base_urls:
+            raise ValueError("Не задан ни один адрес бэкенда")
+        self.backends = [Backend(url) for url in base_urls]
+        self.base_url = self.backends[0].url
+        self.timeout = timeout
+        self.connection_limit = connection_limit
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.balancing = balancing
+        self.health_interval = health_interval
+        self.eject_after = eject_after
+        self.hedge_percentile = hedge_percentile
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._health_task: Optional[asyncio.Task] = None
+        self._latencies: Dict[str, Deque[float]] = {}
+        self.requests = 0
+        self.retried = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.in_flight = 0
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_connection_create_end(session, context, params) -> None:
+            self.connections_created += 1
+
+        async def on_connection_reuseconn(session, context, params) -> None:
+            self.connections_reused += 1
+
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace_config
+
+    async def start(self) -> None:
+        """Создает сессию и запускает проверки готовности (вызывается при запуске бота)."""
+        if self._session is not None and not self._session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.connection_limit,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=self.dns_cache_ttl,
+        )
+        self._session = aiohttp.ClientSession(connector=connector, trace_configs=[self._trace_config()])
+        # С одним бэкендом выводить из ротации некуда
+        if self.health_interval > 0 and len(self.backends) > 1:
+            self._health_task = asyncio.create_task(self._health_loop())
+        urls = ", ".join(backend.url for backend in self.backends)
+        logger.info(f"HTTP-клиент бэкенда запущен: {urls}, соединений не более {self.connection_limit}")
+
+    async def close(self) -> None:
+        """Закрывает сессию и все соединения (вызывается при остановке бота)."""
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info(f"HTTP-клиент бэкенда остановлен: {self.get_stats()}")
+        self._session = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            await self.start()
+        return self._session
+
+    @property
+    def _eject_after(self) -> int:
+        # Без активных проверок выведенный бэкенд некому вернуть в ротацию
+        return self.eject_after if self.health_interval > 0 else 0
+
+    async def _check_backend(self, session: aiohttp.ClientSession, backend: Backend) -> None:
+        try:
+            async with session.get(
+                f"{backend.url}{READY_PATH}",
+                timeout=aiohttp.ClientTimeout(total=HEALTH_CHECK_TIMEOUT)
+            ) as response:
+                ready = response.status == 200
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            backend.record_failure(self._eject_after)
+            return
+        if ready:
+            backend.readmit()
+        else:
+            # Бэкенд отвечает, но не готов (например, загружает модели)
+            backend.eject()
+
+    async def check_health(self) -> None:
+        """Проверяет готовность всех бэкендов и обновляет ротацию."""
+        session = await self._get_session()
+        await asyncio.gather(*(self._check_backend(session, backend) for backend in self.backends))
+
+    async def _health_loop(self) -> None:
+        while True:
+            try:
+                await self.check_health()
+            except Exception as e:
+                logger.warning(f"Ошибка проверки готовности бэкендов: {str(e)}")
+            await asyncio.sleep(self.health_interval)
+
+    def pick_backend(self, exclude: Sequence[Backend] = ()) -> Backend:
+        """
+        Выбирает бэкенд для запроса среди находящихся в ротации.
+        Если в ротации никого нет, выбор идет среди всех: лучше попытаться, чем отказать сразу.
+        Args:
+            exclude: Бэкенды, которые уже пробовали для этого запроса
+        """
+        candidates = [backend for backend in self.backends if backend.healthy and backend not in exclude]
+        if not candidates:
+            candidates = [backend for backend in self.backends if backend not in exclude] or self.backends
+        if self.balancing == "ewma":
+            # Бэкенды без измерений получают запросы первыми
+            def cost(backend: Backend) -> float:
+                return (backend.ewma or 0.0) * (backend.outstanding + 1)
+        else:
+            def cost(backend: Backend) -> float:
+                return backend.outstanding
+        best = min(cost(backend) for backend in candidates)
+        return random.choice([backend for backend in candidates if cost(backend) == best])
+
+    def hedge_delay(self, path: str) -> Optional[float]:
+        """Задержка, после которой запрос к path дублируется (None - не дублируется)."""
+        window = self._latencies.get(path)
+        if self.hedge_percentile is None or len(self.backends) < 2 or window is None or len(window) < HEDGE_MIN_SAMPLES:
+            return None
+        latencies = sorted(window)
+        return latencies[int(self.hedge_percentile / 100 * (len(latencies) - 1))]
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Задержка перед повтором attempt (с 0): равномерно от 0 до backoff * 2^attempt."""
+        return random.uniform(0, self.retry_backoff * 2 ** attempt)
+
+    async def _send(
+        self,
+        session: aiohttp.ClientSession,
+        backend: Backend,
+        path: str,
+        files: Sequence[Tuple[str, bytes, str]],
+        headers: Optional[Dict[str, str]],
+        timeout: float
+    ) -> aiohttp.ClientResponse:
+        """Одна попытка запроса; ответ освобождается через _release."""
+        # FormData нельзя отправить повторно, поэтому собирается на каждую попытку
+        data = aiohttp.FormData()
+        for field, image_data, filename in files:
+            data.add_field(field, image_data, filename=filename, content_type='image/jpeg')
+        self.in_flight += 1
+        backend.outstanding += 1
+        backend.requests += 1
+        started = time.monotonic()
+        try:
+            response = await session.post(
+                f"{backend.url}{path}",
+                data=data,
+                headers=headers,
+                timeout=aiohttp.ClientTimeout(total=timeout)
+            )
+        except aiohttp.ClientConnectionError:
+            self._finish(backend)
+            backend.record_failure(self._eject_after)
+            raise
+        except BaseException:
+            self._finish(backend)
+            raise
+        if response.status in RETRY_STATUSES:
+            backend.record_failure(self._eject_after)
+        else:
+            latency = time.monotonic() - started
+            backend.record_success(latency)
+            self._latencies.setdefault(path, deque(maxlen=LATENCY_WINDOW)).append(latency)
+        return response
+
+    def _finish(self, backend: Backend) -> None:
+        self.in_flight -= 1
+        backend.outstanding -= 1
+
+    def _release(self, backend: Backend, response: aiohttp.ClientResponse) -> None:
+        response.release()
+        self._finish(backend)
+
+    async def _send_hedged(
+        self,
+        session: aiohttp.ClientSession,
+        backend: Backend,
+        path: str,
+        files: Sequence[Tuple[str, bytes, str]],
+        headers: Optional[Dict[str, str]],
+        timeout: float
+    ) -> Tuple[Backend, aiohttp.ClientResponse]:
+        """
+        Запрос к backend, который дублируется на второй бэкенд, если ответ задерживается
+        дольше перцентиля задержки. Отмененный запрос закрывает соединение, и сервер
+        прекращает его обработку.
+        """
+        delay = self.hedge_delay(path)
+        if delay is None or delay >= timeout:
+            return backend, await self._send(session, backend, path, files, headers, timeout)
+
+        tasks = {asyncio.ensure_future(self._send(session, backend, path, files, headers, timeout)): backend}
+        winner = None
+        error: Optional[BaseException] = None
+        try:
+            done, pending = await asyncio.wait(set(tasks), timeout=delay)
+            if not done:
+                second = self.pick_backend(exclude=[backend])
+                if second is not backend:
+                    self.hedged += 1
+                    tasks[asyncio.ensure_future(
+                        self._send(session, second, path, files, headers, timeout - delay)
+                    )] = second
+                    pending = set(tasks)
+            while winner is None and (done or pending):
+                if not done:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                    elif winner is None:
+                        winner = task
+                done = set()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif task is not winner and not task.cancelled() and task.exception() is None:
+                    # Оба ответа пришли одновременно (или ожидание отменено): лишний освобождается
+                    self._release(tasks[task], task.result())
+        if winner is None:
+            raise error
+        if tasks[winner] is not backend:
+            self.hedge_wins += 1
+        return tasks[winner], winner.result()
+
+    def post_image(
+        self,
+        path: str,
+        image_data: bytes,
+        filename: str,
+        headers: Optional[Dict[str, str]] = None,
+        deadline: Optional[float] = None
+    ) -> AsyncContextManager[aiohttp.ClientResponse]:
+        """
+        Отправляет изображение методом POST (поле file) и возвращает ответ.
+        Повторяет запрос при сбое соединения или ответе из RETRY_STATUSES,
+        пока не исчерпаны повторы и не истек дедлайн.
+        Args:
+            path: Путь на сервере
+            image_data: Байты изображения
+            filename: Имя файла
+            headers: Заголовки запроса
+            deadline: Абсолютный дедлайн (time.time()); по умолчанию через timeout секунд
+        Raises:
+            asyncio.TimeoutError: Дедлайн истек
+            aiohttp.ClientError: Сбой соединения после всех повторов
+        """
+        return self.post_files(path, [('file', image_data, filename)], headers=headers, deadline=deadline)
+
+    @asynccontextmanager
+    async def post_files(
+        self,
+        path: str,
+        files: Sequence[Tuple[str, bytes, str]],
+        headers: Optional[Dict[str, str]] = None,
+        deadline: Optional[float] = None
+    ) -> AsyncIterator[aiohttp.ClientResponse]:
+        """
+        Отправляет изображения одним запросом multipart/form-data (см. post_image).
+        Args:
+            files: Поля формы (имя поля, байты изображения, имя файла)
+        """
+        session = await self._get_session()
+        deadline = deadline if deadline is not None else time.time() + self.timeout
+        self.requests += 1
+        attempt = 0
+        tried: List[Backend] = []
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            # Повтор уходит на другой бэкенд, если он есть
+            backend = self.pick_backend(exclude=tried[-1:])
+            tried.append(backend)
+            try:
+                backend, response = await self._send_hedged(session, backend, path, files, headers, remaining)
+            except aiohttp.ClientConnectionError as e:
+                if attempt >= self.retries:
+                    raise
+                retry_reason = str(e) or type(e).__name__
+            else:
+                if response.status not in RETRY_STATUSES or attempt >= self.retries:
+                    try:
+                        yield response
+                    finally:
+                        self._release(backend, response)
+                    return
+                self._release(backend, response)
+                retry_reason = f"статус {response.status}"
+            delay = self.backoff_delay(attempt)
+            attempt += 1
+            self.retried += 1
+            logger.warning(
+                f"Повтор запроса {path} к {backend.url} ({attempt}/{self.retries}) через {delay:.2f} с: {retry_reason}"
+            )
+            await asyncio.sleep(delay)
+
+    async def get_json(self, path: str, timeout: Optional[float] = None) -> Any:
+        """
+        Выполняет GET-запрос и возвращает JSON ответа.
+        Raises:
+            aiohttp.ClientResponseError: Сервер вернул ошибку
+        """
+        session = await self._get_session()
+        backend = self.pick_backend()
+        async with session.get(
+            f"{backend.url}{path}",
+            timeout=aiohttp.ClientTimeout(total=timeout or self.timeout)
+        ) as response:
+            response.raise_for_status()
+            return await response.json()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Метрики пула соединений, повторов и бэкендов."""
+        connector = None if self._session is None else self._session.connector
+        return {
+            'requests': self.requests,
+            'retried': self.retried,
+            'hedged': self.hedged,
+            'hedge_wins': self.hedge_wins,
+            'in_flight': self.in_flight,
+            'connections_created': self.connections_created,
+            'connections_reused': self.connections_reused,
+            'connection_limit': self.connection_limit,
+            'open': connector is not None and not connector.closed,
+            'backends': [backend.get_stats() for backend in self.backends],
+        }
@@ -2,13 +2,19 @@ from __future__ import annotations
 from PIL import Image, ImageDraw, ImageFont
 
 import io
-import pandas as pd
+import json
 import asyncio
 import logging
-from typing import Final
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, Final, List, Optional, Sequence, Tuple
 
 import aiohttp
-from telegram import Update
+from aiohttp import web
+from telegram import Message, PhotoSize, Update, User
 from telegram.ext import (
     AIORateLimiter,
     Application,
@@ -19,6 +25,12 @@ from telegram.ext import (
     filters,
 )
 
+from lct_dendrology.bot.backend_client import BackendClient
+from lct_dendrology.bot.reply import PHOTO_CAPTION, send_reply
+from lct_dendrology.bot.report import build_report
+from lct_dendrology.bot.result_cache import ResultCache
+from lct_dendrology.bot.webhook import create_dedup_store, create_webhook_app
+from lct_dendrology.bot.work_queue import QueueOverflow, WorkQueue
 from lct_dendrology.cfg import settings
 
 
@@ -29,15 +41,144 @@ logger = logging.getLogger(__name__)
 STUB_TEXT: Final[str] = "Заглушка: изображение получено. Текст будет здесь."
 SERVER_URL: Final[str] = f"http://{settings.backend_host}:{settings.backend_port}"
 TIMEOUT: Final[int] = 30  # Можно добавить в настройки при необходимости
+# Заголовок с абсолютным дедлайном запроса: сервер бросает работу, которую бот уже не ждет
+DEADLINE_HEADER: Final[str] = "X-Request-Deadline"
+# Идентификатор клиента для квот и справедливой очереди на сервере
+CLIENT_ID_HEADER: Final[str] = "X-Client-Id"
+PRIORITY_HEADER: Final[str] = "X-Priority"
+# Минимальный интервал между редактированиями сообщения при потоковом ответе (лимиты Telegram)
+STREAM_EDIT_INTERVAL: Final[float] = 1.0
+# Отметка породы, которая еще определяется
+PENDING_SPECIES: Final[str] = "…"
+PROCESSING_TEXT: Final[str] = "🔄 Обрабатываю изображение..."
+QUEUE_POSITION_TEXT: Final[str] = "⏳ Изображение в очереди на обработку, позиция {position}"
+QUEUE_FULL_TEXT: Final[str] = "⏳ Сейчас слишком много изображений в обработке. Попробуйте отправить фото позже."
+PROCESSING_ERROR_TEXT: Final[str] = (
+    "❌ Произошла ошибка при обработке изображения.\n\n"
+    "Возможные причины:\n"
+    "• Сервер временно недоступен\n"
+    "• Проблемы с подключением к интернету\n"
+    "• Неподдерживаемый формат изображения\n\n"
+    "Попробуйте еще раз через несколько минут."
+)
+# Максимальная сторона фото, которую показывает Telegram: больше рисовать нет смысла
+TELEGRAM_PHOTO_MAX_SIDE: Final[int] = 1280
+FONT_SIZE: Final[int] = 26
+
+# Отрисовка разметки и формирование отчетов выполняются в отдельных потоках, чтобы не блокировать event loop
+render_executor = ThreadPoolExecutor(
+    max_workers=settings.bot_render_workers,
+    thread_name_prefix="render"
+)
+
+# Общий пул соединений с бэкендами на все время работы бота
+backend_client = BackendClient(
+    settings.bot_backend_urls or [SERVER_URL],
+    timeout=TIMEOUT,
+    connection_limit=settings.bot_backend_connection_limit,
+    keepalive_timeout=settings.bot_backend_keepalive_timeout,
+    dns_cache_ttl=settings.bot_backend_dns_cache_ttl,
+    retries=settings.bot_backend_retries,
+    retry_backoff=settings.bot_backend_retry_backoff,
+    balancing=settings.bot_backend_balancing,
+    health_interval=settings.bot_backend_health_interval,
+    eject_after=settings.bot_backend_eject_after,
+    hedge_percentile=settings.bot_backend_hedge_percentile,
+)
+
+
+# Кэш /processor-info бэкенда: значение, время истечения по time.monotonic
+# и последняя полученная версия моделей
+_processor_info_cache: Dict[str, Any] = {'value': None, 'expires': 0.0, 'model_version': None}
+# Фото альбомов, ожидающие остальных частей: media_group_id -> обновления и время последнего
+_pending_albums: Dict[str, Dict[str, Any]] = {}
+# Очередь обработки фото: общий предел и предел на пользователя
+work_queue = WorkQueue(
+    max_concurrent=settings.bot_max_concurrent,
+    max_per_user=settings.bot_max_per_user,
+    max_queued=settings.bot_max_queued,
+    overflow=settings.bot_queue_overflow,
+)
+# Ответы на уже обработанные фото по (file_unique_id, версия моделей)
+result_cache = ResultCache(max_size=settings.bot_result_cache_size, ttl=settings.bot_result_cache_ttl)
+
+
+def build_request_headers(
+    deadline: float,
+    client_id: Optional[str] = None,
+    priority: str = "interactive"
+) -> Dict[str, str]:
+    """Заголовки запроса на обработку: дедлайн, приоритет и идентификатор клиента."""
+    headers = {
+        DEADLINE_HEADER: f"{deadline:.3f}",
+        PRIORITY_HEADER: priority,
+    }
+    if client_id is not None:
+        headers[CLIENT_ID_HEADER] = client_id
+    return headers
+
+
+async def get_processor_info() -> Optional[Dict[str, Any]]:
+    """
+    Состояние бэкенда из /processor-info (кэшируется на bot_processor_info_ttl).
+    Returns:
+        dict или None, если бэкенд недоступен
+    """
+    now = time.monotonic()
+    if now < _processor_info_cache['expires']:
+        return _processor_info_cache['value']
+    try:
+        value = await backend_client.get_json("/processor-info", timeout=5)
+    except Exception as e:
+        logger.warning(f"Не удалось получить /processor-info: {str(e)}")
+        value = None
+    _processor_info_cache.update(value=value, expires=now + settings.bot_processor_info_ttl)
+    return value
+
+
+async def get_model_version() -> Optional[str]:
+    """
+    Версия моделей бэкенда для ключа кэша результатов.
+    Если бэкенд недоступен, возвращается последняя известная версия, чтобы ответы
+    из кэша выдавались и во время сбоя бэкенда.
+    Returns:
+        str или None, если инференс отключен или версия еще ни разу не получена
+    """
+    info = await get_processor_info()
+    if info is not None:
+        _processor_info_cache['model_version'] = info.get('model_version')
+    return _processor_info_cache['model_version']
+
+
+async def get_backend_input_size() -> Optional[int]:
+    """
+    Размер входа детектора бэкенда.
+    Returns:
+        int или None, если инференс отключен или бэкенд недоступен
+    """
+    info = await get_processor_info()
+    return None if info is None else info.get('input_size')
 
 
-async def send_image_to_server(image_data: bytes, filename: str) -> dict:
+def choose_photo_size(photos: Sequence[PhotoSize], min_side: int) -> PhotoSize:
+    """
+    Выбирает наименьший вариант фото, длинная сторона которого не меньше min_side.
+    Варианты Telegram отсортированы по размеру; если ни один не подходит, берется самый большой.
+    """
+    for photo in photos:
+        if max(photo.width, photo.height) >= min_side:
+            return photo
+    return photos[-1]
+
+
+async def send_image_to_server(image_data: bytes, filename: str, client_id: Optional[str] = None) -> dict:
     """
     Отправляет изображение на сервер для обработки.
     
     Args:
         image_data: Байты изображения
         filename: Имя файла
+        client_id: Идентификатор пользователя Telegram для квот на сервере
         
     Returns:
         Результат обработки от сервера
@@ -45,56 +186,172 @@ async def send_image_to_server(image_data: bytes, filename: str) -> dict:
     Raises:
         Exception: При ошибке связи с сервером
     """
-    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=TIMEOUT)) as session:
-        data = aiohttp.FormData()
-        data.add_field('file', image_data, filename=filename, content_type='image/jpeg')
+    deadline = time.time() + TIMEOUT
+    headers = build_request_headers(deadline, client_id)
+    try:
+        async with backend_client.post_image(
+            "/process-image", image_data, filename, headers=headers, deadline=deadline
+        ) as response:
+            if response.status == 200:
+                result = await response.json()
+                logger.info(f"Изображение успешно обработано сервером: {filename}")
+                return result
+            elif response.status == 429:
+                logger.warning(f"Превышена квота запросов клиента {client_id}")
+                raise Exception("Слишком много запросов, попробуйте позже")
+            else:
+                error_text = await response.text()
+                logger.error(f"Сервер вернул ошибку {response.status}: {error_text}")
+                raise Exception(f"Сервер вернул ошибку {response.status}")
+                
+    except asyncio.TimeoutError:
+        logger.error("Таймаут при обращении к серверу")
+        raise Exception("Сервер не отвечает слишком долго")
+    except aiohttp.ClientError as e:
+        logger.error(f"Ошибка связи с сервером: {str(e)}")
+        raise Exception("Не удается подключиться к серверу")
+
+
+async def send_images_to_server(
+    images: Sequence[Tuple[bytes, str]],
+    client_id: Optional[str] = None
+) -> List[dict]:
+    """
+    Отправляет несколько изображений (альбом) на пакетную обработку одним запросом.
+    
+    Args:
+        images: Пары (байты изображения, имя файла)
+        client_id: Идентификатор пользователя Telegram для квот на сервере
         
-        try:
-            async with session.post(f"{SERVER_URL}/process-image", data=data) as response:
-                if response.status == 200:
-                    result = await response.json()
+    Returns:
+        Результаты по изображениям в исходном порядке; для необработанных - поле error
+        
+    Raises:
+        Exception: При ошибке связи с сервером
+    """
+    deadline = time.time() + TIMEOUT
+    # Альбом отправлен пользователем и ждет ответа так же, как одиночное фото
+    headers = build_request_headers(deadline, client_id)
+    files = [('files', image_data, filename) for image_data, filename in images]
+    try:
+        async with backend_client.post_files("/process-images", files, headers=headers, deadline=deadline) as response:
+            if response.status == 200:
+                results = (await response.json())['results']
+                logger.info(f"Альбом из {len(images)} изображений успешно обработан сервером")
+                return results
+            elif response.status == 429:
+                logger.warning(f"Превышена квота запросов клиента {client_id}")
+                raise Exception("Слишком много запросов, попробуйте позже")
+            else:
+                error_text = await response.text()
+                logger.error(f"Сервер вернул ошибку {response.status}: {error_text}")
+                raise Exception(f"Сервер вернул ошибку {response.status}")
+                
+    except asyncio.TimeoutError:
+        logger.error("Таймаут при обращении к серверу")
+        raise Exception("Сервер не отвечает слишком долго")
+    except aiohttp.ClientError as e:
+        logger.error(f"Ошибка связи с сервером: {str(e)}")
+        raise Exception("Не удается подключиться к серверу")
+
+
+async def stream_image_from_server(
+    image_data: bytes,
+    filename: str,
+    client_id: Optional[str] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Отправляет изображение на потоковую обработку и возвращает события по мере готовности.
+    
+    Args:
+        image_data: Байты изображения
+        filename: Имя файла
+        client_id: Идентификатор пользователя Telegram для квот на сервере
+        
+    Yields:
+        События сервера: detections, species и итоговое result
+        
+    Raises:
+        Exception: При ошибке связи с сервером или ошибке обработки
+    """
+    deadline = time.time() + TIMEOUT
+    headers = build_request_headers(deadline, client_id)
+    try:
+        async with backend_client.post_image(
+            "/process-image/stream", image_data, filename, headers=headers, deadline=deadline
+        ) as response:
+            if response.status == 429:
+                logger.warning(f"Превышена квота запросов клиента {client_id}")
+                raise Exception("Слишком много запросов, попробуйте позже")
+            if response.status != 200:
+                error_text = await response.text()
+                logger.error(f"Сервер вернул ошибку {response.status}: {error_text}")
+                raise Exception(f"Сервер вернул ошибку {response.status}")
+            async for line in response.content:
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                if event.get('event') == 'error':
+                    logger.error(f"Сервер вернул ошибку {event.get('status')}: {event.get('detail')}")
+                    raise Exception(f"Сервер вернул ошибку {event.get('status')}")
+                yield event
+                if event.get('event') == 'result':
                     logger.info(f"Изображение успешно обработано сервером: {filename}")
-                    return result
-                else:
-                    error_text = await response.text()
-                    logger.error(f"Сервер вернул ошибку {response.status}: {error_text}")
-                    raise Exception(f"Сервер вернул ошибку {response.status}")
-                    
-        except asyncio.TimeoutError:
-            logger.error("Таймаут при обращении к серверу")
-            raise Exception("Сервер не отвечает слишком долго")
-        except aiohttp.ClientError as e:
-            logger.error(f"Ошибка связи с сервером: {str(e)}")
-            raise Exception("Не удается подключиться к серверу")
-
-
-def draw_bboxes_with_ids(image_bytes: bytes, analysis: dict) -> io.BytesIO:
+                    return
+        raise Exception("Сервер прервал ответ до получения результата")
+                
+    except asyncio.TimeoutError:
+        logger.error("Таймаут при обращении к серверу")
+        raise Exception("Сервер не отвечает слишком долго")
+    except aiohttp.ClientError as e:
+        logger.error(f"Ошибка связи с сервером: {str(e)}")
+        raise Exception("Не удается подключиться к серверу")
+
+
+@lru_cache(maxsize=None)
+def load_font(size: int) -> ImageFont.ImageFont:
+    """Загружает шрифт заданного размера один раз (стандартный, если arial недоступен)."""
+    try:
+        return ImageFont.truetype("arial.ttf", size)
+    except Exception:
+        return ImageFont.load_default()
+
+
+def draw_bboxes_with_ids(
+    image_bytes: bytes,
+    analysis: dict,
+    max_side: int = TELEGRAM_PHOTO_MAX_SIDE
+) -> io.BytesIO:
     """
     Наносит на изображение bbox-ы с id объектов.
+    Изображение уменьшается до размера, в котором его покажет Telegram; JPEG
+    при этом декодируется сразу в уменьшенном масштабе.
     Args:
         image_bytes: исходное изображение в байтах
         analysis: результат анализа (dict)
+        max_side: максимальная сторона результата в пикселях
     Returns:
         BytesIO с изображением
     """
-    img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+    img = Image.open(io.BytesIO(image_bytes))
+    original_width = img.width
+    img.thumbnail((max_side, max_side))
+    img = img.convert("RGB")
+    # Координаты bbox-ов заданы для исходного размера
+    scale = img.width / original_width
     draw = ImageDraw.Draw(img)
     detections = analysis.get('detections', [])
-    # Попробуем использовать стандартный шрифт
-    try:
-        font = ImageFont.truetype("arial.ttf", 26)
-    except Exception:
-        font = ImageFont.load_default()
+    font = load_font(FONT_SIZE)
 
     for det in detections:
         bbox = det.get('bbox')
         obj_id = det.get('id')
         if bbox:
-            xy = [bbox['x1'], bbox['y1'], bbox['x2'], bbox['y2']]
+            xy = [bbox['x1'] * scale, bbox['y1'] * scale, bbox['x2'] * scale, bbox['y2'] * scale]
             draw.rectangle(xy, outline="blue", width=2)
             # Подпись id внутри bbox (левый верхний угол + небольшой отступ)
-            text_x = bbox['x1'] + 3
-            text_y = bbox['y1'] + 3
+            text_x = xy[0] + 3
+            text_y = xy[1] + 3
             # Получаем размер текста
             bbox_text = font.getbbox(f"{obj_id}")
             text_width = bbox_text[2] - bbox_text[0]
@@ -108,11 +365,28 @@ def draw_bboxes_with_ids(image_bytes: bytes, analysis: dict) -> io.BytesIO:
             # Рисуем зеленый текст поверх
             draw.text((text_x + 2, text_y + 1), f"{obj_id}", fill="blue", font=font)
     output = io.BytesIO()
-    img.save(output, format="JPEG")
+    img.save(output, format="JPEG", quality=settings.bot_jpeg_quality, optimize=True)
     output.seek(0)
     return output
 
 
+async def render_bboxes(image_bytes: bytes, analysis: dict) -> io.BytesIO:
+    """Отрисовывает разметку в пуле render_executor, не блокируя event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(render_executor, draw_bboxes_with_ids, image_bytes, analysis)
+
+
+def format_detection_list(detections: list) -> str:
+    """Нумерованный список найденных объектов с породами."""
+    detected_list = []
+    for det in detections:
+        obj_id = det.get('id', 'N/A')
+        species: str = det.get('species', 'unknown')
+        species = species if species is not None else 'unknown'
+        detected_list.append(f"{obj_id}. {species.capitalize()}")
+    return "\n".join(detected_list)
+
+
 def format_analysis_result(analysis: dict) -> str:
     """
     Форматирует результат анализа для вывода пользователю.
@@ -128,40 +402,80 @@ def format_analysis_result(analysis: dict) -> str:
             "Объекты не обнаружены на изображении."
         )
     
-    # Формируем нумерованный список объектов
-    detected_list = []
-    for i, det in enumerate(detections):
-        obj_id = det.get('id', 'N/A')
-        class_name = det.get('class_name', 'unknown')
-        species: str = det.get('species', 'unknown')
-        species = species if species is not None else 'unknown'
-        detected_list.append(f"{obj_id}. {species.capitalize()}")
-    
-    detected_list = "\n".join(detected_list)
-    
     return (
         "📊 Результат анализа:\n\n"
         "Найденные объекты:\n"
-        f"{detected_list}\n\n"
+        f"{format_detection_list(detections)}\n\n"
         f"Всего объектов: {len(detections)}"
     )
 
 
+def format_album_result(results: List[dict]) -> str:
+    """
+    Форматирует результаты анализа альбома: объекты каждого фото по порядку.
+    Args:
+        results: Результаты /process-images по фото альбома
+    Returns:
+        Строка для отправки пользователю
+    """
+    parts = []
+    total = 0
+    for i, result in enumerate(results, start=1):
+        detections = result.get('analysis_result', {}).get('detections', [])
+        total += len(detections)
+        if 'error' in result:
+            body = "Не удалось обработать изображение."
+        elif detections:
+            body = format_detection_list(detections)
+        else:
+            body = "Объекты не обнаружены."
+        parts.append(f"🖼 Фото {i}:\n{body}")
+    return (
+        "📊 Результат анализа альбома:\n\n"
+        + "\n\n".join(parts)
+        + f"\n\nВсего объектов: {total}"
+    )
+
+
+def format_stub_result(result: dict) -> str:
+    """Сообщение для режима заглушки (инференс на сервере отключен)."""
+    return (
+        "✅ Изображение успешно получено!\n\n"
+        "📋 Информация о файле:\n"
+        f"• Размер: {result.get('file_size', 'неизвестно')} байт\n"
+        f"• Тип: {result.get('content_type', 'неизвестно')}\n\n"
+        "🤖 В данный момент нейросеть находится в режиме заглушки. "
+        "Реальные результаты анализа появятся после интеграции модели."
+    )
+
+
+def format_analysis_progress(detections: list) -> str:
+    """
+    Форматирует промежуточный результат: объекты найдены, породы еще определяются.
+    Args:
+        detections: Детекции; у еще не классифицированных порода равна PENDING_SPECIES
+    Returns:
+        Строка для отправки пользователю
+    """
+    done = sum(1 for det in detections if det.get('species') != PENDING_SPECIES)
+    return (
+        format_analysis_result({'detections': detections})
+        + f"\n\n⏳ Определено пород: {done} из {len(detections)}"
+    )
+
+
 def analysis_to_excel(analysis: dict) -> io.BytesIO:
     """
     Преобразует результат анализа в Excel-таблицу.
     Возвращает BytesIO для отправки как файл.
     """
-    detections = analysis.get('detections', [])
-    if not detections:
-        df = pd.DataFrame([{"Нет объектов": ""}])
-    else:
-        df = pd.DataFrame(detections)
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df.to_excel(writer, index=False, sheet_name="Detections")
-    output.seek(0)
-    return output
+    return build_report(analysis, "xlsx")[0]
+
+
+async def generate_report(analysis: dict) -> Tuple[io.BytesIO, str]:
+    """Формирует файл с результатами в формате bot_report_format вне event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(render_executor, build_report, analysis, settings.bot_report_format)
 
 
 async def handle_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -172,6 +486,291 @@ async def handle_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     )
 
 
+async def process_image_streaming(
+    update: Update,
+    processing_msg,
+    image_data: bytes,
+    filename: str,
+    client_id: Optional[str] = None
+) -> Tuple[dict, Optional[Message]]:
+    """
+    Обрабатывает изображение потоком: разметка отправляется сразу после детекции,
+    а список пород в сообщении дополняется по мере классификации.
+    Returns:
+        Tuple[dict, Optional[Message]]: итоговый результат сервера и сообщение с уже
+        отправленным изображением с разметкой (None, если не отправлялось)
+    """
+    detections: Dict[Any, dict] = {}
+    photo_message = None
+    last_edit = 0.0
+    async for event in stream_image_from_server(image_data, filename, client_id=client_id):
+        kind = event.get('event')
+        if kind == 'result':
+            return event, photo_message
+        if kind == 'detections':
+            for det in event.get('detections', []):
+                det['species'] = PENDING_SPECIES
+                detections[det.get('id')] = det
+            marked_image = await render_bboxes(image_data, {'detections': list(detections.values())})
+            photo_message = await update.effective_message.reply_photo(
+                photo=marked_image,
+                caption=PHOTO_CAPTION
+            )
+        elif kind == 'species':
+            for item in event.get('detections', []):
+                if item.get('id') in detections:
+                    detections[item['id']].update(item)
+            if time.monotonic() - last_edit < STREAM_EDIT_INTERVAL:
+                continue
+        else:
+            continue
+        if detections:
+            await processing_msg.edit_text(format_analysis_progress(list(detections.values())))
+            last_edit = time.monotonic()
+    raise Exception("Сервер прервал ответ до получения результата")
+
+
+def sent_file_id(message: Optional[Message]) -> Optional[str]:
+    """file_id фото или документа в отправленном сообщении (None, если его нет)."""
+    if message is None:
+        return None
+    if message.photo:
+        return message.photo[-1].file_id
+    return None if message.document is None else message.document.file_id
+
+
+def is_complete_analysis(analysis: dict) -> bool:
+    """Результат получен полной обработкой: уровень качества 0, без пропуска и прерывания."""
+    model_info = analysis.get('model_info') or {}
+    if model_info.get('quality_tier', 0) != 0:
+        return False
+    # status есть только у ответов без полной обработки: skipped, error, disabled
+    if 'status' in model_info:
+        return False
+    return not (analysis.get('partial') or model_info.get('partial'))
+
+
+def cache_reply(
+    file_unique_id: str,
+    result: dict,
+    photo_message: Optional[Message],
+    document_message: Optional[Message]
+) -> None:
+    """
+    Сохраняет ответ на фото в кэш, чтобы повторно отправлять уже загруженные файлы.
+    Как и на бэкенде, сохраняются только полные результаты: ответ пониженного качества,
+    прерванный или пропущенный фильтром растительности, иначе выдавался бы весь TTL.
+    """
+    analysis = result.get("analysis_result", {})
+    model_version = analysis.get('model_version')
+    photo_file_id = sent_file_id(photo_message)
+    if model_version is None or photo_file_id is None or not is_complete_analysis(analysis):
+        return
+    result_cache.put(ResultCache.make_key(file_unique_id, model_version), {
+        'result': result,
+        'photo_file_id': photo_file_id,
+        'document_file_id': sent_file_id(document_message),
+    })
+
+
+def start_report(analysis: dict) -> Optional[asyncio.Future]:
+    """
+    Запускает формирование отчета, чтобы он готовился одновременно с отрисовкой и
+    отправкой изображения (None, если отчет не отправляется).
+    """
+    if not getattr(settings, "send_excel_result", True):
+        return None
+    return asyncio.ensure_future(generate_report(analysis))
+
+
+async def cached_report(cached: Dict[str, Any], analysis: dict) -> Tuple[Any, Optional[str]]:
+    """Отчет из кэша по file_id; если отчет не отправлялся, он формируется заново."""
+    if cached['document_file_id'] is not None:
+        return cached['document_file_id'], None
+    return await generate_report(analysis)
+
+
+async def send_cached_reply(update: Update, processing_msg, cached: Dict[str, Any]) -> None:
+    """Отправляет ответ из кэша: файлы повторно отправляются по file_id без загрузки."""
+    analysis = cached['result'].get("analysis_result", {})
+    report = None
+    if getattr(settings, "send_excel_result", True):
+        report = asyncio.ensure_future(cached_report(cached, analysis))
+    await send_reply(
+        update.effective_message,
+        processing_msg,
+        format_analysis_result(analysis),
+        photo=cached['photo_file_id'],
+        report=report
+    )
+
+
+def merge_album_analyses(analyses: List[dict]) -> dict:
+    """Объединяет результаты фото альбома для общего отчета (номер фото в столбце photo)."""
+    return {
+        'detections': [
+            {'photo': i, **det}
+            for i, analysis in enumerate(analyses, start=1)
+            for det in analysis.get('detections', [])
+        ]
+    }
+
+
+async def collect_album_photo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Собирает фото альбома. Telegram присылает каждое фото отдельным обновлением, поэтому
+    первое фото ждет остальные, пока bot_album_window секунд не придет ни одного нового,
+    и обрабатывает альбом целиком.
+    """
+    group_id = update.effective_message.media_group_id
+    album = _pending_albums.get(group_id)
+    if album is not None:
+        album['updates'].append(update)
+        album['last'] = time.monotonic()
+        return
+    album = _pending_albums[group_id] = {'updates': [update], 'last': time.monotonic()}
+    try:
+        while True:
+            remaining = album['last'] + settings.bot_album_window - time.monotonic()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(remaining)
+    finally:
+        del _pending_albums[group_id]
+    await handle_album(album['updates'], context)
+
+
+@asynccontextmanager
+async def queued_slot(user: Optional[User], processing_msg, processing_text: str) -> AsyncIterator[None]:
+    """
+    Ожидает очереди обработки, показывая пользователю позицию в очереди.
+    Raises:
+        QueueOverflow: Очередь переполнена
+    """
+    queued = False
+
+    async def report_position(position: int) -> None:
+        nonlocal queued
+        queued = True
+        await processing_msg.edit_text(QUEUE_POSITION_TEXT.format(position=position))
+
+    async with work_queue.slot(None if user is None else user.id, on_position=report_position):
+        if queued:
+            await processing_msg.edit_text(processing_text)
+        yield
+
+
+async def process_album(updates: List[Update], context: ContextTypes.DEFAULT_TYPE, processing_msg) -> None:
+    """Скачивает фото альбома, отправляет их одним запросом и отвечает одной группой изображений."""
+    message = updates[0].effective_message
+    min_side = max(settings.bot_photo_min_side, await get_backend_input_size() or 0)
+    photos = [choose_photo_size(item.effective_message.photo, min_side) for item in updates]
+    files = await asyncio.gather(*(context.bot.get_file(photo.file_id) for photo in photos))
+    images = await asyncio.gather(*(file.download_as_bytearray() for file in files))
+    logger.info(f"Получен альбом из {len(images)} изображений, {sum(map(len, images))} байт")
+    
+    user = updates[0].effective_user
+    client_id = None if user is None else str(user.id)
+    results = await send_images_to_server(
+        [(image_data, f"photo_{photo.file_id}.jpg") for image_data, photo in zip(images, photos)],
+        client_id=client_id
+    )
+    
+    analyses = [result.get("analysis_result", {}) for result in results]
+    report = None
+    if any(analysis.get('inference_enabled') is True for analysis in analyses):
+        text = format_album_result(results)
+        report = start_report(merge_album_analyses(analyses))
+    else:
+        text = format_stub_result({
+            'file_size': sum(result.get('file_size', 0) for result in results),
+            'content_type': results[0].get('content_type') if results else None,
+        })
+    try:
+        marked_images = await asyncio.gather(
+            *(render_bboxes(image_data, analysis) for image_data, analysis in zip(images, analyses))
+        )
+    except BaseException:
+        if report is not None:
+            report.cancel()
+        raise
+    await send_reply(message, processing_msg, text, photo=list(marked_images), report=report)
+
+
+async def handle_album(updates: List[Update], context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Обрабатывает альбом одним запросом к серверу и отвечает одной группой изображений."""
+    updates = sorted(updates, key=lambda item: item.effective_message.message_id)
+    message = updates[0].effective_message
+    processing_text = f"🔄 Обрабатываю альбом из {len(updates)} изображений..."
+    processing_msg = await message.reply_text(processing_text)
+    
+    try:
+        async with queued_slot(updates[0].effective_user, processing_msg, processing_text):
+            await process_album(updates, context, processing_msg)
+    except QueueOverflow as e:
+        logger.warning(f"Альбом не обработан: {str(e)}")
+        await processing_msg.edit_text(QUEUE_FULL_TEXT)
+    except Exception as e:
+        logger.error(f"Ошибка при обработке альбома: {str(e)}")
+        await processing_msg.edit_text(PROCESSING_ERROR_TEXT)
+
+
+async def process_photo(
+    update: Update,
+    context: ContextTypes.DEFAULT_TYPE,
+    processing_msg,
+    file_unique_id: str
+) -> None:
+    """Скачивает фото, отправляет его на обработку и отвечает пользователю."""
+    # Наименьший вариант фото, достаточный для детектора бэкенда
+    min_side = max(settings.bot_photo_min_side, await get_backend_input_size() or 0)
+    photo = choose_photo_size(update.effective_message.photo, min_side)
+    
+    # Скачиваем файл; bytearray передается дальше без копирования
+    file = await context.bot.get_file(photo.file_id)
+    image_data = await file.download_as_bytearray()
+    
+    logger.info(f"Получено изображение размером {len(image_data)} байт")
+    
+    # Отправляем на сервер
+    user = update.effective_user
+    client_id = None if user is None else str(user.id)
+    filename = f"photo_{photo.file_id}.jpg"
+    photo_message = None
+    if settings.bot_streaming_enabled:
+        result, photo_message = await process_image_streaming(
+            update, processing_msg, image_data, filename, client_id=client_id
+        )
+    else:
+        result = await send_image_to_server(image_data, filename, client_id=client_id)
+    
+    # Формируем ответ пользователю
+    analysis = result.get("analysis_result", {})
+    inference_enabled = analysis.get('inference_enabled') is True
+    report = None
+    if inference_enabled:
+        response_text = format_analysis_result(analysis)
+        report = start_report(analysis)
+    else:
+        # Если результат пустой (заглушка), отправляем соответствующее сообщение
+        response_text = format_stub_result(result)
+
+    marked_image = None
+    if photo_message is None:
+        # Отрисовываем bbox-ы; изображение уйдет с результатом в подписи
+        try:
+            marked_image = await render_bboxes(image_data, analysis)
+        except BaseException:
+            if report is not None:
+                report.cancel()
+            raise
+    sent_photo, document_message = await send_reply(
+        update.effective_message, processing_msg, response_text, photo=marked_image, report=report
+    )
+    if inference_enabled:
+        cache_reply(file_unique_id, result, photo_message or sent_photo, document_message)
+
+
 async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if update.effective_message is None:
         return
@@ -180,70 +779,46 @@ async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     if not update.effective_message.photo:
         return
     
+    # Фото альбома обрабатываются вместе одним запросом
+    if update.effective_message.media_group_id is not None:
+        await collect_album_photo(update, context)
+        return
+    
     # Отправляем сообщение о том, что изображение получено
-    processing_msg = await update.effective_message.reply_text(
-        "🔄 Обрабатываю изображение..."
-    )
+    processing_msg = await update.effective_message.reply_text(PROCESSING_TEXT)
     
     try:
-        # Получаем самое большое изображение
-        photo = update.effective_message.photo[-1]
-        
-        # Скачиваем файл
-        file = await context.bot.get_file(photo.file_id)
-        image_data = await file.download_as_bytearray()
-        
-        logger.info(f"Получено изображение размером {len(image_data)} байт")
-        
-        # Отправляем на сервер
-        result = await send_image_to_server(
-            bytes(image_data), 
-            f"photo_{photo.file_id}.jpg"
-        )
-        
-        # Формируем ответ пользователю
-        analysis = result.get("analysis_result", {})
-        # Отрисовываем bbox-ы и отправляем изображение с разметкой
-        marked_image = draw_bboxes_with_ids(bytes(image_data), analysis)
-        await update.effective_message.reply_photo(
-            photo=marked_image,
-            caption="Обнаруженные объекты"
-        )
-        if analysis.get('inference_enabled') is True:
-            response_text = format_analysis_result(analysis)
-            await processing_msg.edit_text(response_text)
-            if getattr(settings, "send_excel_result", True):
-                excel_file = analysis_to_excel(analysis)
-                await update.effective_message.reply_document(
-                    document=excel_file,
-                    filename="analysis.xlsx",
-                    caption="📄 Таблица с результатами анализа"
-                )
-        else:
-            # Если результат пустой (заглушка), отправляем соответствующее сообщение
-            response_text = (
-                "✅ Изображение успешно получено!\n\n"
-                "📋 Информация о файле:\n"
-                f"• Размер: {result.get('file_size', 'неизвестно')} байт\n"
-                f"• Тип: {result.get('content_type', 'неизвестно')}\n\n"
-                "🤖 В данный момент нейросеть находится в режиме заглушки. "
-                "Реальные результаты анализа появятся после интеграции модели."
-            )
-            await processing_msg.edit_text(response_text)
+        # Пересланное фото с тем же file_unique_id уже могло быть обработано текущей версией моделей
+        model_version = await get_model_version()
+        file_unique_id = update.effective_message.photo[-1].file_unique_id
+        cached = None
+        if model_version is not None:
+            cached = result_cache.get(ResultCache.make_key(file_unique_id, model_version))
+        if cached is not None:
+            logger.info(f"Результат для фото {file_unique_id} взят из кэша")
+            await send_cached_reply(update, processing_msg, cached)
+            return
+
+        async with queued_slot(update.effective_user, processing_msg, PROCESSING_TEXT):
+            await process_photo(update, context, processing_msg, file_unique_id)
+    except QueueOverflow as e:
+        logger.warning(f"Фото не обработано: {str(e)}")
+        await processing_msg.edit_text(QUEUE_FULL_TEXT)
     except Exception as e:
         logger.error(f"Ошибка при обработке изображения: {str(e)}")
         
         # Отправляем сообщение об ошибке
-        error_message = (
-            "❌ Произошла ошибка при обработке изображения.\n\n"
-            "Возможные причины:\n"
-            "• Сервер временно недоступен\n"
-            "• Проблемы с подключением к интернету\n"
-            "• Неподдерживаемый формат изображения\n\n"
-            "Попробуйте еще раз через несколько минут."
-        )
-        
-        await processing_msg.edit_text(error_message)
+        await processing_msg.edit_text(PROCESSING_ERROR_TEXT)
+
+
+async def start_backend_client(application: Application) -> None:
+    """Открывает пул соединений с бэкендом при запуске бота."""
+    await backend_client.start()
+
+
+async def close_backend_client(application: Application) -> None:
+    """Закрывает пул соединений с бэкендом при остановке бота."""
+    await backend_client.close()
 
 
 def create_application(token: str) -> Application:
@@ -252,11 +827,14 @@ def create_application(token: str) -> Application:
         ApplicationBuilder()
         .token(token)
         .rate_limiter(AIORateLimiter())
+        .post_init(start_backend_client)
+        .post_shutdown(close_backend_client)
         .build()
     )
 
     application.add_handler(CommandHandler("start", handle_start))
-    application.add_handler(MessageHandler(filters.PHOTO, handle_photo))
+    # block=False: фото обрабатываются параллельно, а обработчик альбома может ждать его части
+    application.add_handler(MessageHandler(filters.PHOTO, handle_photo, block=False))
 
     return application
 
@@ -264,6 +842,7 @@ def create_application(token: str) -> Application:
 async def run_polling(application: Application) -> None:
     """Start the bot using long polling."""
     await application.initialize()
+    await backend_client.start()
     await application.start()
     try:
         await application.updater.start_polling()
@@ -272,5 +851,58 @@ async def run_polling(application: Application) -> None:
     finally:
         await application.stop()
         await application.shutdown()
+        await backend_client.close()
+
 
+async def run_webhook(application: Application) -> None:
+    """
+    Start the bot in webhook mode.
+
+    Telegram delivers updates to settings.bot_webhook_url + settings.bot_webhook_path;
+    the local listener can sit behind a reverse proxy with several bot instances.
+    Albums, the per-user queue and the result cache are per process, so with several
+    instances settings.bot_webhook_peers must list all of them: every update is then
+    handled by the instance that owns its user, whatever instance the proxy picked.
+    """
+    webhook_url = settings.bot_webhook_url.rstrip("/") + settings.bot_webhook_path
+    dedup_store = create_dedup_store(settings.bot_webhook_dedup_url, ttl=settings.bot_webhook_dedup_ttl)
+    runner = web.AppRunner(create_webhook_app(
+        application,
+        settings.bot_webhook_path,
+        secret_token=settings.bot_webhook_secret,
+        dedup_store=dedup_store,
+        peers=settings.bot_webhook_peers,
+        self_url=settings.bot_webhook_self_url,
+        health_stats=lambda: {'backend': backend_client.get_stats()},
+    ))
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            pass
 
+    await application.initialize()
+    await backend_client.start()
+    await application.start()
+    try:
+        await runner.setup()
+        await web.TCPSite(runner, settings.bot_webhook_listen, settings.bot_webhook_port).start()
+        # Все экземпляры регистрируют один и тот же адрес, повторный вызов безопасен
+        await application.bot.set_webhook(
+            webhook_url,
+            secret_token=settings.bot_webhook_secret,
+            allowed_updates=Update.ALL_TYPES,
+        )
+        logger.info(
+            f"Webhook {webhook_url} принимается на {settings.bot_webhook_listen}:{settings.bot_webhook_port}"
+        )
+        # Keep running until termination
+        await stop_event.wait()
+    finally:
+        await runner.cleanup()
+        await application.stop()
+        await application.shutdown()
+        await backend_client.close()
+        await dedup_store.close()
@@ -0,0 +1,110 @@
+"""
+Отправка ответа на фото с наименьшим числом обращений к Telegram.
+
+Каждый вызов Telegram API ждет AIORateLimiter, поэтому ответ собирается из
+как можно меньшего числа последовательных вызовов: текст результата идет
+подписью к изображению с разметкой, а независимые вызовы (удаление сообщения
+о ходе обработки, отправка отчета) выполняются одновременно. Отчет всегда
+приходит после изображения, чтобы порядок сообщений в чате не менялся.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Optional, Sequence, Tuple, Union
+
+from telegram import InputMediaPhoto, Message
+
+logger = logging.getLogger(__name__)
+
+# Максимальная длина подписи к фото в Telegram (в единицах UTF-16)
+CAPTION_MAX_LENGTH = 1024
+PHOTO_CAPTION = "Обнаруженные объекты"
+REPORT_CAPTION = "📄 Таблица с результатами анализа"
+
+Report = Awaitable[Tuple[Any, Optional[str]]]
+
+
+def telegram_length(text: str) -> int:
+    """Длина текста так, как ее считает Telegram: эмодзи вне BMP занимают две единицы UTF-16."""
+    return len(text.encode("utf-16-le")) // 2
+
+
+async def delete_quietly(message: Message) -> None:
+    """Удаляет сообщение; ошибка удаления не мешает ответу."""
+    try:
+        await message.delete()
+    except Exception as e:
+        logger.warning(f"Не удалось удалить сообщение о ходе обработки: {str(e)}")
+
+
+async def send_photos(message: Message, photo: Union[Any, Sequence[Any]], caption: str) -> Message:
+    """Отправляет одно изображение или альбом (подпись - у первого изображения)."""
+    if not isinstance(photo, (list, tuple)):
+        return await message.reply_photo(photo=photo, caption=caption)
+    messages = await message.reply_media_group(media=[
+        InputMediaPhoto(media=item, caption=caption if i == 0 else None)
+        for i, item in enumerate(photo)
+    ])
+    return messages[0] if messages else None
+
+
+async def send_report(message: Message, report: Report) -> Optional[Message]:
+    """
+    Отправляет отчет. Результат уже показан пользователю, поэтому ошибка отправки
+    отчета только логируется.
+    """
+    try:
+        document, filename = await report
+        return await message.reply_document(document=document, filename=filename, caption=REPORT_CAPTION)
+    except Exception as e:
+        logger.warning(f"Не удалось отправить отчет: {str(e)}")
+        return None
+
+
+async def send_reply(
+    message: Message,
+    processing_msg: Message,
+    text: str,
+    photo: Union[None, Any, Sequence[Any]] = None,
+    report: Optional[Report] = None
+) -> Tuple[Optional[Message], Optional[Message]]:
+    """
+    Отправляет результат анализа.
+    Текст, помещающийся в подпись, отправляется вместе с изображением, а сообщение о ходе
+    обработки удаляется одновременно с отправкой отчета. Длинный текст заменяет сообщение
+    о ходе обработки одновременно с отправкой изображения.
+    Args:
+        message: Сообщение пользователя, на которое отвечает бот
+        processing_msg: Сообщение о ходе обработки
+        text: Текст результата
+        photo: Изображение с разметкой, список изображений альбома (файлы или file_id)
+            или None, если изображение уже отправлено
+        report: Ожидаемый отчет (файл или file_id, имя файла); лучше передавать уже
+            запущенную задачу, чтобы отчет формировался одновременно с отправкой изображения
+    Returns:
+        Tuple[Optional[Message], Optional[Message]]: сообщения с изображением и отчетом
+    """
+    try:
+        if photo is None:
+            photo_message = None
+            text_sent = processing_msg.edit_text(text)
+        elif telegram_length(text) <= CAPTION_MAX_LENGTH:
+            photo_message = await send_photos(message, photo, text)
+            text_sent = delete_quietly(processing_msg)
+        else:
+            photo_message, _ = await asyncio.gather(
+                send_photos(message, photo, PHOTO_CAPTION),
+                processing_msg.edit_text(text)
+            )
+            text_sent = None
+    except BaseException:
+        if isinstance(report, asyncio.Future):
+            report.cancel()
+        raise
+
+    pending = [] if text_sent is None else [text_sent]
+    if report is not None:
+        pending.append(send_report(message, report))
+    results = await asyncio.gather(*pending)
+    document_message = results[-1] if report is not None else None
+    return photo_message, document_message
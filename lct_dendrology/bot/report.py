@@ -0,0 +1,103 @@
+"""
+Файл с результатами анализа для пользователя бота.
+
+Детекции записываются построчно, без pandas: вложенные поля (bbox, center)
+разворачиваются в отдельные столбцы, xlsx пишется в режиме constant_memory,
+поэтому память не растет с количеством объектов на снимке.
+"""
+
+import csv
+import io
+import logging
+from typing import Any, Dict, List, Tuple
+
+import xlsxwriter
+
+logger = logging.getLogger(__name__)
+
+REPORT_FORMATS = ("xlsx", "csv", "parquet")
+EMPTY_REPORT_COLUMN = "Нет объектов"
+
+
+def flatten_detection(detection: Dict[str, Any]) -> Dict[str, Any]:
+    """Разворачивает вложенные словари детекции: bbox.x1 -> bbox_x1, center.x -> center_x."""
+    row = {}
+    for key, value in detection.items():
+        if isinstance(value, dict):
+            for inner_key, inner_value in value.items():
+                row[f"{key}_{inner_key}"] = inner_value
+        else:
+            row[key] = value
+    return row
+
+
+def report_rows(analysis: dict) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """
+    Строки отчета по результату анализа.
+    Returns:
+        Tuple[list, list]: столбцы (в порядке первого появления) и строки
+    """
+    rows = [flatten_detection(det) for det in analysis.get('detections', [])]
+    if not rows:
+        return [EMPTY_REPORT_COLUMN], [{EMPTY_REPORT_COLUMN: ""}]
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    return columns, rows
+
+
+def write_xlsx(columns: List[str], rows: List[Dict[str, Any]], output: io.BytesIO) -> None:
+    # constant_memory: строки сбрасываются на диск по мере записи и не держатся в памяти
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+    worksheet = workbook.add_worksheet("Detections")
+    worksheet.write_row(0, 0, columns)
+    for index, row in enumerate(rows, start=1):
+        worksheet.write_row(index, 0, [row.get(column) for column in columns])
+    workbook.close()
+
+
+def write_csv(columns: List[str], rows: List[Dict[str, Any]], output: io.BytesIO) -> None:
+    # utf-8-sig, чтобы Excel правильно открывал кириллицу
+    text = io.TextIOWrapper(output, encoding="utf-8-sig", newline="")
+    writer = csv.DictWriter(text, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    writer.writerows(rows)
+    text.flush()
+    text.detach()
+
+
+def write_parquet(columns: List[str], rows: List[Dict[str, Any]], output: io.BytesIO) -> None:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.Table.from_pylist(rows).select(columns) if rows else pa.table({column: [] for column in columns})
+    pq.write_table(table, output)
+
+
+WRITERS = {
+    "xlsx": write_xlsx,
+    "csv": write_csv,
+    "parquet": write_parquet,
+}
+
+
+def build_report(analysis: dict, report_format: str = "xlsx") -> Tuple[io.BytesIO, str]:
+    """
+    Формирует файл с результатами анализа.
+    Args:
+        analysis: Результат анализа (dict)
+        report_format: Формат файла: xlsx, csv или parquet
+    Returns:
+        Tuple[BytesIO, str]: содержимое файла и имя файла
+    """
+    if report_format not in WRITERS:
+        raise ValueError(f"Неподдерживаемый формат отчета: {report_format}")
+    if report_format == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            logger.warning("pyarrow не установлен, отчет будет сформирован в формате csv")
+            report_format = "csv"
+    columns, rows = report_rows(analysis)
+    output = io.BytesIO()
+    WRITERS[report_format](columns, rows, output)
+    output.seek(0)
+    return output, f"analysis.{report_format}"
@@ -0,0 +1,63 @@
+"""
+Кэш ответов бота на уже обработанные фото.
+
+Пересланное фото сохраняет file_unique_id Telegram, поэтому повторный анализ
+можно не выполнять: результат и file_id отправленных изображения с разметкой и
+отчета хранятся по паре (file_unique_id, версия моделей бэкенда). При смене
+версии моделей ключ меняется и фото обрабатывается заново.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class ResultCache:
+    """LRU-кэш ответов со временем жизни записей."""
+
+    def __init__(self, max_size: int = 1024, ttl: float = 3600.0):
+        """
+        Args:
+            max_size: Максимальное количество фото в кэше
+            ttl: Время жизни записи в секундах
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items: "OrderedDict[Hashable, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(file_unique_id: str, model_version: Optional[str]) -> Tuple[str, Optional[str]]:
+        return file_unique_id, model_version
+
+    def get(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        item = self._items.get(key)
+        if item is None or item[0] <= time.monotonic():
+            if item is not None:
+                del self._items[key]
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def put(self, key: Hashable, entry: Dict[str, Any]) -> None:
+        """
+        Args:
+            key: Ключ из make_key
+            entry: result - ответ сервера, photo_file_id и document_file_id - отправленные файлы
+        """
+        self._items[key] = (time.monotonic() + self.ttl, entry)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._items),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
@@ -0,0 +1,232 @@
+"""
+Прием обновлений Telegram через webhook.
+
+Long polling привязывает бота к одному процессу, а webhook позволяет запустить
+несколько экземпляров бота за обратным прокси. Сборка альбомов, очередь с
+пределом на пользователя и кэш ответов живут в памяти экземпляра, поэтому все
+обновления одного пользователя должны обрабатываться одним экземпляром: если
+задан список экземпляров, обновление, пришедшее не своему экземпляру, пересылается
+владельцу (по id пользователя), и прокси может распределять запросы как угодно.
+Telegram повторяет доставку обновления, если не получил ответ вовремя, поэтому
+обновления отсеиваются по update_id (по умолчанию - в памяти процесса: повтор
+попадает к тому же владельцу; при необходимости - в общем хранилище Redis).
+"""
+
+import asyncio
+import hmac
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Sequence
+
+import aiohttp
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+# Отметка обновления, пересланного другим экземпляром: оно обрабатывается на месте
+FORWARDED_HEADER = "X-Bot-Forwarded"
+FORWARD_TIMEOUT = 10.0
+PEER_SESSION = web.AppKey("peer_session", aiohttp.ClientSession)
+
+
+def update_route_key(update: Update) -> Optional[int]:
+    """Ключ маршрутизации обновления: id пользователя (иначе id чата)."""
+    if update.effective_user is not None:
+        return update.effective_user.id
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    return None
+
+
+class DedupStore(ABC):
+    """Хранилище уже принятых update_id."""
+
+    @abstractmethod
+    async def add(self, update_id: int) -> bool:
+        """
+        Отмечает обновление как принятое.
+        Returns:
+            bool: True, если обновление пришло впервые
+        """
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryDedupStore(DedupStore):
+    """update_id в памяти процесса: достаточно для одного экземпляра бота."""
+
+    def __init__(self, ttl: float = 3600.0, max_size: int = 100_000):
+        """
+        Args:
+            ttl: Время хранения update_id в секундах
+            max_size: Максимальное количество хранимых update_id
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self._seen: "OrderedDict[int, float]" = OrderedDict()
+
+    async def add(self, update_id: int) -> bool:
+        now = time.monotonic()
+        # Записи упорядочены по времени добавления: истекшие всегда в начале
+        while self._seen and next(iter(self._seen.values())) <= now:
+            self._seen.popitem(last=False)
+        if update_id in self._seen:
+            return False
+        self._seen[update_id] = now + self.ttl
+        while len(self._seen) > self.max_size:
+            self._seen.popitem(last=False)
+        return True
+
+
+class RedisDedupStore(DedupStore):
+    """update_id в Redis: общий для всех экземпляров бота (SET NX с временем жизни)."""
+
+    def __init__(self, url: str, ttl: float = 3600.0, prefix: str = "tg_update:"):
+        """
+        Args:
+            url: Адрес Redis, например redis://redis:6379/0
+            ttl: Время хранения update_id в секундах
+            prefix: Префикс ключей
+        """
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    async def add(self, update_id: int) -> bool:
+        added = await self._redis.set(f"{self.prefix}{update_id}", 1, nx=True, ex=max(1, int(self.ttl)))
+        return bool(added)
+
+    async def close(self) -> None:
+        await self._redis.close()
+
+
+def create_dedup_store(url: Optional[str] = None, ttl: float = 3600.0) -> DedupStore:
+    """
+    Args:
+        url: Адрес общего хранилища (redis://...), None - хранилище в памяти процесса
+        ttl: Время хранения update_id в секундах
+    """
+    if url is None:
+        return MemoryDedupStore(ttl=ttl)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        try:
+            return RedisDedupStore(url, ttl=ttl)
+        except ImportError:
+            raise RuntimeError(
+                "Для общего хранилища обновлений нужен пакет redis: "
+                "установите extra redis (pip install 'lct-dendrology[redis]')"
+            ) from None
+    raise ValueError(f"Неподдерживаемое хранилище обновлений: {url}")
+
+
+def create_webhook_app(
+    application: Application,
+    path: str,
+    secret_token: Optional[str] = None,
+    dedup_store: Optional[DedupStore] = None,
+    peers: Sequence[str] = (),
+    self_url: Optional[str] = None,
+    health_stats: Optional[Callable[[], Dict[str, Any]]] = None
+) -> web.Application:
+    """
+    HTTP-приложение, принимающее обновления Telegram и передающее их боту.
+    Args:
+        application: Приложение бота (обновления кладутся в его update_queue)
+        path: Путь webhook
+        secret_token: Секрет, который Telegram передает в заголовке X-Telegram-Bot-Api-Secret-Token
+        dedup_store: Хранилище принятых update_id
+        peers: Внутренние адреса всех экземпляров бота, одинаковые и в одном порядке на каждом
+            (пусто - один экземпляр или маршрутизация на прокси)
+        self_url: Адрес этого экземпляра из peers
+        health_stats: Дополнительные метрики для ответа /health (например, метрики клиента бэкенда)
+    """
+    dedup_store = dedup_store or MemoryDedupStore()
+    peers = [peer.rstrip("/") for peer in peers]
+    if peers and (self_url is None or self_url.rstrip("/") not in peers):
+        raise ValueError("Адрес экземпляра бота должен входить в список экземпляров")
+    self_url = None if self_url is None else self_url.rstrip("/")
+    stats = {'received': 0, 'duplicates': 0, 'rejected': 0, 'forwarded': 0, 'forward_failed': 0}
+
+    def owner_of(update: Update) -> Optional[str]:
+        """Экземпляр, обрабатывающий обновление (None - этот)."""
+        key = update_route_key(update)
+        if not peers or key is None:
+            return None
+        owner = peers[key % len(peers)]
+        return None if owner == self_url else owner
+
+    async def forward(request: web.Request, owner: str, body: bytes) -> bool:
+        headers = {'Content-Type': 'application/json', FORWARDED_HEADER: "1"}
+        if secret_token is not None:
+            headers[SECRET_TOKEN_HEADER] = secret_token
+        try:
+            async with request.app[PEER_SESSION].post(
+                f"{owner}{path}", data=body, headers=headers,
+                timeout=aiohttp.ClientTimeout(total=FORWARD_TIMEOUT)
+            ) as response:
+                return response.status == 200
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"Не удалось переслать обновление экземпляру {owner}: {str(e)}")
+            return False
+
+    async def handle_update(request: web.Request) -> web.Response:
+        if secret_token is not None:
+            received_token = request.headers.get(SECRET_TOKEN_HEADER, "")
+            if not hmac.compare_digest(received_token, secret_token):
+                stats['rejected'] += 1
+                return web.Response(status=403)
+        body = await request.read()
+        try:
+            update = Update.de_json(json.loads(body), application.bot)
+        except Exception as e:
+            logger.warning(f"Некорректное обновление Telegram: {str(e)}")
+            return web.Response(status=400)
+        if update is None:
+            return web.Response(status=400)
+
+        # Пересланное обновление обрабатывается на месте, даже если списки экземпляров расходятся
+        owner = None if request.headers.get(FORWARDED_HEADER) else owner_of(update)
+        if owner is not None:
+            if await forward(request, owner, body):
+                stats['forwarded'] += 1
+                return web.Response()
+            # Владелец недоступен: лучше ответить самому, чем потерять обновление
+            stats['forward_failed'] += 1
+
+        if not await dedup_store.add(update.update_id):
+            stats['duplicates'] += 1
+            logger.debug(f"Повторное обновление {update.update_id} пропущено")
+            return web.Response()
+        stats['received'] += 1
+        # Ответ отдается сразу: обработка идет в приложении бота и не задерживает Telegram
+        await application.update_queue.put(update)
+        return web.Response()
+
+    async def handle_health(request: web.Request) -> web.Response:
+        health = {'status': 'ok', **stats, 'queued': application.update_queue.qsize()}
+        if health_stats is not None:
+            health.update(health_stats())
+        return web.json_response(health)
+
+    async def open_peer_session(app: web.Application) -> None:
+        app[PEER_SESSION] = aiohttp.ClientSession()
+
+    async def close_peer_session(app: web.Application) -> None:
+        await app[PEER_SESSION].close()
+
+    app = web.Application()
+    app.router.add_post(path, handle_update)
+    app.router.add_get("/health", handle_health)
+    if peers:
+        app.on_startup.append(open_peer_session)
+        app.on_cleanup.append(close_peer_session)
+    return app
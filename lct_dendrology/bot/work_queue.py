@@ -0,0 +1,168 @@
+"""
+Очередь обработки фото в боте.
+
+Без ограничений каждое входящее фото сразу запускает скачивание, запрос к
+бэкенду и отрисовку, поэтому всплеск сообщений из многих чатов без предела
+нагружает и память бота, и бэкенд. Очередь ограничивает число одновременно
+обрабатываемых фото (всего и на пользователя) и длину ожидания; при переполнении
+новое фото отклоняется или вытесняет самое давнее ожидающее.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("reject", "drop_oldest")
+
+PositionCallback = Callable[[int], Awaitable[Any]]
+
+
+class QueueOverflow(Exception):
+    """Очередь переполнена: фото отклонено или вытеснено более новым."""
+
+
+class _Entry:
+    def __init__(self, user_id: Hashable):
+        self.user_id = user_id
+        self.started = False
+        self.dropped = False
+        self.changed = asyncio.Event()
+
+
+class WorkQueue:
+    """FIFO-очередь с общим ограничением и ограничением на пользователя."""
+
+    def __init__(
+        self,
+        max_concurrent: int = 4,
+        max_per_user: int = 1,
+        max_queued: int = 100,
+        overflow: str = "reject"
+    ):
+        """
+        Args:
+            max_concurrent: Максимальное количество одновременно обрабатываемых фото
+            max_per_user: Максимальное количество одновременно обрабатываемых фото одного пользователя
+            max_queued: Максимальное количество ожидающих фото
+            overflow: Политика переполнения: reject (отклонить новое) или drop_oldest
+                (вытеснить самое давнее ожидающее)
+        """
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Неизвестная политика переполнения очереди: {overflow}")
+        self.max_concurrent = max_concurrent
+        self.max_per_user = max_per_user
+        self.max_queued = max_queued
+        self.overflow = overflow
+        self._waiting: Deque[_Entry] = deque()
+        self._running: Dict[Hashable, int] = {}
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.dropped = 0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiting)
+
+    def _can_start(self, user_id: Hashable) -> bool:
+        return self.running < self.max_concurrent and self._running.get(user_id, 0) < self.max_per_user
+
+    def _start(self, entry: _Entry) -> None:
+        entry.started = True
+        entry.changed.set()
+        self.running += 1
+        self._running[entry.user_id] = self._running.get(entry.user_id, 0) + 1
+
+    def _dispatch(self) -> None:
+        """Запускает ожидающие фото по порядку, пропуская пользователей на своем пределе."""
+        for entry in list(self._waiting):
+            if self.running >= self.max_concurrent:
+                break
+            if self._can_start(entry.user_id):
+                self._waiting.remove(entry)
+                self._start(entry)
+        # Ожидающие пересчитывают свою позицию
+        for entry in self._waiting:
+            entry.changed.set()
+
+    def _release(self, entry: _Entry) -> None:
+        self.running -= 1
+        self.completed += 1
+        self._running[entry.user_id] -= 1
+        if not self._running[entry.user_id]:
+            del self._running[entry.user_id]
+        self._dispatch()
+
+    def _enqueue(self, user_id: Hashable) -> _Entry:
+        entry = _Entry(user_id)
+        # Свободный слот занимается сразу, только если никто из того же пользователя
+        # не ждет раньше (иначе порядок его фото нарушится)
+        if self._can_start(user_id) and not any(other.user_id == user_id for other in self._waiting):
+            self._start(entry)
+            return entry
+        if len(self._waiting) >= self.max_queued:
+            if self.overflow == "reject" or not self._waiting:
+                self.rejected += 1
+                raise QueueOverflow("Очередь обработки переполнена")
+            oldest = self._waiting.popleft()
+            oldest.dropped = True
+            oldest.changed.set()
+            self.dropped += 1
+            logger.warning(f"Очередь переполнена, вытеснено фото пользователя {oldest.user_id}")
+        self._waiting.append(entry)
+        return entry
+
+    def position(self, entry: _Entry) -> int:
+        """Позиция ожидающего фото в очереди (с 1)."""
+        return self._waiting.index(entry) + 1
+
+    @asynccontextmanager
+    async def slot(self, user_id: Hashable, on_position: Optional[PositionCallback] = None) -> AsyncIterator[None]:
+        """
+        Ожидает своей очереди и удерживает слот обработки.
+        Args:
+            user_id: Идентификатор пользователя
+            on_position: Вызывается с позицией в очереди при ее изменении, пока фото ждет
+        Raises:
+            QueueOverflow: Очередь переполнена или фото вытеснено более новым
+        """
+        entry = self._enqueue(user_id)
+        try:
+            last_position = None
+            while not entry.started:
+                if entry.dropped:
+                    raise QueueOverflow("Фото вытеснено из очереди более новыми")
+                position = self.position(entry)
+                if on_position is not None and position != last_position:
+                    last_position = position
+                    try:
+                        await on_position(position)
+                    except Exception as e:
+                        logger.warning(f"Не удалось сообщить позицию в очереди: {str(e)}")
+                    continue
+                entry.changed.clear()
+                await entry.changed.wait()
+        except BaseException:
+            if entry.started:
+                self._release(entry)
+            elif entry in self._waiting:
+                self._waiting.remove(entry)
+                self._dispatch()
+            raise
+        try:
+            yield
+        finally:
+            self._release(entry)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'running': self.running,
+            'queued': self.queued,
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'dropped': self.dropped,
+        }
@@ -2,7 +2,7 @@
 Настройки проекта для дендрологических исследований.
 """
 
-from typing import Optional
+from typing import Literal, Optional
 from pydantic import Field
 from pydantic_settings import BaseSettings
 
@@ -13,13 +13,71 @@ class Settings(BaseSettings):
     # Настройки Telegram Bot
     telegram_bot_token: str = Field(..., description="Токен Telegram бота")
     send_excel_result: bool = Field(True, description="Выдавать пользователю файл Excel с результатами анализа")
+    bot_report_format: Literal["xlsx", "csv", "parquet"] = Field("xlsx", description="Формат файла с результатами анализа: xlsx, csv или parquet (нужен pyarrow, иначе csv)")
+    bot_streaming_enabled: bool = Field(False, description="Получать результат потоком: разметка сразу после детекции, породы по мере готовности")
+    bot_backend_connection_limit: int = Field(32, description="Максимальное количество соединений бота с бэкендом")
+    bot_backend_keepalive_timeout: float = Field(30.0, description="Время жизни простаивающего соединения с бэкендом в секундах")
+    bot_backend_dns_cache_ttl: int = Field(300, description="Время кэширования DNS адреса бэкенда в секундах")
+    bot_backend_retries: int = Field(2, description="Количество повторов запроса к бэкенду при сбое соединения или ответе 502/503")
+    bot_backend_retry_backoff: float = Field(0.3, description="Базовая задержка перед повтором запроса к бэкенду в секундах")
+    bot_backend_urls: list[str] = Field([], description="Адреса нескольких экземпляров бэкенда (по умолчанию http://backend_host:backend_port)")
+    bot_backend_balancing: str = Field("least_outstanding", description="Балансировка между бэкендами: least_outstanding (меньше незавершенных запросов) или ewma (меньше задержка)")
+    bot_backend_health_interval: float = Field(5.0, description="Интервал проверки /ready бэкендов в секундах (0 - без проверок и вывода из ротации)")
+    bot_backend_eject_after: int = Field(3, description="Количество сбоев подряд, после которого бэкенд выводится из ротации")
+    bot_backend_hedge_percentile: Optional[float] = Field(None, description="Перцентиль задержки (например 95), после которого запрос дублируется на второй бэкенд (None - без дублирования)")
+    bot_render_workers: int = Field(2, description="Количество потоков, отрисовывающих разметку на изображениях")
+    bot_jpeg_quality: int = Field(85, description="Качество JPEG изображения с разметкой (1-95)")
+    bot_photo_min_side: int = Field(640, description="Минимальная длинная сторона фото, скачиваемого из Telegram (не меньше входа детектора бэкенда)")
+    bot_processor_info_ttl: float = Field(60.0, description="Время кэширования /processor-info в боте в секундах")
+    bot_result_cache_size: int = Field(1024, description="Количество фото в кэше ответов бота (0 - без кэша)")
+    bot_result_cache_ttl: float = Field(3600.0, description="Время жизни ответа в кэше бота в секундах")
+    bot_album_window: float = Field(1.0, description="Время ожидания следующего фото альбома в секундах")
+    bot_max_concurrent: int = Field(4, description="Максимальное количество фото, одновременно обрабатываемых ботом")
+    bot_max_per_user: int = Field(1, description="Максимальное количество фото одного пользователя, обрабатываемых одновременно")
+    bot_max_queued: int = Field(100, description="Максимальное количество фото в очереди бота")
+    bot_queue_overflow: str = Field("reject", description="Политика переполнения очереди бота: reject (отклонить новое фото) или drop_oldest (вытеснить самое давнее)")
+    bot_webhook_url: Optional[str] = Field(None, description="Публичный адрес бота для webhook, например https://bot.example.com (None - long polling)")
+    bot_webhook_path: str = Field("/telegram/webhook", description="Путь, по которому бот принимает обновления Telegram")
+    bot_webhook_listen: str = Field("0.0.0.0", description="Адрес локального HTTP-сервера webhook")
+    bot_webhook_port: int = Field(8081, description="Порт локального HTTP-сервера webhook")
+    bot_webhook_secret: Optional[str] = Field(None, description="Секрет webhook, который Telegram передает в заголовке X-Telegram-Bot-Api-Secret-Token")
+    bot_webhook_peers: list[str] = Field([], description="Внутренние адреса всех экземпляров бота (одинаковый список в одном порядке на каждом): обновления пользователя пересылаются одному экземпляру, иначе альбомы, очередь и кэш ответов не работают при нескольких экземплярах")
+    bot_webhook_self_url: Optional[str] = Field(None, description="Внутренний адрес этого экземпляра бота из bot_webhook_peers")
+    bot_webhook_dedup_url: Optional[str] = Field(None, description="Общее хранилище принятых обновлений для нескольких экземпляров бота, например redis://redis:6379/0 (None - в памяти процесса)")
+    bot_webhook_dedup_ttl: float = Field(3600.0, description="Время хранения идентификатора принятого обновления в секундах")
     
     # Настройки FastAPI Backend
     backend_host: str = Field("0.0.0.0", description="Хост для FastAPI сервера")
     backend_port: int = Field(8000, description="Порт для FastAPI сервера")
     backend_workers: int = Field(1, description="Количество воркеров FastAPI")
     backend_reload: bool = Field(False, description="Автоперезагрузка FastAPI в режиме разработки")
+    stream_species_batch_size: int = Field(4, description="Количество кропов в одном событии с породами в потоковом ответе")
+    batch_max_images: int = Field(10, description="Максимальное количество изображений в одном запросе /process-images")
     model_enable_inference: bool = Field(True, description="Включить инференс модели (по умолчанию False - заглушка)")
+    inference_workers: int = Field(1, description="Количество потоков, параллельно выполняющих инференс")
+    model_pool_size: Optional[int] = Field(None, description="Количество реплик каждой модели (по умолчанию равно inference_workers)")
+    model_thread_budget: Optional[int] = Field(None, description="Общее количество потоков вычислений torch на все реплики моделей (по умолчанию число доступных ядер CPU)")
+
+    # Настройки квот и справедливой очереди клиентов
+    client_rate_limit_enabled: bool = Field(False, description="Ограничивать частоту запросов каждого клиента (заголовок X-Client-Id)")
+    client_rate_limit_per_minute: float = Field(20.0, description="Средняя допустимая частота запросов клиента в минуту")
+    client_rate_limit_burst: int = Field(10, description="Максимальное количество запросов клиента подряд")
+    client_weights: dict[str, float] = Field({}, description="Веса клиентов в справедливой очереди (по умолчанию 1.0)")
+
+    # Настройки ограничения памяти на обработку изображений
+    memory_limiter_enabled: bool = Field(False, description="Допускать запросы к обработке по оценке потребляемой памяти")
+    memory_budget_mb: float = Field(2048.0, description="Бюджет памяти на одновременно обрабатываемые изображения в МБ")
+    memory_bytes_per_pixel: float = Field(12.0, description="Оценка памяти на пиксель изображения в байтах")
+    memory_per_crop_mb: float = Field(2.0, description="Оценка памяти на классификацию одного кропа в МБ")
+
+    # Настройки адаптивного снижения качества под нагрузкой
+    adaptive_quality_enabled: bool = Field(False, description="Снижать качество обработки при перегрузке сервера")
+    adaptive_queue_high: int = Field(4, description="Глубина очереди, при которой качество снижается на один уровень")
+    adaptive_queue_low: int = Field(1, description="Глубина очереди, при которой качество повышается на один уровень")
+    adaptive_latency_high: float = Field(10.0, description="Средняя задержка в секундах, при которой качество снижается")
+    adaptive_latency_low: float = Field(3.0, description="Средняя задержка в секундах, при которой качество повышается")
+    adaptive_cooldown: float = Field(5.0, description="Минимальный интервал между сменами уровня качества в секундах")
+    degraded_detector_imgsz: int = Field(416, description="Размер входа детектора на пониженных уровнях качества")
     
     # Настройки модели
     tree_detector_model_path: Optional[str] = Field("models/tree_detector_v2.pt", description="Путь к файлу модели YOLO")
@@ -27,10 +85,45 @@ class Settings(BaseSettings):
     tree_detector_batch_size: int = Field(1, description="Размер батча для инференса")
     tree_detector_confidence_threshold: float = Field(0.25, description="Порог уверенности для детекции (0.0-1.0)")
     tree_detector_iou_threshold: float = Field(0.45, description="Порог IoU для NMS (0.0-1.0)")
+    tree_detector_imgsz: Optional[int] = Field(None, description="Размер входа детектора (по умолчанию размер, с которым обучалась модель)")
 
     # Настройки классификатора деревьев
     classifier_model_path: str = Field("models/species_classifier_v2.pt", description="Путь к модели классификатора деревьев")
     classifier_confidence_threshold: float = Field(0.5, description="Порог уверенности для классификации породы дерева")
+    classifier_cascade_enabled: bool = Field(False, description="Каскад: быстрый классификатор для всех кропов, тяжелый только для неуверенных")
+    classifier_fast_model_path: Optional[str] = Field(None, description="Путь к быстрому классификатору для каскада")
+    classifier_cascade_margin: float = Field(0.8, description="Порог уверенности быстрого классификатора, ниже которого кроп уходит в тяжелый")
+    classifier_min_crop_size: int = Field(0, description="Минимальная сторона кропа в пикселях для классификации")
+    classifier_min_detection_confidence: float = Field(0.0, description="Минимальная уверенность детектора для классификации кропа")
+    joint_model_enabled: bool = Field(False, description="Использовать совместную модель: детекция и порода за один прогон вместо детектора и классификатора")
+    joint_model_path: Optional[str] = Field(None, description="Путь к совместной модели (многоклассовый детектор пород)")
+
+    # Настройки кэша классификации кропов
+    crop_cache_enabled: bool = Field(False, description="Кэшировать результаты классификации кропов по перцептивному хэшу")
+    crop_cache_size: int = Field(4096, description="Максимальное количество кропов в кэше")
+    crop_cache_max_distance: int = Field(4, description="Максимальное расстояние Хэмминга между pHash (из 64 бит) для попадания в кэш")
+
+    # Настройки кэша сырых предсказаний детектора
+    raw_prediction_cache_size: int = Field(64, description="Количество изображений в кэше сырых предсказаний для запросов с собственными порогами (0 - отключен)")
+
+    # Настройки поиска почти-дубликатов изображений
+    duplicate_index_enabled: bool = Field(False, description="Переиспользовать результат анализа для почти-дубликатов недавних изображений")
+    duplicate_index_size: int = Field(1024, description="Максимальное количество изображений в индексе дубликатов")
+    duplicate_index_max_distance: int = Field(6, description="Максимальное расстояние Хэмминга между pHash (из 64 бит) для дубликата")
+    duplicate_index_ttl: float = Field(3600.0, description="Время хранения результата в индексе дубликатов в секундах")
+
+    # Настройки фильтра изображений без растительности
+    gate_enabled: bool = Field(False, description="Пропускать детектор для изображений без растительности")
+    gate_model_path: Optional[str] = Field(None, description="Путь к маленькому классификатору наличия деревьев (None - только эвристики)")
+    gate_threshold: float = Field(0.2, description="Порог оценки растительности, ниже которого детектор не запускается")
+    gate_thumbnail_size: int = Field(128, description="Размер миниатюры для фильтра в пикселях")
+    gate_audit_rate: float = Field(0.02, description="Доля отфильтрованных изображений, которые все равно проверяются детектором для аудита")
+
+    # Настройки реестра моделей
+    model_registry_dir: Optional[str] = Field(None, description="Директория реестра версионированных моделей (None - пути моделей из настроек)")
+    model_registry_poll_interval: float = Field(0.0, description="Интервал проверки реестра на новые версии в секундах (0 - отключено)")
+    model_warmup_enabled: bool = Field(True, description="Прогревать новую версию моделей перед переключением")
+    admin_token: Optional[str] = Field(None, description="Токен для административных эндпоинтов (заголовок X-Admin-Token)")
     
     # Настройки логирования
     log_level: str = Field("INFO", description="Уровень логирования")
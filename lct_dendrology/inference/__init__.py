@@ -2,4 +2,9 @@
 
 from .yolo_detector import YoloDetector
 from .yolo_classifier import YoloClassifier
+from .joint_detector import JointDetector
+from .vegetation_gate import VegetationGate
+from .crop_cache import CropCache
 
+from .model_pool import ModelPool
+from .raw_prediction_cache import RawPredictionCache
@@ -0,0 +1,70 @@
+"""
+Кэш результатов классификации кропов по перцептивному хэшу.
+
+Одно и то же дерево встречается на многих снимках с одной точки съемки с немного
+другим кадрированием и сжатием. Близкие кропы дают близкие pHash, поэтому
+повторная классификация заменяется поиском в кэше.
+"""
+
+import threading
+from typing import Any, Dict, Optional
+
+from PIL import Image
+
+from lct_dendrology.inference.phash import HammingLRU, phash
+
+
+class CropCache:
+    """Ограниченный LRU-кэш результатов классификации с допуском по расстоянию Хэмминга."""
+
+    def __init__(self, max_size: int = 4096, max_distance: int = 4):
+        """
+        Args:
+            max_size: Максимальное количество кропов в кэше
+            max_distance: Максимальное расстояние Хэмминга между pHash для попадания
+        """
+        self._index = HammingLRU(max_size=max_size, max_distance=max_distance)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def hash_crop(crop: Image.Image) -> int:
+        """Хэш нормализованного кропа (оттенки серого, фиксированный размер)."""
+        return phash(crop)
+
+    def get(self, key: int, version: str) -> Optional[Dict[str, Any]]:
+        """
+        Возвращает результат классификации близкого кропа.
+        Args:
+            key: pHash кропа
+            version: Версия моделей; записи других версий считаются промахом
+        Returns:
+            dict: результат классификации или None
+        """
+        found = self._index.get(key)
+        hit = found is not None and found[1][0] == version
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return dict(found[1][1]) if hit else None
+
+    def put(self, key: int, version: str, class_result: Dict[str, Any]) -> None:
+        """Сохраняет результат классификации кропа."""
+        self._index.put(key, (version, dict(class_result)))
+
+    def clear(self) -> None:
+        self._index.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            'size': len(self._index),
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / lookups if lookups else 0.0
+        }
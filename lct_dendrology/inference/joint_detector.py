@@ -0,0 +1,95 @@
+"""
+Совместная модель: детекция деревьев и определение породы за один прогон.
+
+Двухэтапный конвейер (детектор + классификатор на каждом кропе) считает два
+полных backbone, а стоимость классификации растет с числом деревьев. Совместная
+модель - это многоклассовый YOLO детектор, классами которого являются породы:
+голова детекции работает на общих признаках backbone, поэтому один прогон дает
+и боксы, и породы. Обучение: lct_dendrology.training.train_joint_detector.
+"""
+
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+from PIL import Image
+
+from .yolo_detector import YoloDetector
+
+logger = logging.getLogger(__name__)
+
+# Класс для деревьев, порода которых при разметке не определена
+UNKNOWN_SPECIES_CLASS = "tree"
+
+
+def species_from_classes(
+    detections: List[Dict[str, Any]],
+    unknown_class: str = UNKNOWN_SPECIES_CLASS
+) -> List[Dict[str, Any]]:
+    """
+    Переносит класс многоклассового детектора в поля породы.
+    Класс детекции заменяется на unknown_class, порода берется из класса,
+    а ее уверенность - из уверенности детекции.
+    """
+    for det in detections:
+        class_name = det.get('class_name')
+        det['species'] = None if class_name == unknown_class else class_name
+        det['species_confidence'] = det.get('confidence')
+        det['class_name'] = unknown_class
+    return detections
+
+
+class JointDetector(YoloDetector):
+    """
+    Многоклассовый детектор пород с интерфейсом YoloDetector.
+    Каждая детекция сразу содержит поля species и species_confidence.
+    """
+
+    # Одно дерево - один бокс, даже если породы конкурируют
+    agnostic_nms = True
+
+    def __init__(
+        self,
+        model_path: Optional[str] = None,
+        device: Optional[str] = None,
+        confidence_threshold: float = 0.25,
+        iou_threshold: float = 0.45,
+        unknown_class: str = UNKNOWN_SPECIES_CLASS
+    ):
+        """
+        Args:
+            model_path: Путь к файлу совместной модели
+            device: Устройство для инференса (cpu, cuda, mps)
+            confidence_threshold: Порог уверенности для детекции (0.0-1.0)
+            iou_threshold: Порог IoU для NMS (0.0-1.0)
+            unknown_class: Класс деревьев без определенной породы
+        """
+        self.unknown_class = unknown_class
+        super().__init__(
+            model_path=model_path,
+            device=device,
+            confidence_threshold=confidence_threshold,
+            iou_threshold=iou_threshold
+        )
+
+    def predict(
+        self,
+        image: Union[str, Path, np.ndarray, Image.Image, bytes],
+        return_image: bool = False,
+        imgsz: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Выполняет детекцию с определением породы (см. YoloDetector.predict)."""
+        result = super().predict(image, return_image=return_image, imgsz=imgsz)
+        species_from_classes(result['detections'], self.unknown_class)
+        result['model_info']['joint'] = True
+        return result
+
+    def get_model_info(self) -> Dict[str, Any]:
+        info = super().get_model_info()
+        if self._model is not None:
+            info['joint'] = True
+            info['species'] = [
+                name for name in self._model.names.values() if name != self.unknown_class
+            ]
+        return info
@@ -0,0 +1,104 @@
+"""
+Пул реплик модели для параллельного инференса в одном процессе.
+
+Экземпляр модели нельзя вызывать из нескольких потоков одновременно: у
+YoloDetector изменяемые пороги, а предиктор ultralytics кэширует настройки
+между вызовами. Пул держит N независимых реплик и выдает каждую только одному
+потоку за раз, поэтому N потоков выполняют инференс действительно параллельно.
+"""
+
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ModelPool:
+    """
+    Пул реплик модели с выдачей и возвратом.
+
+    Пул можно использовать вместо одиночной модели: predict выполняется на
+    свободной реплике, а описание модели берется у первой реплики.
+    """
+
+    def __init__(self, factory: Callable[[], Any], size: int = 1):
+        """
+        Args:
+            factory: Функция, создающая новую реплику модели
+            size: Количество реплик (не меньше 1)
+        """
+        self.size = max(1, size)
+        self.replicas: List[Any] = [factory() for _ in range(self.size)]
+        self._idle: "queue.Queue[Any]" = queue.Queue()
+        for replica in self.replicas:
+            self._idle.put(replica)
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.waits = 0
+        self.total_wait = 0.0
+        if self.size > 1:
+            logger.info(f"Создан пул из {self.size} реплик модели")
+
+    @property
+    def model_path(self) -> Optional[str]:
+        return getattr(self.replicas[0], 'model_path', None)
+
+    @property
+    def available(self) -> int:
+        """Количество свободных реплик."""
+        return self._idle.qsize()
+
+    @contextmanager
+    def checkout(self, timeout: Optional[float] = None):
+        """
+        Выдает свободную реплику на время контекста.
+        Raises:
+            TimeoutError: Если за timeout секунд реплика не освободилась
+        """
+        started = time.monotonic()
+        waited = False
+        try:
+            replica = self._idle.get_nowait()
+        except queue.Empty:
+            waited = True
+            try:
+                replica = self._idle.get(timeout=timeout)
+            except queue.Empty:
+                raise TimeoutError(f"Нет свободной реплики модели за {timeout} с")
+        with self._lock:
+            self.checkouts += 1
+            if waited:
+                self.waits += 1
+                self.total_wait += time.monotonic() - started
+        try:
+            yield replica
+        finally:
+            self._idle.put(replica)
+
+    def call(self, method: str, *args, **kwargs) -> Any:
+        """Вызывает метод модели на свободной реплике."""
+        with self.checkout() as replica:
+            return getattr(replica, method)(*args, **kwargs)
+
+    def predict(self, *args, **kwargs) -> Any:
+        """Выполняет predict на свободной реплике."""
+        return self.call('predict', *args, **kwargs)
+
+    def get_model_info(self) -> Dict[str, Any]:
+        info = dict(self.replicas[0].get_model_info())
+        info['replicas'] = self.size
+        return info
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'replicas': self.size,
+                'available': self.available,
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'avg_wait_seconds': self.total_wait / self.waits if self.waits else 0.0,
+            }
@@ -0,0 +1,162 @@
+"""
+Перцептивные хэши изображений и индекс для поиска близких хэшей по расстоянию Хэмминга.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from PIL import Image
+
+HASH_BITS = 64
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    value = 0
+    for bit in bits.flatten():
+        value = (value << 1) | int(bit)
+    return value
+
+
+def dhash(image: Image.Image, hash_size: int = 8) -> int:
+    """
+    Разностный хэш: знаки разностей соседних пикселей уменьшенного изображения.
+    Args:
+        image: PIL.Image.Image
+        hash_size: Сторона сетки (хэш из hash_size**2 бит)
+    Returns:
+        int: хэш
+    """
+    gray = image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = np.asarray(gray, dtype=np.int16)
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+def _dct_matrix(size: int) -> np.ndarray:
+    n = np.arange(size)
+    matrix = np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / (2 * size))
+    matrix[0] *= 1 / np.sqrt(2)
+    return matrix * np.sqrt(2 / size)
+
+
+_DCT_CACHE: Dict[int, np.ndarray] = {}
+
+
+def phash(image: Image.Image, hash_size: int = 8, highfreq_factor: int = 4) -> int:
+    """
+    Перцептивный хэш: знаки низкочастотных DCT-коэффициентов относительно медианы.
+    Устойчив к масштабированию, JPEG-сжатию и небольшим изменениям яркости.
+    Args:
+        image: PIL.Image.Image
+        hash_size: Сторона блока низких частот (хэш из hash_size**2 бит)
+        highfreq_factor: Во сколько раз уменьшенное изображение больше блока низких частот
+    Returns:
+        int: хэш
+    """
+    size = hash_size * highfreq_factor
+    if size not in _DCT_CACHE:
+        _DCT_CACHE[size] = _dct_matrix(size)
+    dct = _DCT_CACHE[size]
+    gray = image.convert("L").resize((size, size), Image.BILINEAR)
+    pixels = np.asarray(gray, dtype=np.float64)
+    lowfreq = (dct @ pixels @ dct.T)[:hash_size, :hash_size]
+    return _bits_to_int(lowfreq > np.median(lowfreq))
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Расстояние Хэмминга между двумя хэшами."""
+    return (a ^ b).bit_count()
+
+
+class HammingLRU:
+    """
+    Ограниченный LRU-кэш с поиском ближайшего ключа по расстоянию Хэмминга.
+
+    Использует multi-index hashing: хэш делится на max_distance + 1 частей, и по
+    принципу Дирихле любой хэш на расстоянии не больше max_distance совпадает с
+    искомым хотя бы в одной части. Поэтому кандидаты берутся из точных совпадений
+    по частям, а не перебором всех записей.
+    """
+
+    def __init__(self, max_size: int, max_distance: int = 4, bits: int = HASH_BITS):
+        """
+        Args:
+            max_size: Максимальное количество записей
+            max_distance: Максимальное расстояние Хэмминга для попадания
+            bits: Разрядность хэшей
+        """
+        if not 0 <= max_distance < bits:
+            raise ValueError(f"max_distance должен быть в диапазоне [0, {bits})")
+        self.max_size = max_size
+        self.max_distance = max_distance
+        self._chunks = self._make_chunks(bits, max_distance + 1)
+        self._entries: "OrderedDict[int, Any]" = OrderedDict()
+        self._tables: List[Dict[int, Set[int]]] = [{} for _ in self._chunks]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _make_chunks(bits: int, count: int) -> List[Tuple[int, int]]:
+        """Разбивает разряды хэша на count частей: список (сдвиг, маска)."""
+        chunks = []
+        shift = 0
+        for i in range(count):
+            width = bits // count + (1 if i < bits % count else 0)
+            chunks.append((shift, (1 << width) - 1))
+            shift += width
+        return chunks
+
+    def _chunk_keys(self, key: int) -> List[int]:
+        return [(key >> shift) & mask for shift, mask in self._chunks]
+
+    def _remove(self, key: int) -> None:
+        del self._entries[key]
+        for table, chunk in zip(self._tables, self._chunk_keys(key)):
+            bucket = table[chunk]
+            bucket.discard(key)
+            if not bucket:
+                del table[chunk]
+
+    def get(self, key: int) -> Optional[Tuple[int, Any]]:
+        """
+        Ищет ближайшую запись в пределах max_distance.
+        Returns:
+            Tuple[int, Any]: расстояние и значение, либо None при промахе
+        """
+        with self._lock:
+            candidates: Set[int] = set()
+            for table, chunk in zip(self._tables, self._chunk_keys(key)):
+                candidates.update(table.get(chunk, ()))
+            best_key, best_distance = None, self.max_distance + 1
+            for candidate in candidates:
+                distance = hamming_distance(key, candidate)
+                if distance < best_distance:
+                    best_key, best_distance = candidate, distance
+            if best_key is None:
+                return None
+            self._entries.move_to_end(best_key)
+            return best_distance, self._entries[best_key]
+
+    def put(self, key: int, value: Any) -> None:
+        """Добавляет запись, вытесняя самые давно использованные при переполнении."""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = value
+            for table, chunk in zip(self._tables, self._chunk_keys(key)):
+                table.setdefault(chunk, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            for table in self._tables:
+                table.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
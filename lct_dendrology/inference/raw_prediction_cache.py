@@ -0,0 +1,63 @@
+"""
+Кэш сырых предсказаний детектора.
+
+Аналитики подбирают пороги детекции, многократно отправляя одно и то же
+изображение. Сырые предсказания (до фильтрации по уверенности и NMS) кэшируются
+по содержимому изображения, поэтому повторный запрос с другими порогами
+выполняет только фильтрацию, без прогона модели.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class RawPredictionCache:
+    """LRU-кэш сырых предсказаний по хэшу изображения, версии детектора и размеру входа."""
+
+    def __init__(self, max_size: int = 64):
+        """
+        Args:
+            max_size: Максимальное количество изображений в кэше
+        """
+        self.max_size = max_size
+        self._items: "OrderedDict[Hashable, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(image_bytes: bytes, version: str, imgsz: Optional[int]) -> Tuple[str, str, Optional[int]]:
+        return hashlib.sha256(image_bytes).hexdigest(), version, imgsz
+
+    def get(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            raw = self._items.get(key)
+            if raw is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return raw
+
+    def put(self, key: Hashable, raw: Dict[str, Any]) -> None:
+        with self._lock:
+            self._items[key] = raw
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._items),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,125 @@
+"""
+Быстрый фильтр изображений без растительности.
+
+Работает на миниатюре изображения: дешевые эвристики по цвету и, при наличии,
+маленькая модель-классификатор. Позволяет не запускать детектор на скриншотах,
+селфи и документах.
+"""
+
+import io
+import logging
+from typing import Any, Dict, Optional
+
+import numpy as np
+from PIL import Image
+
+from lct_dendrology.inference.model_pool import ModelPool
+
+logger = logging.getLogger(__name__)
+
+
+# Диапазон оттенков зеленой листвы в шкале PIL HSV (0-255): примерно 50°-170°
+VEGETATION_HUE_RANGE = (35, 120)
+VEGETATION_MIN_SATURATION = 40
+VEGETATION_MIN_VALUE = 30
+# Желтая и оранжевая осенняя листва и коричневая кора: примерно 20°-50°. Порог насыщенности
+# выше, чтобы светлая кожа и бежевые фоны не считались растительностью
+AUTUMN_HUE_RANGE = (14, 34)
+AUTUMN_MIN_SATURATION = 90
+
+
+class VegetationGate:
+    """
+    Оценивает вероятность наличия растительности на изображении.
+
+    Итоговая оценка - максимум из эвристической оценки и оценки модели, поэтому
+    изображение пропускается только если обе оценки ниже порога.
+    """
+
+    def __init__(
+        self,
+        model_path: Optional[str] = None,
+        device: str = "cpu",
+        threshold: float = 0.2,
+        thumbnail_size: int = 128,
+        negative_class: str = "no_trees",
+        full_vegetation_ratio: float = 0.15,
+        pool_size: int = 1
+    ):
+        """
+        Args:
+            model_path: Путь к маленькому классификатору "есть/нет деревьев" (опционально)
+            device: Устройство для инференса модели
+            threshold: Порог оценки, ниже которого изображение считается без растительности
+            thumbnail_size: Размер миниатюры по большей стороне
+            negative_class: Имя класса модели, означающего отсутствие деревьев
+            full_vegetation_ratio: Доля пикселей растительности, при которой эвристика дает оценку 1.0
+            pool_size: Количество реплик классификатора (по одной на поток инференса)
+        """
+        self.model_path = model_path
+        self.threshold = threshold
+        self.thumbnail_size = thumbnail_size
+        self.negative_class = negative_class
+        self.full_vegetation_ratio = full_vegetation_ratio
+        self.classifier: Optional[ModelPool] = None
+        if model_path:
+            from lct_dendrology.inference.yolo_classifier import YoloClassifier
+            # Фильтр вызывается из всех потоков инференса, а предиктор ultralytics нельзя делить между потоками
+            self.classifier = ModelPool(lambda: YoloClassifier(model_path=model_path, device=device), pool_size)
+
+    def make_thumbnail(self, image_bytes: bytes) -> Image.Image:
+        """Декодирует уменьшенную копию изображения (для JPEG - с масштабированием при декодировании)."""
+        img = Image.open(io.BytesIO(image_bytes))
+        img.draft("RGB", (self.thumbnail_size, self.thumbnail_size))
+        img = img.convert("RGB")
+        img.thumbnail((self.thumbnail_size, self.thumbnail_size))
+        return img
+
+    def heuristic_score(self, thumbnail: Image.Image) -> float:
+        """
+        Оценка по доле пикселей с оттенком и насыщенностью листвы (зеленой или осенней) и коры.
+        Безлистные деревья на снегу или сером небе эвристика не распознает: для них нужна модель.
+        """
+        hsv = np.asarray(thumbnail.convert("HSV"))
+        hue, saturation, value = hsv[..., 0], hsv[..., 1], hsv[..., 2]
+        green = (
+            (hue >= VEGETATION_HUE_RANGE[0]) & (hue <= VEGETATION_HUE_RANGE[1])
+            & (saturation >= VEGETATION_MIN_SATURATION)
+        )
+        autumn = (
+            (hue >= AUTUMN_HUE_RANGE[0]) & (hue <= AUTUMN_HUE_RANGE[1])
+            & (saturation >= AUTUMN_MIN_SATURATION)
+        )
+        vegetation = (green | autumn) & (value >= VEGETATION_MIN_VALUE)
+        ratio = float(vegetation.mean()) if vegetation.size else 0.0
+        return min(1.0, ratio / self.full_vegetation_ratio)
+
+    def model_score(self, thumbnail: Image.Image) -> Optional[float]:
+        """Вероятность наличия деревьев по модели или None, если модель не задана."""
+        if self.classifier is None:
+            return None
+        result = self.classifier.predict(thumbnail)
+        confidence = float(result.get('confidence', 0.0))
+        if result.get('class_name') == self.negative_class:
+            return 1.0 - confidence
+        return confidence
+
+    def check(self, image_bytes: bytes) -> Dict[str, Any]:
+        """
+        Проверяет изображение.
+        Args:
+            image_bytes: Байты изображения
+        Returns:
+            dict: оценки и решение {'vegetation_score', 'heuristic_score', 'model_score', 'skip'}
+        """
+        thumbnail = self.make_thumbnail(image_bytes)
+        heuristic = self.heuristic_score(thumbnail)
+        model = self.model_score(thumbnail)
+        score = heuristic if model is None else max(heuristic, model)
+        return {
+            'vegetation_score': score,
+            'heuristic_score': heuristic,
+            'model_score': model,
+            'threshold': self.threshold,
+            'skip': score < self.threshold
+        }
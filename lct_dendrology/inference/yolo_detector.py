@@ -14,6 +14,96 @@ from lct_dendrology.cfg import settings
 
 logger = logging.getLogger(__name__)
 
+# Сырые предсказания сохраняются с минимальным порогом, чтобы потом отфильтровать их
+# с любыми порогами без повторного прогона модели. Легкое подавление (IoU 0.9) убирает
+# почти совпадающие боксы одного объекта: без него на плотных снимках дубликаты уверенных
+# объектов заполняют лимит RAW_MAX_DETECTIONS и вытесняют менее уверенные объекты
+RAW_CONFIDENCE_THRESHOLD = 0.01
+RAW_IOU_THRESHOLD = 0.9
+RAW_MAX_DETECTIONS = 3000
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float) -> np.ndarray:
+    """
+    Жадное подавление немаксимумов.
+    Returns:
+        np.ndarray: индексы оставленных боксов в порядке убывания уверенности
+    """
+    order = np.argsort(-scores, kind="stable")
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        xx1 = np.maximum(boxes[i, 0], boxes[rest, 0])
+        yy1 = np.maximum(boxes[i, 1], boxes[rest, 1])
+        xx2 = np.minimum(boxes[i, 2], boxes[rest, 2])
+        yy2 = np.minimum(boxes[i, 3], boxes[rest, 3])
+        inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+        iou = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=int)
+
+
+def apply_thresholds(
+    raw: Dict[str, Any],
+    confidence_threshold: float,
+    iou_threshold: float,
+    agnostic: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Фильтрует сырые предсказания детектора по уверенности и выполняет NMS по классам.
+    Args:
+        raw: Результат YoloDetector.predict_raw
+        confidence_threshold: Порог уверенности (не ниже RAW_CONFIDENCE_THRESHOLD)
+        iou_threshold: Порог IoU для NMS (порог выше RAW_IOU_THRESHOLD действует как RAW_IOU_THRESHOLD)
+        agnostic: Подавлять пересекающиеся боксы независимо от класса
+    Returns:
+        List[Dict] - список детекций в том же формате, что и в predict
+    """
+    boxes, confidences, class_ids = raw['boxes'], raw['confidences'], raw['class_ids']
+    mask = confidences >= confidence_threshold
+    boxes, confidences, class_ids = boxes[mask], confidences[mask], class_ids[mask]
+    if len(boxes):
+        # Смещение боксов разных классов, чтобы они не подавляли друг друга
+        offsets = 0 if agnostic else class_ids[:, None] * (boxes.max() + 1)
+        keep = nms(boxes + offsets, confidences, iou_threshold)
+        boxes, confidences, class_ids = boxes[keep], confidences[keep], class_ids[keep]
+    return build_detections(boxes, confidences, class_ids, raw['names'])
+
+
+def build_detections(
+    boxes: np.ndarray,
+    confidences: np.ndarray,
+    class_ids: np.ndarray,
+    class_names: Dict[int, str]
+) -> List[Dict[str, Any]]:
+    """Формирует список детекций из массивов боксов, уверенностей и классов."""
+    detections = []
+    for i, (box, conf, class_id) in enumerate(zip(boxes, confidences, class_ids)):
+        detection = {
+            'id': i + 1,
+            'class_id': int(class_id),
+            'class_name': class_names[int(class_id)],
+            'confidence': float(conf),
+            'bbox': {
+                'x1': float(box[0]),
+                'y1': float(box[1]),
+                'x2': float(box[2]),
+                'y2': float(box[3])
+            },
+            'center': {
+                'x': float((box[0] + box[2]) / 2),
+                'y': float((box[1] + box[3]) / 2)
+            },
+            'width': float(box[2] - box[0]),
+            'height': float(box[3] - box[1]),
+            'area': float((box[2] - box[0]) * (box[3] - box[1]))
+        }
+        detections.append(detection)
+    return detections
+
 
 class YoloDetector:
     """
@@ -22,6 +112,9 @@ class YoloDetector:
     Поддерживает различные форматы входных данных и возвращает структурированные
     результаты детекции в виде списка словарей.
     """
+
+    # NMS без учета классов (для многоклассовых моделей, где классы конкурируют за один объект)
+    agnostic_nms = False
     
     def __init__(
         self, 
@@ -61,7 +154,8 @@ class YoloDetector:
     def predict(
         self, 
         image: Union[str, Path, np.ndarray, Image.Image, bytes],
-        return_image: bool = False
+        return_image: bool = False,
+        imgsz: Optional[int] = None
     ) -> Dict[str, Any]:
         """
         Выполняет предсказание на изображении.
@@ -73,6 +167,7 @@ class YoloDetector:
                 - PIL.Image: объект PIL Image
                 - bytes: байты изображения
             return_image: Возвращать ли изображение с нарисованными bounding box
+            imgsz: Размер входа модели. По умолчанию размер, с которым обучалась модель
             
         Returns:
             Dict с результатами детекции:
@@ -87,11 +182,17 @@ class YoloDetector:
             processed_image = self._prepare_image(image)
             
             # Выполняем предсказание
+            predict_kwargs = {}
+            if imgsz is not None:
+                predict_kwargs['imgsz'] = imgsz
+            if self.agnostic_nms:
+                predict_kwargs['agnostic_nms'] = True
             results = self._model(
                 processed_image,
                 conf=self.confidence_threshold,
                 iou=self.iou_threshold,
-                device=self.device
+                device=self.device,
+                **predict_kwargs
             )
             
             # Обрабатываем результаты
@@ -103,7 +204,8 @@ class YoloDetector:
                     'model_path': self.model_path,
                     'device': self.device,
                     'confidence_threshold': self.confidence_threshold,
-                    'iou_threshold': self.iou_threshold
+                    'iou_threshold': self.iou_threshold,
+                    'imgsz': imgsz
                 }
             }
             
@@ -118,6 +220,57 @@ class YoloDetector:
             logger.error(f"Ошибка при выполнении предсказания: {str(e)}")
             raise RuntimeError(f"Ошибка инференса: {str(e)}")
     
+    def predict_raw(
+        self,
+        image: Union[str, Path, np.ndarray, Image.Image, bytes],
+        imgsz: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Выполняет предсказание без фильтрации по порогам пользователя.
+        Результат можно многократно фильтровать функцией apply_thresholds с разными
+        порогами: это занимает миллисекунды вместо полного прогона модели.
+        
+        Args:
+            image: Входное изображение (см. predict)
+            imgsz: Размер входа модели. По умолчанию размер, с которым обучалась модель
+            
+        Returns:
+            Dict с массивами 'boxes' (N, 4), 'confidences' (N,), 'class_ids' (N,),
+            именами классов 'names' и информацией о модели 'model_info'
+        """
+        try:
+            predict_kwargs = {}
+            if imgsz is not None:
+                predict_kwargs['imgsz'] = imgsz
+            results = self._model(
+                self._prepare_image(image),
+                conf=RAW_CONFIDENCE_THRESHOLD,
+                iou=RAW_IOU_THRESHOLD,
+                max_det=RAW_MAX_DETECTIONS,
+                device=self.device,
+                **predict_kwargs
+            )
+        except Exception as e:
+            logger.error(f"Ошибка при выполнении предсказания: {str(e)}")
+            raise RuntimeError(f"Ошибка инференса: {str(e)}")
+        boxes = results[0].boxes
+        if boxes is None:
+            empty = np.zeros((0,), dtype=np.float32)
+            raw = {'boxes': np.zeros((0, 4), dtype=np.float32), 'confidences': empty, 'class_ids': empty}
+        else:
+            raw = {
+                'boxes': boxes.xyxy.cpu().numpy(),
+                'confidences': boxes.conf.cpu().numpy(),
+                'class_ids': boxes.cls.cpu().numpy()
+            }
+        raw['names'] = results[0].names
+        raw['model_info'] = {
+            'model_path': self.model_path,
+            'device': self.device,
+            'imgsz': imgsz
+        }
+        return raw
+    
     def _prepare_image(self, image: Union[str, Path, np.ndarray, Image.Image, bytes]) -> Union[str, Path, np.ndarray]:
         """
         Подготавливает изображение для YOLO модели.
@@ -154,39 +307,12 @@ class YoloDetector:
         Returns:
             List[Dict] - список детекций с информацией об объектах
         """
-        detections = []
-        
-        if result.boxes is not None:
-            boxes = result.boxes.xyxy.cpu().numpy()  # координаты bbox
-            confidences = result.boxes.conf.cpu().numpy()  # уверенность
-            class_ids = result.boxes.cls.cpu().numpy()  # ID классов
-            
-            # Получаем имена классов
-            class_names = result.names
-            
-            for i, (box, conf, class_id) in enumerate(zip(boxes, confidences, class_ids)):
-                detection = {
-                    'id': i + 1,
-                    'class_id': int(class_id),
-                    'class_name': class_names[int(class_id)],
-                    'confidence': float(conf),
-                    'bbox': {
-                        'x1': float(box[0]),
-                        'y1': float(box[1]),
-                        'x2': float(box[2]),
-                        'y2': float(box[3])
-                    },
-                    'center': {
-                        'x': float((box[0] + box[2]) / 2),
-                        'y': float((box[1] + box[3]) / 2)
-                    },
-                    'width': float(box[2] - box[0]),
-                    'height': float(box[3] - box[1]),
-                    'area': float((box[2] - box[0]) * (box[3] - box[1]))
-                }
-                detections.append(detection)
-        
-        return detections
+        if result.boxes is None:
+            return []
+        boxes = result.boxes.xyxy.cpu().numpy()  # координаты bbox
+        confidences = result.boxes.conf.cpu().numpy()  # уверенность
+        class_ids = result.boxes.cls.cpu().numpy()  # ID классов
+        return build_detections(boxes, confidences, class_ids, result.names)
     
     def get_model_info(self) -> Dict[str, Any]:
         """
@@ -203,8 +329,16 @@ class YoloDetector:
             "device": self.device,
             "confidence_threshold": self.confidence_threshold,
             "iou_threshold": self.iou_threshold,
+            "imgsz": self.get_train_imgsz(),
             "model_loaded": True
         }
+
+    def get_train_imgsz(self) -> Optional[int]:
+        """Размер входа, с которым обучалась модель (None, если неизвестен)."""
+        imgsz = getattr(self._model, 'overrides', {}).get('imgsz')
+        if isinstance(imgsz, (list, tuple)):
+            imgsz = max(imgsz)
+        return int(imgsz) if isinstance(imgsz, (int, float)) else None
     
     def update_thresholds(self, confidence: Optional[float] = None, iou: Optional[float] = None) -> None:
         """
@@ -0,0 +1,261 @@
+"""
+Общие функции для оценки моделей: загрузка размеченной выборки, сопоставление
+боксов, метрики точности и задержки, Pareto-фронт конфигураций.
+
+Формат размеченной выборки совпадает с данными скриптов classify_crops_with_openai*:
+    images_dir/<img>.jpg              - исходные изображения
+    labels_dir/<img>.txt              - разметка YOLO (class x_center y_center w h)
+    crops_dir/<класс>/<img>_obj<i>.jpg - кроп i-го бокса, размеченный VLM
+"""
+
+import os
+import re
+import statistics
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from PIL import Image
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+CROP_NAME_PATTERN = re.compile(r"^(?P<stem>.+)_obj(?P<index>\d+)$")
+# Классы VLM, которые не считаются породой
+UNKNOWN_LABELS = ("unknown",)
+
+Box = Tuple[float, float, float, float]
+
+
+@dataclass
+class EvalSample:
+    """Изображение с эталонными боксами (x1, y1, x2, y2 в пикселях) и породами."""
+    image_path: str
+    boxes: List[Box] = field(default_factory=list)
+    species: List[Optional[str]] = field(default_factory=list)
+
+
+def read_yolo_labels(label_path: str) -> List[Tuple[int, float, float, float, float]]:
+    """Читает файл разметки YOLO: список (class_id, x_center, y_center, w, h)."""
+    rows = []
+    with open(label_path, "r") as f:
+        for line in f:
+            parts = line.strip().split()
+            if len(parts) != 5:
+                continue
+            class_id, x_center, y_center, w, h = map(float, parts)
+            rows.append((int(class_id), x_center, y_center, w, h))
+    return rows
+
+
+def yolo_to_box(row: Tuple[int, float, float, float, float], img_w: int, img_h: int) -> Box:
+    """Преобразует строку разметки YOLO в координаты (x1, y1, x2, y2) в пикселях."""
+    _, x_c, y_c, w, h = row
+    return (
+        (x_c - w / 2) * img_w,
+        (y_c - h / 2) * img_h,
+        (x_c + w / 2) * img_w,
+        (y_c + h / 2) * img_h
+    )
+
+
+def load_crop_labels(crops_dir: str) -> Dict[Tuple[str, int], str]:
+    """
+    Читает разметку кропов из директорий классов.
+    Returns:
+        dict: (имя изображения без расширения, номер бокса) -> класс
+    """
+    labels = {}
+    for class_name in sorted(os.listdir(crops_dir)):
+        class_dir = os.path.join(crops_dir, class_name)
+        if not os.path.isdir(class_dir):
+            continue
+        for crop_name in os.listdir(class_dir):
+            match = CROP_NAME_PATTERN.match(os.path.splitext(crop_name)[0])
+            if match:
+                labels[(match.group("stem"), int(match.group("index")))] = class_name
+    return labels
+
+
+def load_eval_set(
+    images_dir: str,
+    labels_dir: str,
+    crops_dir: Optional[str] = None,
+    limit: Optional[int] = None
+) -> List[EvalSample]:
+    """
+    Загружает размеченную выборку.
+    Args:
+        images_dir: Директория изображений
+        labels_dir: Директория разметки YOLO
+        crops_dir: Директория кропов, разложенных по породам (None - без пород)
+        limit: Максимальное количество изображений
+    """
+    crop_labels = load_crop_labels(crops_dir) if crops_dir else {}
+    samples = []
+    for name in sorted(os.listdir(images_dir)):
+        stem, ext = os.path.splitext(name)
+        label_path = os.path.join(labels_dir, stem + ".txt")
+        if ext.lower() not in IMAGE_EXTENSIONS or not os.path.exists(label_path):
+            continue
+        image_path = os.path.join(images_dir, name)
+        with Image.open(image_path) as img:
+            img_w, img_h = img.size
+        sample = EvalSample(image_path)
+        for i, row in enumerate(read_yolo_labels(label_path)):
+            sample.boxes.append(yolo_to_box(row, img_w, img_h))
+            species = crop_labels.get((stem, i))
+            sample.species.append(None if species in UNKNOWN_LABELS else species)
+        samples.append(sample)
+        if limit is not None and len(samples) >= limit:
+            break
+    return samples
+
+
+def box_iou(a: Box, b: Box) -> float:
+    inter_w = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    inter_h = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = inter_w * inter_h
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def match_boxes(predicted: Sequence[Box], ground_truth: Sequence[Box], iou_threshold: float = 0.5) -> List[Tuple[int, int]]:
+    """
+    Жадно сопоставляет предсказанные боксы (в порядке убывания уверенности) с эталонными.
+    Returns:
+        list: пары (индекс предсказания, индекс эталона)
+    """
+    matched_gt = set()
+    pairs = []
+    for i, pred in enumerate(predicted):
+        best, best_iou = None, iou_threshold
+        for j, gt in enumerate(ground_truth):
+            if j in matched_gt:
+                continue
+            iou = box_iou(pred, gt)
+            if iou >= best_iou:
+                best, best_iou = j, iou
+        if best is not None:
+            matched_gt.add(best)
+            pairs.append((i, best))
+    return pairs
+
+
+def detection_box(det: Dict[str, Any]) -> Box:
+    bbox = det['bbox']
+    return bbox['x1'], bbox['y1'], bbox['x2'], bbox['y2']
+
+
+def evaluate_predictions(
+    samples: Sequence[EvalSample],
+    predictions: Sequence[List[Dict[str, Any]]],
+    iou_threshold: float = 0.5
+) -> Dict[str, Any]:
+    """
+    Считает точность детекции и определения породы.
+    Args:
+        samples: Размеченная выборка
+        predictions: Детекции для каждого изображения (формат YoloDetector.predict с полем species)
+        iou_threshold: Порог IoU для сопоставления боксов
+    Returns:
+        dict: precision, recall, f1 детекции и species_accuracy на сопоставленных боксах
+        с известной породой
+    """
+    true_positives = predicted_total = gt_total = 0
+    species_total = species_correct = 0
+    for sample, detections in zip(samples, predictions):
+        detections = sorted(detections, key=lambda det: det.get('confidence', 0), reverse=True)
+        pairs = match_boxes([detection_box(det) for det in detections], sample.boxes, iou_threshold)
+        true_positives += len(pairs)
+        predicted_total += len(detections)
+        gt_total += len(sample.boxes)
+        for pred_index, gt_index in pairs:
+            expected = sample.species[gt_index]
+            if expected is None:
+                continue
+            species_total += 1
+            species_correct += detections[pred_index].get('species') == expected
+    precision = true_positives / predicted_total if predicted_total else 0.0
+    recall = true_positives / gt_total if gt_total else 0.0
+    return {
+        'precision': precision,
+        'recall': recall,
+        'f1': 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+        'species_accuracy': species_correct / species_total if species_total else None,
+        'species_evaluated': species_total,
+    }
+
+
+def time_calls(fn: Callable[[Any], Any], inputs: Sequence[Any], warmup: int = 2) -> Tuple[List[Any], List[float]]:
+    """
+    Вызывает fn для каждого входа и замеряет время.
+    Первые warmup вызовов (на первом входе) не учитываются.
+    Returns:
+        Tuple[list, list]: результаты и задержки в секундах
+    """
+    for _ in range(warmup if inputs else 0):
+        fn(inputs[0])
+    outputs, latencies = [], []
+    for item in inputs:
+        started = time.perf_counter()
+        outputs.append(fn(item))
+        latencies.append(time.perf_counter() - started)
+    return outputs, latencies
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Процентиль q (0-100) с линейной интерполяцией."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def latency_stats(latencies: Sequence[float]) -> Dict[str, float]:
+    """Сводка задержек в миллисекундах и пропускная способность одного потока."""
+    if not latencies:
+        return {'mean_ms': 0.0, 'p50_ms': 0.0, 'p90_ms': 0.0, 'p99_ms': 0.0, 'throughput': 0.0}
+    return {
+        'mean_ms': statistics.fmean(latencies) * 1000,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p90_ms': percentile(latencies, 90) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'throughput': len(latencies) / sum(latencies) if sum(latencies) else 0.0,
+    }
+
+
+def pareto_front(rows: Sequence[Dict[str, Any]], cost_key: str, quality_key: str) -> List[Dict[str, Any]]:
+    """
+    Возвращает конфигурации, не доминируемые по паре (стоимость ниже, качество выше).
+    Строки без значения качества не рассматриваются. Результат отсортирован по стоимости.
+    """
+    candidates = [row for row in rows if row.get(quality_key) is not None]
+    front = []
+    for row in candidates:
+        dominated = any(
+            other[cost_key] <= row[cost_key]
+            and other[quality_key] >= row[quality_key]
+            and (other[cost_key] < row[cost_key] or other[quality_key] > row[quality_key])
+            for other in candidates
+        )
+        if not dominated:
+            front.append(row)
+    return sorted(front, key=lambda row: row[cost_key])
+
+
+def format_table(rows: Sequence[Dict[str, Any]], columns: Sequence[str]) -> str:
+    """Форматирует строки как текстовую таблицу markdown."""
+    def fmt(value: Any) -> str:
+        if isinstance(value, float):
+            return f"{value:.3f}"
+        return "-" if value is None else str(value)
+
+    lines = [
+        "| " + " | ".join(columns) + " |",
+        "|" + "|".join("---" for _ in columns) + "|",
+    ]
+    for row in rows:
+        lines.append("| " + " | ".join(fmt(row.get(column)) for column in columns) + " |")
+    return "\n".join(lines)
@@ -0,0 +1,112 @@
+"""
+Сравнение двухэтапного конвейера (детектор + классификатор кропов) и совместной
+модели по задержке на изображение и точности детекции и определения породы.
+
+Пример:
+    python -m lct_dendrology.training.compare_pipelines \\
+        --images data/val/images --labels data/val/labels --crops data/crops_species \\
+        --detector models/tree_detector_v2.pt --classifier models/species_classifier_v2.pt \\
+        --joint runs/joint/train/weights/best.pt
+"""
+
+import argparse
+from typing import Any, Dict, List, Optional
+
+from PIL import Image
+
+from lct_dendrology.inference import JointDetector, YoloClassifier, YoloDetector
+from lct_dendrology.training.benchmark import (
+    evaluate_predictions,
+    format_table,
+    latency_stats,
+    load_eval_set,
+    time_calls,
+)
+
+REPORT_COLUMNS = (
+    "pipeline", "mean_ms", "p50_ms", "p90_ms", "p99_ms", "throughput",
+    "precision", "recall", "species_accuracy",
+)
+
+
+def two_stage_predict(
+    detector: YoloDetector,
+    classifier: YoloClassifier,
+    image_path: str,
+    species_threshold: float = 0.0,
+    imgsz: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """Детекция и классификация каждого кропа, как в ImageProcessor."""
+    detections = detector.predict(image_path, imgsz=imgsz)['detections']
+    img = Image.open(image_path).convert("RGB") if detections else None
+    for det in detections:
+        bbox = det['bbox']
+        result = classifier.predict(img.crop((bbox['x1'], bbox['y1'], bbox['x2'], bbox['y2'])))
+        confidence = result.get('confidence', 0)
+        det['species'] = result.get('class_name') if confidence >= species_threshold else None
+        det['species_confidence'] = confidence
+    return detections
+
+
+def joint_predict(joint: JointDetector, image_path: str, species_threshold: float = 0.0) -> List[Dict[str, Any]]:
+    detections = joint.predict(image_path)['detections']
+    for det in detections:
+        if (det.get('species_confidence') or 0) < species_threshold:
+            det['species'] = None
+    return detections
+
+
+def compare_pipelines(
+    images_dir: str,
+    labels_dir: str,
+    crops_dir: str,
+    detector_path: str,
+    classifier_path: str,
+    joint_path: str,
+    device: str = "cpu",
+    species_threshold: float = 0.0,
+    limit: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """Возвращает строки отчета для двухэтапного конвейера и совместной модели."""
+    samples = load_eval_set(images_dir, labels_dir, crops_dir, limit=limit)
+    paths = [sample.image_path for sample in samples]
+    detector = YoloDetector(model_path=detector_path, device=device)
+    classifier = YoloClassifier(model_path=classifier_path, device=device)
+    joint = JointDetector(model_path=joint_path, device=device)
+    pipelines = {
+        "two_stage": lambda path: two_stage_predict(detector, classifier, path, species_threshold),
+        "joint": lambda path: joint_predict(joint, path, species_threshold),
+    }
+    rows = []
+    for name, predict in pipelines.items():
+        predictions, latencies = time_calls(predict, paths)
+        rows.append({
+            "pipeline": name,
+            **latency_stats(latencies),
+            **evaluate_predictions(samples, predictions),
+        })
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Сравнение двухэтапного конвейера и совместной модели")
+    parser.add_argument("--images", required=True)
+    parser.add_argument("--labels", required=True)
+    parser.add_argument("--crops", required=True, help="Кропы, разложенные по породам (эталон пород)")
+    parser.add_argument("--detector", required=True)
+    parser.add_argument("--classifier", required=True)
+    parser.add_argument("--joint", required=True)
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--species-threshold", type=float, default=0.0)
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+
+    rows = compare_pipelines(
+        args.images, args.labels, args.crops, args.detector, args.classifier, args.joint,
+        args.device, args.species_threshold, args.limit
+    )
+    print(format_table(rows, REPORT_COLUMNS))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+"""
+Дистилляция больших моделей-учителей в компактные модели для инференса на CPU.
+
+- Классификатор пород: студент обучается на кропах, размеченных VLM скриптами
+  classify_crops_with_openai*, по сумме кросс-энтропии с меткой класса и
+  KL-дивергенции с "мягкими" вероятностями учителя при температуре T.
+- Детектор: учитель размечает изображения (псевдо-разметка с низким порогом),
+  студент обучается на этой разметке штатным обучением ultralytics.
+- Отчет: задержка на CPU и точность учителя и студентов с Pareto-фронтом.
+
+Кропы ожидаются в виде <dir>/<класс>/*.jpg (например, после split_dataset).
+
+Пример:
+    python -m lct_dendrology.training.distill classifier \\
+        --teacher models/species_classifier_v2.pt --train data/crops_splitted/train \\
+        --output models/species_classifier_student.pt
+    python -m lct_dendrology.training.distill classifier-report --val data/crops_splitted/test \\
+        --model teacher=models/species_classifier_v2.pt --model student=models/species_classifier_student.pt
+"""
+
+import argparse
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from lct_dendrology.training.benchmark import (
+    IMAGE_EXTENSIONS,
+    evaluate_predictions,
+    format_table,
+    latency_stats,
+    load_eval_set,
+    pareto_front,
+    time_calls,
+)
+
+CLASSIFIER_REPORT_COLUMNS = ("model", "p50_ms", "p90_ms", "throughput", "accuracy", "pareto")
+DETECTOR_REPORT_COLUMNS = ("model", "p50_ms", "p90_ms", "throughput", "precision", "recall", "f1", "pareto")
+
+
+def list_crops(crops_dir: str) -> Tuple[List[str], List[int], List[str]]:
+    """
+    Читает кропы, разложенные по директориям классов.
+    Returns:
+        Tuple[list, list, list]: пути к кропам, индексы классов и имена классов (по алфавиту)
+    """
+    class_names = sorted(
+        name for name in os.listdir(crops_dir) if os.path.isdir(os.path.join(crops_dir, name))
+    )
+    paths, targets = [], []
+    for index, name in enumerate(class_names):
+        class_dir = os.path.join(crops_dir, name)
+        for file_name in sorted(os.listdir(class_dir)):
+            if file_name.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.join(class_dir, file_name))
+                targets.append(index)
+    return paths, targets, class_names
+
+
+def soften(probs: np.ndarray, temperature: float) -> np.ndarray:
+    """
+    Смягчает вероятности учителя температурой: эквивалентно softmax(logits / T)
+    для вероятностей, полученных softmax(logits).
+    """
+    logits = np.log(np.clip(probs, 1e-12, None)) / temperature
+    logits -= logits.max(axis=1, keepdims=True)
+    soft = np.exp(logits)
+    return soft / soft.sum(axis=1, keepdims=True)
+
+
+def distillation_loss(student_logits, teacher_probs, targets, temperature: float = 4.0, alpha: float = 0.7):
+    """
+    Потери дистилляции: alpha * T^2 * KL(учитель || студент) + (1 - alpha) * CE(метка).
+    Args:
+        student_logits: Логиты студента (N, C)
+        teacher_probs: Смягченные температурой вероятности учителя (N, C)
+        targets: Индексы классов (N,)
+    """
+    import torch.nn.functional as F
+
+    kl = F.kl_div(
+        F.log_softmax(student_logits / temperature, dim=1), teacher_probs, reduction="batchmean"
+    )
+    ce = F.cross_entropy(student_logits, targets)
+    return alpha * temperature ** 2 * kl + (1 - alpha) * ce
+
+
+def teacher_soft_labels(
+    teacher_path: str,
+    paths: Sequence[str],
+    class_names: Sequence[str],
+    imgsz: int = 224,
+    device: str = "cpu",
+    batch: int = 32
+) -> np.ndarray:
+    """
+    Вероятности учителя для каждого кропа в порядке классов class_names.
+    Raises:
+        ValueError: Если учитель не знает какой-либо класс датасета
+    """
+    from ultralytics import YOLO
+
+    teacher = YOLO(teacher_path)
+    teacher_index = {name: i for i, name in teacher.names.items()}
+    missing = [name for name in class_names if name not in teacher_index]
+    if missing:
+        raise ValueError(f"Классы отсутствуют у модели-учителя: {missing}")
+    columns = [teacher_index[name] for name in class_names]
+    probs = []
+    for start in range(0, len(paths), batch):
+        results = teacher.predict(list(paths[start:start + batch]), imgsz=imgsz, device=device, verbose=False)
+        probs.extend(result.probs.data.cpu().numpy()[columns] for result in results)
+    probs = np.stack(probs)
+    return probs / probs.sum(axis=1, keepdims=True)
+
+
+def build_student(student: str, class_names: Sequence[str]):
+    """Создает студента из весов (.pt) или конфигурации (.yaml) с головой под классы датасета."""
+    from ultralytics import YOLO
+    from ultralytics.nn.tasks import ClassificationModel
+
+    if student.endswith(".pt"):
+        model = YOLO(student).model
+        ClassificationModel.reshape_outputs(model, len(class_names))
+    else:
+        model = ClassificationModel(student, nc=len(class_names), verbose=False)
+    model.names = dict(enumerate(class_names))
+    return model
+
+
+def _load_crops(paths: Sequence[str], imgsz: int):
+    import torch
+    from PIL import Image
+
+    images = []
+    for path in paths:
+        with Image.open(path) as img:
+            img = img.convert("RGB").resize((imgsz, imgsz))
+            images.append(np.asarray(img, dtype=np.float32) / 255.0)
+    return torch.from_numpy(np.stack(images)).permute(0, 3, 1, 2)
+
+
+def train_student_classifier(
+    teacher_path: str,
+    train_dir: str,
+    output_path: str,
+    student: str = "yolo11n-cls.yaml",
+    epochs: int = 30,
+    imgsz: int = 224,
+    batch: int = 32,
+    lr: float = 1e-3,
+    temperature: float = 4.0,
+    alpha: float = 0.7,
+    device: str = "cpu"
+) -> str:
+    """
+    Обучает компактный классификатор по мягким меткам учителя.
+    Returns:
+        str: путь к весам студента (загружаются через YOLO / YoloClassifier)
+    """
+    import torch
+
+    paths, targets, class_names = list_crops(train_dir)
+    if not paths:
+        raise ValueError(f"В {train_dir} нет кропов")
+    print(f"Кропов: {len(paths)}, классы: {class_names}")
+    soft = torch.from_numpy(soften(
+        teacher_soft_labels(teacher_path, paths, class_names, imgsz, device), temperature
+    )).float()
+    targets = torch.tensor(targets)
+    model = build_student(student, class_names).to(device)
+    optimizer = torch.optim.AdamW(model.parameters(), lr=lr)
+    scheduler = torch.optim.lr_scheduler.CosineAnnealingLR(optimizer, T_max=max(1, epochs))
+    for epoch in range(epochs):
+        model.train()
+        order = torch.randperm(len(paths))
+        total = 0.0
+        for start in range(0, len(paths), batch):
+            index = order[start:start + batch]
+            images = _load_crops([paths[i] for i in index], imgsz).to(device)
+            loss = distillation_loss(
+                model(images), soft[index].to(device), targets[index].to(device), temperature, alpha
+            )
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total += loss.item() * len(index)
+        scheduler.step()
+        print(f"Эпоха {epoch + 1}/{epochs}: loss={total / len(paths):.4f}")
+
+    model.eval()
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    torch.save({'model': model.cpu(), 'train_args': {'task': 'classify', 'imgsz': imgsz}}, output_path)
+    print(f"Студент сохранен: {output_path}")
+    return output_path
+
+
+def pseudo_label_images(
+    teacher_path: str,
+    images_dir: str,
+    output_dir: str,
+    conf: float = 0.25,
+    imgsz: Optional[int] = None,
+    device: str = "cpu",
+    val_ratio: float = 0.2
+) -> str:
+    """
+    Размечает изображения детектором-учителем и собирает датасет YOLO.
+    Returns:
+        str: путь к data.yaml
+    """
+    import shutil
+    from ultralytics import YOLO
+
+    teacher = YOLO(teacher_path)
+    names = sorted(name for name in os.listdir(images_dir) if name.lower().endswith(IMAGE_EXTENSIONS))
+    val_count = int(len(names) * val_ratio)
+    for index, name in enumerate(names):
+        split = "val" if index < val_count else "train"
+        images_out = os.path.join(output_dir, "images", split)
+        labels_out = os.path.join(output_dir, "labels", split)
+        os.makedirs(images_out, exist_ok=True)
+        os.makedirs(labels_out, exist_ok=True)
+        source = os.path.join(images_dir, name)
+        kwargs = {'imgsz': imgsz} if imgsz else {}
+        result = teacher.predict(source, conf=conf, device=device, verbose=False, **kwargs)[0]
+        lines = [
+            f"{int(cls)} {x:.6f} {y:.6f} {w:.6f} {h:.6f}"
+            for cls, (x, y, w, h) in zip(result.boxes.cls.tolist(), result.boxes.xywhn.tolist())
+        ]
+        shutil.copy2(source, os.path.join(images_out, name))
+        with open(os.path.join(labels_out, os.path.splitext(name)[0] + ".txt"), "w") as f:
+            f.write("\n".join(lines) + ("\n" if lines else ""))
+    data_yaml = os.path.join(output_dir, "data.yaml")
+    with open(data_yaml, "w", encoding="utf-8") as f:
+        f.write(f"path: {os.path.abspath(output_dir)}\ntrain: images/train\nval: images/val\nnames:\n")
+        for i, class_name in teacher.names.items():
+            f.write(f"  {i}: {class_name}\n")
+    print(f"Псевдо-разметка: {len(names)} изображений в {output_dir}")
+    return data_yaml
+
+
+def distill_detector(
+    teacher_path: str,
+    images_dir: str,
+    dataset_dir: str,
+    student: str = "yolo11n.pt",
+    conf: float = 0.25,
+    epochs: int = 100,
+    imgsz: int = 640,
+    device: str = "cpu"
+) -> str:
+    """
+    Обучает компактный детектор на псевдо-разметке учителя.
+    Returns:
+        str: путь к лучшим весам студента
+    """
+    from ultralytics import YOLO
+
+    data_yaml = pseudo_label_images(teacher_path, images_dir, dataset_dir, conf, imgsz, device)
+    model = YOLO(student)
+    model.train(data=data_yaml, epochs=epochs, imgsz=imgsz, device=device, project="runs/distill", name="detector")
+    best = os.path.join(str(model.trainer.save_dir), "weights", "best.pt")
+    print(f"Лучшие веса студента: {best}")
+    return best
+
+
+def classifier_report(models: Dict[str, str], val_dir: str, device: str = "cpu") -> List[Dict]:
+    """Задержка на кроп и точность классификаторов на отложенных кропах."""
+    from PIL import Image
+    from lct_dendrology.inference import YoloClassifier
+
+    paths, targets, class_names = list_crops(val_dir)
+    crops = [Image.open(path).convert("RGB") for path in paths]
+    rows = []
+    for name, path in models.items():
+        classifier = YoloClassifier(model_path=path, device=device)
+        outputs, latencies = time_calls(classifier.predict, crops)
+        correct = sum(out['class_name'] == class_names[target] for out, target in zip(outputs, targets))
+        rows.append({
+            'model': name,
+            **latency_stats(latencies),
+            'accuracy': correct / len(targets) if targets else None,
+        })
+    return _mark_pareto(rows, 'accuracy')
+
+
+def detector_report(
+    models: Dict[str, str],
+    images_dir: str,
+    labels_dir: str,
+    device: str = "cpu",
+    limit: Optional[int] = None
+) -> List[Dict]:
+    """Задержка на изображение и точность детекторов по эталонной разметке."""
+    from lct_dendrology.inference import YoloDetector
+
+    samples = load_eval_set(images_dir, labels_dir, limit=limit)
+    paths = [sample.image_path for sample in samples]
+    rows = []
+    for name, path in models.items():
+        detector = YoloDetector(model_path=path, device=device)
+        outputs, latencies = time_calls(lambda image: detector.predict(image)['detections'], paths)
+        metrics = evaluate_predictions(samples, outputs)
+        rows.append({
+            'model': name,
+            **latency_stats(latencies),
+            'precision': metrics['precision'],
+            'recall': metrics['recall'],
+            'f1': metrics['f1'],
+        })
+    return _mark_pareto(rows, 'f1')
+
+
+def _mark_pareto(rows: List[Dict], quality_key: str) -> List[Dict]:
+    front = {id(row) for row in pareto_front(rows, 'p50_ms', quality_key)}
+    for row in rows:
+        row['pareto'] = '*' if id(row) in front else ''
+    return rows
+
+
+def _parse_models(values: Sequence[str]) -> Dict[str, str]:
+    models = {}
+    for value in values:
+        name, _, path = value.partition("=")
+        models[name if path else os.path.basename(name)] = path or name
+    return models
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Дистилляция моделей для инференса на CPU")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    cls = commands.add_parser("classifier", help="Обучить студента-классификатора")
+    cls.add_argument("--teacher", required=True)
+    cls.add_argument("--train", required=True, help="Кропы по директориям классов")
+    cls.add_argument("--output", required=True)
+    cls.add_argument("--student", default="yolo11n-cls.yaml", help="Веса (.pt) или конфигурация (.yaml) студента")
+    cls.add_argument("--epochs", type=int, default=30)
+    cls.add_argument("--imgsz", type=int, default=224)
+    cls.add_argument("--batch", type=int, default=32)
+    cls.add_argument("--lr", type=float, default=1e-3)
+    cls.add_argument("--temperature", type=float, default=4.0)
+    cls.add_argument("--alpha", type=float, default=0.7)
+    cls.add_argument("--device", default="cpu")
+
+    det = commands.add_parser("detector", help="Обучить студента-детектора на псевдо-разметке")
+    det.add_argument("--teacher", required=True)
+    det.add_argument("--images", required=True)
+    det.add_argument("--dataset", default="data/distill_detector")
+    det.add_argument("--student", default="yolo11n.pt")
+    det.add_argument("--conf", type=float, default=0.25)
+    det.add_argument("--epochs", type=int, default=100)
+    det.add_argument("--imgsz", type=int, default=640)
+    det.add_argument("--device", default="cpu")
+
+    cls_report = commands.add_parser("classifier-report", help="Задержка и точность классификаторов")
+    cls_report.add_argument("--val", required=True)
+    cls_report.add_argument("--model", action="append", required=True, help="имя=путь")
+    cls_report.add_argument("--device", default="cpu")
+
+    det_report = commands.add_parser("detector-report", help="Задержка и точность детекторов")
+    det_report.add_argument("--images", required=True)
+    det_report.add_argument("--labels", required=True)
+    det_report.add_argument("--model", action="append", required=True, help="имя=путь")
+    det_report.add_argument("--device", default="cpu")
+    det_report.add_argument("--limit", type=int, default=None)
+
+    args = parser.parse_args()
+    if args.command == "classifier":
+        train_student_classifier(
+            args.teacher, args.train, args.output, args.student, args.epochs, args.imgsz,
+            args.batch, args.lr, args.temperature, args.alpha, args.device
+        )
+    elif args.command == "detector":
+        distill_detector(
+            args.teacher, args.images, args.dataset, args.student, args.conf, args.epochs, args.imgsz, args.device
+        )
+    elif args.command == "classifier-report":
+        rows = classifier_report(_parse_models(args.model), args.val, args.device)
+        print(format_table(rows, CLASSIFIER_REPORT_COLUMNS))
+    else:
+        rows = detector_report(_parse_models(args.model), args.images, args.labels, args.device, args.limit)
+        print(format_table(rows, DETECTOR_REPORT_COLUMNS))
+
+
+if __name__ == "__main__":
+    main()
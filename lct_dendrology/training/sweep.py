@@ -0,0 +1,223 @@
+"""
+Перебор конфигураций инференса (модель, размер входа, формат, квантование) с
+отчетом о задержке, памяти и точности и Pareto-фронтом.
+
+Сетка задается JSON-файлом: словарь списков значений (перебираются все сочетания)
+или список готовых конфигураций. Ключи конфигурации:
+    detector   - веса детектора (.pt)
+    imgsz      - размер входа детектора
+    backend    - pt (как есть) или формат экспорта ultralytics: onnx, openvino, torchscript
+    int8       - INT8-квантование при экспорте (openvino)
+    classifier - веса классификатора пород (необязательно)
+
+Каждая конфигурация измеряется в отдельном процессе, чтобы пиковая память (RSS)
+не смешивалась между конфигурациями. Экспорт модели выполняется до запуска этого
+процесса, а память считывается сразу после замера задержки (до расчета mAP), поэтому
+peak_rss_mb отражает только инференс.
+
+Пример:
+    python -m lct_dendrology.training.sweep --grid grid.json \\
+        --images data/val/images --labels data/val/labels --crops data/crops_species \\
+        --data data/val/data.yaml --output sweep.csv --export-env 3 > best.env
+"""
+
+import argparse
+import contextlib
+import csv
+import itertools
+import json
+import resource
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional
+
+from lct_dendrology.training.benchmark import (
+    evaluate_predictions,
+    format_table,
+    latency_stats,
+    load_eval_set,
+    pareto_front,
+    time_calls,
+)
+
+DEFAULT_CONFIG = {'imgsz': 640, 'backend': 'pt', 'int8': False, 'classifier': None}
+REPORT_COLUMNS = (
+    "id", "detector", "imgsz", "backend", "int8", "classifier",
+    "p50_ms", "p90_ms", "p99_ms", "throughput", "peak_rss_mb",
+    "map50", "map50_95", "recall", "species_accuracy", "pareto",
+)
+
+
+def expand_grid(grid: Any) -> List[Dict[str, Any]]:
+    """Разворачивает сетку (словарь списков или список конфигураций) в список конфигураций."""
+    if isinstance(grid, dict):
+        keys = list(grid)
+        values = [value if isinstance(value, list) else [value] for value in grid.values()]
+        configs = [dict(zip(keys, combination)) for combination in itertools.product(*values)]
+    else:
+        configs = list(grid)
+    return [{**DEFAULT_CONFIG, **config} for config in configs]
+
+
+def prepare_model(config: Dict[str, Any]) -> str:
+    """Возвращает путь к модели детектора в нужном формате, при необходимости экспортируя ее."""
+    if config['backend'] == 'pt':
+        return config['detector']
+    from ultralytics import YOLO
+
+    exported = YOLO(config['detector']).export(
+        format=config['backend'], imgsz=config['imgsz'], int8=bool(config['int8'])
+    )
+    return str(exported)
+
+
+def measure_config(
+    config: Dict[str, Any],
+    model_path: str,
+    images_dir: str,
+    labels_dir: str,
+    crops_dir: Optional[str] = None,
+    data_yaml: Optional[str] = None,
+    device: str = "cpu",
+    limit: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Измеряет одну конфигурацию в текущем процессе.
+    Args:
+        config: Конфигурация из сетки
+        model_path: Модель детектора, уже подготовленная prepare_model
+    Returns:
+        dict: задержка, пропускная способность, пиковая память, mAP и точность пород
+    """
+    from lct_dendrology.inference import YoloClassifier, YoloDetector
+    from lct_dendrology.training.compare_pipelines import two_stage_predict
+
+    samples = load_eval_set(images_dir, labels_dir, crops_dir, limit=limit)
+    paths = [sample.image_path for sample in samples]
+    detector = YoloDetector(model_path=model_path, device=device)
+    classifier = YoloClassifier(model_path=config['classifier'], device=device) if config['classifier'] else None
+    imgsz = config['imgsz']
+
+    def predict(path: str) -> List[Dict[str, Any]]:
+        if classifier is None:
+            return detector.predict(path, imgsz=imgsz)['detections']
+        return two_stage_predict(detector, classifier, path, imgsz=imgsz)
+
+    outputs, latencies = time_calls(predict, paths)
+    # ru_maxrss в килобайтах на Linux; считывается до YOLO val, который загружает модель заново
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    metrics = evaluate_predictions(samples, outputs)
+    result = {
+        'model_path': model_path,
+        **latency_stats(latencies),
+        'recall': metrics['recall'],
+        'species_accuracy': metrics['species_accuracy'] if classifier is not None else None,
+        'map50': None,
+        'map50_95': None,
+        'peak_rss_mb': peak_rss_mb,
+    }
+    if data_yaml:
+        from ultralytics import YOLO
+
+        validation = YOLO(model_path).val(data=data_yaml, imgsz=imgsz, device=device, verbose=False, plots=False)
+        result['map50'] = float(validation.box.map50)
+        result['map50_95'] = float(validation.box.map)
+    return result
+
+
+def run_isolated(config: Dict[str, Any], model_path: str, args: argparse.Namespace) -> Dict[str, Any]:
+    """Измеряет конфигурацию с подготовленной моделью в дочернем процессе и возвращает ее результат."""
+    command = [
+        sys.executable, "-m", "lct_dendrology.training.sweep", "--measure", json.dumps(config),
+        "--model-path", model_path, "--images", args.images, "--labels", args.labels, "--device", args.device,
+    ]
+    for flag, value in (("--crops", args.crops), ("--data", args.data), ("--limit", args.limit)):
+        if value is not None:
+            command += [flag, str(value)]
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if completed.returncode != 0:
+        print(f"Ошибка измерения конфигурации {config}:\n{completed.stderr}", file=sys.stderr)
+        return {'error': completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else 'unknown'}
+    # Результат - последняя строка вывода (ultralytics пишет свой лог в stdout)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def mark_pareto(rows: List[Dict[str, Any]], cost_key: str, quality_key: str) -> List[Dict[str, Any]]:
+    """Отмечает в столбце pareto конфигурации, лежащие на Pareto-фронте."""
+    front = {id(row) for row in pareto_front(rows, cost_key, quality_key)}
+    for row in rows:
+        row['pareto'] = '*' if id(row) in front else ''
+    return rows
+
+
+def to_env(config: Dict[str, Any], model_path: Optional[str] = None) -> str:
+    """Фрагмент .env с настройками Settings для выбранной конфигурации."""
+    lines = [
+        f"TREE_DETECTOR_MODEL_PATH={model_path or config['detector']}",
+        f"TREE_DETECTOR_IMGSZ={config['imgsz']}",
+    ]
+    if config.get('classifier'):
+        lines.append(f"CLASSIFIER_MODEL_PATH={config['classifier']}")
+    return "\n".join(lines) + "\n"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Перебор конфигураций инференса с отчетом задержка/точность")
+    parser.add_argument("--grid", help="JSON-файл с сеткой конфигураций")
+    parser.add_argument("--images", required=True)
+    parser.add_argument("--labels", required=True)
+    parser.add_argument("--crops", default=None, help="Кропы по породам для точности классификации")
+    parser.add_argument("--data", default=None, help="data.yaml для mAP (YOLO val)")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--quality", default=None, help="Метрика качества для Pareto-фронта (по умолчанию map50 или recall)")
+    parser.add_argument("--output", default=None, help="CSV с результатами")
+    parser.add_argument("--export-env", type=int, default=None, help="Вывести .env для конфигурации с указанным id")
+    parser.add_argument("--measure", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--model-path", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure is not None:
+        # Режим дочернего процесса: одна конфигурация, результат в последней строке stdout
+        result = measure_config(
+            json.loads(args.measure), args.model_path, args.images, args.labels, args.crops, args.data, args.device, args.limit
+        )
+        print(json.dumps(result))
+        return
+    if not args.grid:
+        parser.error("требуется --grid")
+
+    with open(args.grid, "r", encoding="utf-8") as f:
+        configs = expand_grid(json.load(f))
+    rows = []
+    for index, config in enumerate(configs):
+        print(f"[{index + 1}/{len(configs)}] {config}", file=sys.stderr)
+        try:
+            # Экспорт - в этом процессе, чтобы его память не попала в замер конфигурации;
+            # лог ultralytics уходит в stderr, чтобы не смешиваться с выводом --export-env
+            with contextlib.redirect_stdout(sys.stderr):
+                model_path = prepare_model(config)
+        except Exception as e:
+            print(f"Ошибка экспорта конфигурации {config}: {str(e)}", file=sys.stderr)
+            rows.append({'id': index, **config, 'error': str(e)})
+            continue
+        rows.append({'id': index, **config, **run_isolated(config, model_path, args)})
+
+    measured = [row for row in rows if 'error' not in row]
+    quality = args.quality or ('map50' if args.data else 'recall')
+    mark_pareto(measured, 'p50_ms', quality)
+    # С --export-env в stdout выводится только .env, таблица - в stderr
+    print(format_table(rows, REPORT_COLUMNS), file=sys.stderr if args.export_env is not None else sys.stdout)
+
+    if args.output:
+        with open(args.output, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(REPORT_COLUMNS) + ['error'], extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(rows)
+    if args.export_env is not None:
+        row = rows[args.export_env]
+        sys.stdout.write(to_env(row, row.get('model_path')))
+
+
+if __name__ == "__main__":
+    main()
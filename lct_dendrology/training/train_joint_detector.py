@@ -0,0 +1,143 @@
+"""
+Обучение совместной модели (многоклассовый детектор пород).
+
+Разметка детектора (один класс "дерево") переразмечается породами из кропов,
+которые скрипты classify_crops_with_openai* разложили по директориям классов:
+бокс i изображения <img> получает класс директории, где лежит <img>_obj<i>.jpg.
+Боксы без кропа или с классом unknown получают класс UNKNOWN_SPECIES_CLASS, чтобы
+детектор не учился их пропускать.
+
+Пример:
+    python -m lct_dendrology.training.train_joint_detector \\
+        --images data/images --labels runs/detect/predict2/labels \\
+        --crops data/crops_species --output data/joint_dataset --epochs 100
+"""
+
+import argparse
+import os
+import random
+import shutil
+from typing import Dict, List, Optional, Tuple
+
+from lct_dendrology.inference.joint_detector import UNKNOWN_SPECIES_CLASS
+from lct_dendrology.training.benchmark import (
+    IMAGE_EXTENSIONS,
+    UNKNOWN_LABELS,
+    load_crop_labels,
+    read_yolo_labels,
+)
+
+
+def build_class_names(crop_labels: Dict[Tuple[str, int], str]) -> List[str]:
+    """Список классов совместной модели: UNKNOWN_SPECIES_CLASS первым, затем породы."""
+    species = sorted({name for name in crop_labels.values() if name not in UNKNOWN_LABELS})
+    return [UNKNOWN_SPECIES_CLASS] + [name for name in species if name != UNKNOWN_SPECIES_CLASS]
+
+
+def relabel(
+    label_path: str,
+    stem: str,
+    crop_labels: Dict[Tuple[str, int], str],
+    class_ids: Dict[str, int]
+) -> List[str]:
+    """Возвращает строки разметки YOLO с классами-породами вместо класса дерева."""
+    lines = []
+    for i, (_, x_c, y_c, w, h) in enumerate(read_yolo_labels(label_path)):
+        species = crop_labels.get((stem, i), UNKNOWN_SPECIES_CLASS)
+        class_id = class_ids.get(species, class_ids[UNKNOWN_SPECIES_CLASS])
+        lines.append(f"{class_id} {x_c:.6f} {y_c:.6f} {w:.6f} {h:.6f}")
+    return lines
+
+
+def build_joint_dataset(
+    images_dir: str,
+    labels_dir: str,
+    crops_dir: str,
+    output_dir: str,
+    val_ratio: float = 0.2,
+    seed: int = 0
+) -> str:
+    """
+    Собирает датасет YOLO для совместной модели.
+    Returns:
+        str: путь к data.yaml
+    """
+    crop_labels = load_crop_labels(crops_dir)
+    class_names = build_class_names(crop_labels)
+    class_ids = {name: i for i, name in enumerate(class_names)}
+
+    stems = []
+    for name in sorted(os.listdir(images_dir)):
+        stem, ext = os.path.splitext(name)
+        if ext.lower() in IMAGE_EXTENSIONS and os.path.exists(os.path.join(labels_dir, stem + ".txt")):
+            stems.append((stem, name))
+    random.Random(seed).shuffle(stems)
+    val_count = int(len(stems) * val_ratio)
+
+    for index, (stem, name) in enumerate(stems):
+        split = "val" if index < val_count else "train"
+        images_out = os.path.join(output_dir, "images", split)
+        labels_out = os.path.join(output_dir, "labels", split)
+        os.makedirs(images_out, exist_ok=True)
+        os.makedirs(labels_out, exist_ok=True)
+        shutil.copy2(os.path.join(images_dir, name), os.path.join(images_out, name))
+        lines = relabel(os.path.join(labels_dir, stem + ".txt"), stem, crop_labels, class_ids)
+        with open(os.path.join(labels_out, stem + ".txt"), "w") as f:
+            f.write("\n".join(lines) + ("\n" if lines else ""))
+
+    data_yaml = os.path.join(output_dir, "data.yaml")
+    with open(data_yaml, "w", encoding="utf-8") as f:
+        f.write(f"path: {os.path.abspath(output_dir)}\n")
+        f.write("train: images/train\n")
+        f.write("val: images/val\n")
+        f.write("names:\n")
+        for i, name in enumerate(class_names):
+            f.write(f"  {i}: {name}\n")
+    print(f"Датасет: {len(stems) - val_count} train, {val_count} val, классы: {class_names}")
+    return data_yaml
+
+
+def train_joint_detector(
+    data_yaml: str,
+    base_model: str = "yolo11n.pt",
+    epochs: int = 100,
+    imgsz: int = 640,
+    device: Optional[str] = None,
+    project: str = "runs/joint",
+    name: str = "train"
+) -> str:
+    """
+    Дообучает детектор на многоклассовом датасете пород.
+    Returns:
+        str: путь к лучшим весам
+    """
+    from ultralytics import YOLO
+
+    model = YOLO(base_model)
+    model.train(data=data_yaml, epochs=epochs, imgsz=imgsz, device=device, project=project, name=name)
+    best = os.path.join(str(model.trainer.save_dir), "weights", "best.pt")
+    print(f"Лучшие веса: {best}")
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Обучение совместной модели детекции и определения породы")
+    parser.add_argument("--images", required=True, help="Директория исходных изображений")
+    parser.add_argument("--labels", required=True, help="Директория разметки детектора (YOLO)")
+    parser.add_argument("--crops", required=True, help="Директория кропов, разложенных по породам")
+    parser.add_argument("--output", default="data/joint_dataset", help="Директория собранного датасета")
+    parser.add_argument("--val-ratio", type=float, default=0.2)
+    parser.add_argument("--base-model", default="yolo11n.pt")
+    parser.add_argument("--epochs", type=int, default=100)
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--device", default=None)
+    parser.add_argument("--dataset-only", action="store_true", help="Только собрать датасет")
+    args = parser.parse_args()
+
+    data_yaml = build_joint_dataset(args.images, args.labels, args.crops, args.output, args.val_ratio)
+    if not args.dataset_only:
+        train_joint_detector(data_yaml, args.base_model, args.epochs, args.imgsz, args.device)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""Юнит-тесты для HTTP-клиента бота к бэкенду."""
+
+import asyncio
+from collections import deque
+
+import pytest
+from aiohttp import web
+
+from lct_dendrology.bot.backend_client import BackendClient
+
+
+async def start_server(handler, ready_handler=None):
+    app = web.Application()
+    app.router.add_post("/process-image", handler)
+    if ready_handler is not None:
+        app.router.add_get("/ready", ready_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+@pytest.mark.asyncio
+async def test_connections_are_reused():
+    async def handler(request):
+        await request.post()
+        return web.json_response({'ok': True})
+
+    runner, url = await start_server(handler)
+    client = BackendClient(url)
+    try:
+        for _ in range(3):
+            async with client.post_image("/process-image", b"data", "photo.jpg") as response:
+                assert (await response.json()) == {'ok': True}
+        stats = client.get_stats()
+        assert stats['connections_created'] == 1
+        assert stats['connections_reused'] == 2
+        assert stats['in_flight'] == 0
+    finally:
+        await client.close()
+        await runner.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_retries_unavailable_backend():
+    calls = []
+
+    async def handler(request):
+        await request.post()
+        calls.append(1)
+        return web.json_response({}, status=503 if len(calls) < 3 else 200)
+
+    runner, url = await start_server(handler)
+    client = BackendClient(url, retries=2, retry_backoff=0.01)
+    try:
+        async with client.post_image("/process-image", b"data", "photo.jpg") as response:
+            assert response.status == 200
+        assert client.get_stats()['retried'] == 2
+
+        # Повторы исчерпаны - возвращается последний ответ
+        calls.clear()
+        client.retries = 1
+        async with client.post_image("/process-image", b"data", "photo.jpg") as response:
+            assert response.status == 503
+    finally:
+        await client.close()
+        await runner.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_retry_goes_to_other_backend():
+    async def unavailable(request):
+        await request.post()
+        return web.json_response({}, status=503)
+
+    async def available(request):
+        await request.post()
+        return web.json_response({'backend': 'b'})
+
+    runner_a, url_a = await start_server(unavailable)
+    runner_b, url_b = await start_server(available)
+    client = BackendClient([url_a, url_b], retries=1, retry_backoff=0.01)
+    try:
+        for _ in range(4):
+            async with client.post_image("/process-image", b"data", "photo.jpg") as response:
+                assert (await response.json()) == {'backend': 'b'}
+        stats = client.get_stats()
+        assert stats['in_flight'] == 0
+        assert [backend['outstanding'] for backend in stats['backends']] == [0, 0]
+        # Без активных проверок бэкенд не выводится из ротации
+        assert client.backends[0].healthy
+    finally:
+        await client.close()
+        await runner_a.cleanup()
+        await runner_b.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_health_check_ejects_and_readmits_backend():
+    ready = {'a': False}
+
+    async def handler(request):
+        await request.post()
+        return web.json_response({})
+
+    async def ready_a(request):
+        return web.json_response({}, status=200 if ready['a'] else 503)
+
+    async def ready_b(request):
+        return web.json_response({})
+
+    runner_a, url_a = await start_server(handler, ready_a)
+    runner_b, url_b = await start_server(handler, ready_b)
+    client = BackendClient([url_a, url_b], health_interval=60)
+    try:
+        await client.check_health()
+        backend_a, backend_b = client.backends
+        assert not backend_a.healthy and backend_b.healthy
+        assert all(client.pick_backend() is backend_b for _ in range(10))
+
+        ready['a'] = True
+        await client.check_health()
+        assert backend_a.healthy
+    finally:
+        await client.close()
+        await runner_a.cleanup()
+        await runner_b.cleanup()
+
+
+def test_pick_backend_policies():
+    client = BackendClient(["http://a", "http://b"], balancing="ewma")
+    backend_a, backend_b = client.backends
+    backend_a.ewma, backend_b.ewma = 0.1, 0.3
+    assert client.pick_backend() is backend_a
+    # Медленный, но свободный бэкенд лучше быстрого с очередью
+    backend_a.outstanding = 3
+    assert client.pick_backend() is backend_b
+
+    client.balancing = "least_outstanding"
+    assert client.pick_backend() is backend_b
+    assert client.pick_backend(exclude=[backend_b]) is backend_a
+    with pytest.raises(ValueError):
+        BackendClient("http://a", balancing="round_robin")
+
+
+@pytest.mark.asyncio
+async def test_slow_request_is_hedged():
+    async def slow(request):
+        await request.post()
+        await asyncio.sleep(1.0)
+        return web.json_response({'backend': 'a'})
+
+    async def fast(request):
+        await request.post()
+        return web.json_response({'backend': 'b'})
+
+    runner_a, url_a = await start_server(slow)
+    runner_b, url_b = await start_server(fast)
+    client = BackendClient([url_a, url_b], balancing="ewma", hedge_percentile=95)
+    client.backends[0].ewma, client.backends[1].ewma = 0.01, 0.02
+    try:
+        # До набора статистики задержек запросы не дублируются
+        assert client.hedge_delay("/process-image") is None
+        client._latencies["/process-image"] = deque([0.05] * 20)
+        assert client.hedge_delay("/process-image") == 0.05
+
+        async with client.post_image("/process-image", b"data", "photo.jpg") as response:
+            assert (await response.json()) == {'backend': 'b'}
+        stats = client.get_stats()
+        assert stats['hedged'] == 1
+        assert stats['hedge_wins'] == 1
+        await asyncio.sleep(0.05)
+        assert client.get_stats()['in_flight'] == 0
+    finally:
+        await client.close()
+        await runner_a.cleanup()
+        await runner_b.cleanup()
@@ -0,0 +1,38 @@
+"""Юнит-тесты для дедлайнов запросов."""
+
+import time
+
+import pytest
+
+from lct_dendrology.backend.deadline import DeadlineExceeded, DeadlineStats, RequestDeadline
+
+
+class TestRequestDeadline:
+    def test_from_header(self):
+        assert RequestDeadline.from_header(None).deadline is None
+        assert RequestDeadline.from_header("garbage").deadline is None
+        assert RequestDeadline.from_header("123.5").deadline == 123.5
+
+    def test_expired(self):
+        assert RequestDeadline(time.time() - 1).expired()
+        assert not RequestDeadline(time.time() + 60).expired()
+        assert not RequestDeadline().expired()
+
+    def test_cancel(self):
+        deadline = RequestDeadline()
+        deadline.cancel()
+        with pytest.raises(DeadlineExceeded):
+            deadline.check("detection")
+
+
+class TestDeadlineStats:
+    def test_wasted_and_saved(self):
+        stats = DeadlineStats()
+        stats.record_completed(2.0)
+        stats.record_completed(2.0, late=True)
+        stats.record_dropped()
+        stats.record_aborted(0.5)
+        result = stats.get_stats()
+        assert result['completed_late'] == 1
+        assert result['wasted_seconds'] == 2.5
+        assert result['saved_seconds'] == 3.5
@@ -0,0 +1,38 @@
+"""Юнит-тесты для функций дистилляции моделей."""
+
+import numpy as np
+import pytest
+import torch
+
+from lct_dendrology.training.distill import distillation_loss, list_crops, soften
+
+
+def test_soften_preserves_order_and_flattens():
+    probs = np.array([[0.7, 0.2, 0.1]])
+    soft = soften(probs, temperature=4.0)
+    assert soft.sum() == pytest.approx(1.0)
+    assert soft[0, 0] > soft[0, 1] > soft[0, 2]
+    assert soft[0, 0] < probs[0, 0]
+    np.testing.assert_allclose(soften(probs, 1.0), probs)
+
+
+def test_distillation_loss_prefers_teacher_agreement():
+    teacher = torch.tensor([[0.9, 0.1]])
+    targets = torch.tensor([0])
+    agree = distillation_loss(torch.tensor([[3.0, -3.0]]), teacher, targets)
+    disagree = distillation_loss(torch.tensor([[-3.0, 3.0]]), teacher, targets)
+    assert agree < disagree
+    # При alpha=0 остается только кросс-энтропия с меткой
+    ce = torch.nn.functional.cross_entropy(torch.tensor([[3.0, -3.0]]), targets)
+    assert distillation_loss(torch.tensor([[3.0, -3.0]]), teacher, targets, alpha=0.0) == pytest.approx(ce.item())
+
+
+def test_list_crops(tmp_path):
+    for name in ("oak", "birch"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "img_obj0.jpg").write_bytes(b"")
+    (tmp_path / "oak" / "notes.txt").write_text("")
+    paths, targets, class_names = list_crops(str(tmp_path))
+    assert class_names == ["birch", "oak"]
+    assert targets == [0, 1]
+    assert len(paths) == 2
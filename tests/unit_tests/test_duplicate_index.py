@@ -0,0 +1,76 @@
+"""Юнит-тесты для индекса почти-дубликатов изображений."""
+
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from lct_dendrology.backend.duplicate_index import DuplicateImageIndex, image_fingerprint
+
+
+def encode(image, quality=90):
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def photo():
+    rng = np.random.default_rng(1)
+    pixels = rng.integers(0, 255, (12, 16, 3), dtype=np.uint8)
+    return Image.fromarray(pixels).resize((800, 600), Image.BILINEAR)
+
+
+@pytest.fixture
+def analysis():
+    return {
+        'inference_enabled': True,
+        'detections': [{
+            'id': 1,
+            'bbox': {'x1': 100.0, 'y1': 60.0, 'x2': 300.0, 'y2': 360.0},
+            'center': {'x': 200.0, 'y': 210.0},
+            'width': 200.0,
+            'height': 300.0,
+            'area': 60000.0,
+            'species': 'oak'
+        }],
+        'model_info': {}
+    }
+
+
+class TestDuplicateImageIndex:
+    def test_recompressed_resend_reuses_rescaled_result(self, photo, analysis):
+        index = DuplicateImageIndex()
+        index.add(*image_fingerprint(encode(photo)), "v1", analysis)
+
+        resent = encode(photo.resize((400, 300), Image.BILINEAR), quality=50)
+        result = index.lookup(*image_fingerprint(resent), "v1")
+
+        assert result is not None
+        det = result['detections'][0]
+        assert det['bbox'] == {'x1': 50.0, 'y1': 30.0, 'x2': 150.0, 'y2': 180.0}
+        assert det['center'] == {'x': 100.0, 'y': 105.0}
+        assert det['area'] == 15000.0
+        assert result['model_info']['near_duplicate']['original_size'] == [800, 600]
+        # Сохраненный результат не изменяется
+        assert analysis['detections'][0]['bbox']['x1'] == 100.0
+
+    def test_different_aspect_ratio_is_miss(self, photo, analysis):
+        index = DuplicateImageIndex()
+        index.add(*image_fingerprint(encode(photo)), "v1", analysis)
+        key, _ = image_fingerprint(encode(photo))
+        assert index.lookup(key, (800, 800), "v1") is None
+
+    def test_other_model_version_is_miss(self, photo, analysis):
+        index = DuplicateImageIndex()
+        fingerprint = image_fingerprint(encode(photo))
+        index.add(*fingerprint, "v1", analysis)
+        assert index.lookup(*fingerprint, "v2") is None
+        assert index.get_stats()['misses'] == 1
+
+    def test_expired_entry_is_miss(self, photo, analysis):
+        index = DuplicateImageIndex(ttl=-1)
+        fingerprint = image_fingerprint(encode(photo))
+        index.add(*fingerprint, "v1", analysis)
+        assert index.lookup(*fingerprint, "v1") is None
@@ -29,6 +29,16 @@ class TestFastAPIServer:
         assert response.status_code == 200
         assert response.json() == {"status": "healthy"}
     
+    def test_readiness_endpoint(self, client):
+        """Тест эндпоинта готовности для балансировщика бота."""
+        response = client.get("/ready")
+        assert response.status_code == 200
+        assert response.json()["status"] == "ready"
+        with patch('lct_dendrology.backend.server.image_processor.is_ready', return_value=False):
+            response = client.get("/ready")
+        assert response.status_code == 503
+        assert response.json()["status"] == "not_ready"
+    
     def test_process_image_success(self, client):
         """Тест успешной обработки изображения."""
         # Создаем тестовое изображение
@@ -104,6 +114,172 @@ class TestFastAPIServer:
         assert data["file_size"] == len(image_bytes)
         assert data["file_size"] > 1000  # Файл должен быть больше 1KB
     
+    def test_admin_models_endpoint(self, client):
+        """Тест эндпоинта со списком версий моделей."""
+        with patch("lct_dendrology.backend.server.settings.admin_token", "secret"):
+            response = client.get("/admin/models", headers={"X-Admin-Token": "secret"})
+        assert response.status_code == 200
+        assert "model_version" in response.json()
+
+    def test_admin_token_required(self, client):
+        """Тест проверки токена администратора."""
+        with patch("lct_dendrology.backend.server.settings.admin_token", "secret"):
+            response = client.get("/admin/models", headers={"X-Admin-Token": "wrong"})
+            assert response.status_code == 403
+            response = client.get("/admin/models")
+            assert response.status_code == 403
+
+    def test_admin_endpoints_closed_without_token(self, client):
+        """Тест: без токена в настройках административные эндпоинты недоступны никому."""
+        with patch("lct_dendrology.backend.server.settings.admin_token", None):
+            assert client.get("/admin/models").status_code == 403
+            assert client.get("/admin/models", headers={"X-Admin-Token": ""}).status_code == 403
+            assert client.post("/admin/reload-models").status_code == 403
+
+    def test_reload_models_inference_disabled(self, client):
+        """Тест перезагрузки моделей при отключенном инференсе."""
+        with patch("lct_dendrology.backend.server.settings.model_enable_inference", False), \
+             patch("lct_dendrology.backend.server.settings.admin_token", "secret"):
+            response = client.post("/admin/reload-models", headers={"X-Admin-Token": "secret"})
+            assert response.status_code == 409
+
+    def test_process_image_expired_deadline(self, client):
+        """Тест отбрасывания запроса с истекшим дедлайном."""
+        image_bytes, filename = create_test_image()
+        files = {"file": (filename, image_bytes, "image/jpeg")}
+        response = client.post("/process-image", files=files, headers={"X-Request-Deadline": "1"})
+        assert response.status_code == 504
+        metrics = client.get("/metrics").json()
+        assert metrics["deadlines"]["dropped_in_queue"] >= 1
+
+    def test_process_image_threshold_validation(self, client):
+        """Тест проверки порогов запроса."""
+        image_bytes, filename = create_test_image()
+        files = {"file": (filename, image_bytes, "image/jpeg")}
+        assert client.post("/process-image?conf=0.4&iou=0.5&species_conf=0.6", files=files).status_code == 200
+        assert client.post("/process-image?conf=1.5", files=files).status_code == 422
+
+    def test_process_image_stream(self, client):
+        """Тест потоковой обработки: детекции, породы, затем итоговый результат."""
+        import json
+
+        def fake_process_image(content, on_progress=None, **kwargs):
+            on_progress('detections', {'detections': [{'id': 1}]})
+            on_progress('species', {'detections': [{'id': 1, 'species': 'oak', 'species_confidence': 0.9}]})
+            return {'inference_enabled': True, 'detections': [{'id': 1, 'species': 'oak'}]}
+
+        image_bytes, filename = create_test_image()
+        files = {"file": (filename, image_bytes, "image/jpeg")}
+        with patch("lct_dendrology.backend.server.image_processor.process_image", side_effect=fake_process_image):
+            response = client.post("/process-image/stream", files=files)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        events = [json.loads(line) for line in response.text.splitlines()]
+        assert [event['event'] for event in events] == ['detections', 'species', 'result']
+        assert events[-1]['analysis_result']['detections'][0]['species'] == 'oak'
+        assert events[-1]['file_size'] == len(image_bytes)
+
+    def test_process_image_stream_expired_deadline(self, client):
+        """Тест события ошибки в потоковом ответе."""
+        import json
+        image_bytes, filename = create_test_image()
+        files = {"file": (filename, image_bytes, "image/jpeg")}
+        response = client.post("/process-image/stream", files=files, headers={"X-Request-Deadline": "1"})
+        event = json.loads(response.text.splitlines()[-1])
+        assert event['event'] == 'error'
+        assert event['status'] == 504
+
+    def test_process_images_batch(self, client):
+        """Тест пакетной обработки: результаты по порядку, ошибка одного файла не мешает остальным."""
+        def fake_process_image(content, **kwargs):
+            if content == b"broken":
+                raise ValueError("bad image")
+            return {'inference_enabled': True, 'detections': [{'id': 1}] * (len(content) % 3)}
+
+        first, _ = create_test_image(width=120)
+        second, _ = create_test_image(width=150, format="PNG")
+        files = [
+            ("files", ("a.jpg", first, "image/jpeg")),
+            ("files", ("b.png", second, "image/png")),
+            ("files", ("c.jpg", b"broken", "image/jpeg")),
+        ]
+        with patch("lct_dendrology.backend.server.image_processor.process_image", side_effect=fake_process_image):
+            response = client.post("/process-images", files=files)
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert [result["filename"] for result in results] == ["a.jpg", "b.png", "c.jpg"]
+        assert results[1]["file_size"] == len(second)
+        assert "analysis_result" in results[0] and "analysis_result" in results[1]
+        assert results[2]["error"]["status"] == 500
+
+    def test_process_images_validation(self, client):
+        """Тест ограничений пакетного запроса."""
+        image_bytes, _ = create_test_image()
+        files = [("files", ("a.jpg", image_bytes, "image/jpeg")), ("files", ("a.txt", b"text", "text/plain"))]
+        assert client.post("/process-images", files=files).status_code == 400
+        with patch("lct_dendrology.backend.server.settings.batch_max_images", 1):
+            files = [("files", ("a.jpg", image_bytes, "image/jpeg"))] * 2
+            assert client.post("/process-images", files=files).status_code == 400
+
+    def test_process_image_rate_limited(self, client):
+        """Тест квоты запросов клиента."""
+        from lct_dendrology.backend.scheduler import ClientRateLimiter
+        image_bytes, filename = create_test_image()
+        files = {"file": (filename, image_bytes, "image/jpeg")}
+        limiter = ClientRateLimiter(rate_per_minute=0.01, burst=1)
+        with patch("lct_dendrology.backend.server.rate_limiter", limiter):
+            headers = {"X-Client-Id": "42"}
+            assert client.post("/process-image", files=files, headers=headers).status_code == 200
+            response = client.post("/process-image", files=files, headers=headers)
+            assert response.status_code == 429
+            assert "Retry-After" in response.headers
+
+    def test_process_images_charges_quota_per_image(self, client):
+        """Тест квоты пакетного запроса: по токену на каждое изображение."""
+        from lct_dendrology.backend.scheduler import ClientRateLimiter
+        image_bytes, _ = create_test_image()
+        files = [("files", (f"{i}.jpg", image_bytes, "image/jpeg")) for i in range(10)]
+        limiter = ClientRateLimiter(rate_per_minute=0.01, burst=11)
+        headers = {"X-Client-Id": "42"}
+        with patch("lct_dendrology.backend.server.rate_limiter", limiter), \
+                patch("lct_dendrology.backend.server.image_processor.process_image",
+                      return_value={'inference_enabled': True, 'detections': []}):
+            assert client.post("/process-images", files=files, headers=headers).status_code == 200
+            assert limiter._buckets["42"].tokens == pytest.approx(1.0, abs=0.01)
+            assert client.post("/process-images", files=files, headers=headers).status_code == 429
+
+    @pytest.mark.asyncio
+    async def test_oversized_request_does_not_block_small_one(self):
+        """Тест: запрос, ждущий памяти, не занимает слот инференса и не задерживает маленький."""
+        import asyncio
+        from unittest.mock import AsyncMock, MagicMock
+        from lct_dendrology.backend import server
+        from lct_dendrology.backend.deadline import RequestDeadline
+        from lct_dendrology.backend.memory_limiter import MB, MemoryBudgetLimiter
+        from lct_dendrology.backend.scheduler import FairScheduler
+
+        limiter = MemoryBudgetLimiter(budget_mb=1)
+        # Бюджет почти целиком занят уже идущей обработкой
+        await limiter.acquire(MB - 100_000)
+        large, _ = create_test_image(width=1000, height=1000)
+        small, _ = create_test_image(width=10, height=10)
+        request = MagicMock(is_disconnected=AsyncMock(return_value=False))
+        with patch.object(server, "memory_limiter", limiter), \
+                patch.object(server, "scheduler", FairScheduler(capacity=1)), \
+                patch.object(server.image_processor, "process_image",
+                             return_value={'inference_enabled': True, 'detections': []}):
+            oversized = asyncio.create_task(server.process_content(
+                request, "a", "interactive", large, RequestDeadline(), {}
+            ))
+            await asyncio.sleep(0.05)
+            result = await asyncio.wait_for(server.process_content(
+                request, "b", "interactive", small, RequestDeadline(), {}
+            ), 2)
+            assert result['inference_enabled'] is True
+            assert not oversized.done()
+            limiter.release(MB - 100_000)
+            await asyncio.wait_for(oversized, 2)
+
     @pytest.mark.asyncio
     async def test_server_startup(self):
         """Тест запуска сервера."""
@@ -6,6 +6,8 @@ from PIL import Image
 import io
 
 from lct_dendrology.backend.image_processor import ImageProcessor
+from lct_dendrology.backend.deadline import DeadlineExceeded, RequestDeadline
+from lct_dendrology.cfg import settings
 
 
 class TestImageProcessor:
@@ -45,7 +47,7 @@ class TestImageProcessor:
         return img_bytes.getvalue()
 
     def test_process_image_inference_disabled(self, test_image_bytes):
-        with patch('lct_dendrology.backend.image_processor.settings') as mock_settings:
+        with patch('lct_dendrology.backend.image_processor.settings', settings.model_copy()) as mock_settings:
             mock_settings.model_enable_inference = False
             processor = ImageProcessor()
             result = processor.process_image(test_image_bytes)
@@ -54,7 +56,7 @@ class TestImageProcessor:
             assert result['model_info']['status'] == 'disabled'
 
     def test_process_image_inference_enabled_with_classification(self, test_image_bytes, mock_yolo_detector, mock_yolo_classifier):
-        with patch('lct_dendrology.backend.image_processor.settings') as mock_settings, \
+        with patch('lct_dendrology.backend.image_processor.settings', settings.model_copy()) as mock_settings, \
              patch('lct_dendrology.backend.image_processor.YoloDetector', return_value=mock_yolo_detector), \
              patch('lct_dendrology.backend.image_processor.YoloClassifier', return_value=mock_yolo_classifier):
             mock_settings.model_enable_inference = True
@@ -73,7 +75,7 @@ class TestImageProcessor:
             'class_name': 'oak',
             'confidence': 0.6,
         }
-        with patch('lct_dendrology.backend.image_processor.settings') as mock_settings, \
+        with patch('lct_dendrology.backend.image_processor.settings', settings.model_copy()) as mock_settings, \
              patch('lct_dendrology.backend.image_processor.YoloDetector', return_value=mock_yolo_detector), \
              patch('lct_dendrology.backend.image_processor.YoloClassifier', return_value=mock_yolo_classifier):
             mock_settings.model_enable_inference = True
@@ -85,7 +87,7 @@ class TestImageProcessor:
             assert det['species_confidence'] == 0.6
 
     def test_get_detector_info(self, mock_yolo_detector, mock_yolo_classifier):
-        with patch('lct_dendrology.backend.image_processor.settings') as mock_settings, \
+        with patch('lct_dendrology.backend.image_processor.settings', settings.model_copy()) as mock_settings, \
              patch('lct_dendrology.backend.image_processor.YoloDetector', return_value=mock_yolo_detector), \
              patch('lct_dendrology.backend.image_processor.YoloClassifier', return_value=mock_yolo_classifier):
             mock_settings.model_enable_inference = True
@@ -93,3 +95,303 @@ class TestImageProcessor:
             info = processor.get_detector_info()
             assert 'detector_info' in info
             assert 'classifier_info' in info
+
+    def test_models_are_pooled_by_workers(self, test_image_bytes, mock_yolo_detector, mock_yolo_classifier):
+        with patch('lct_dendrology.backend.image_processor.settings', settings.model_copy()) as mock_settings, \
+             patch('lct_dendrology.backend.image_processor.YoloDetector', return_value=mock_yolo_detector) as detector_cls, \
+             patch('lct_dendrology.backend.image_processor.YoloClassifier', return_value=mock_yolo_classifier) as classifier_cls:
+            mock_settings.model_enable_inference = True
+            mock_settings.inference_workers = 3
+            mock_settings.model_pool_size = None
+            processor = ImageProcessor()
+            assert detector_cls.call_count == 3
+            assert classifier_cls.call_count == 3
+            processor.process_image(test_image_bytes)
+            pools = processor.get_detector_info()['model_pools']
+            assert pools['detector']['replicas'] == 3
+            assert pools['detector']['checkouts'] == 1
+            assert pools['detector']['available'] == 3
+
+    def test_thread_budget_is_divided_across_replicas(self, mock_yolo_detector, mock_yolo_classifier):
+        with patch('lct_dendrology.backend.image_processor.settings', settings.model_copy()) as mock_settings, \
+             patch('lct_dendrology.backend.image_processor.YoloDetector', return_value=mock_yolo_detector), \
+             patch('lct_dendrology.backend.image_processor.YoloClassifier', return_value=mock_yolo_classifier), \
+             patch('torch.set_num_threads') as set_num_threads:
+            mock_settings.model_enable_inference = True
+            mock_settings.inference_workers = 3
+            mock_settings.model_pool_size = None
+            mock_settings.model_thread_budget = 8
+            processor = ImageProcessor()
+            set_num_threads.assert_called_once_with(2)
+            assert processor.get_detector_info()['threads_per_replica'] == 2
+
+    def test_per_request_thresholds_reuse_raw_predictions(self, test_image_bytes, mock_yolo_detector, mock_yolo_classifier):
+        import numpy as np
+        mock_yolo_detector.predict_raw.return_value = {
+            'boxes': np.array([[10, 10, 50, 50], [60, 60, 90, 90]], dtype=float),
+            'confidences': np.array([0.8, 0.3]),
+            'class_ids': np.array([0, 0]),
+            'names': {0: 'tree'},
+            'model_info': {'model_path': 'yolo11n.pt'},
+        }
+        with patch('lct_dendrology.backend.image_processor.settings', settings.model_copy()) as mock_settings, \
+             patch('lct_dendrology.backend.image_processor.YoloDetector', return_value=mock_yolo_detector), \
+             patch('lct_dendrology.backend.image_processor.YoloClassifier', return_value=mock_yolo_classifier):
+            mock_settings.model_enable_inference = True
+            mock_settings.raw_prediction_cache_size = 8
+            processor = ImageProcessor()
+            strict = processor.process_image(test_image_bytes, conf=0.5)
+            loose = processor.process_image(test_image_bytes, conf=0.2, species_conf=0.95)
+            assert len(strict['detections']) == 1
+            assert len(loose['detections']) == 2
+            # Повторный запрос с другими порогами не прогоняет детектор заново
+            assert mock_yolo_detector.predict_raw.call_count == 1
+            mock_yolo_detector.predict.assert_not_called()
+            assert loose['model_info']['detector']['raw_cache_hit'] is True
+            assert loose['model_info']['detector']['confidence_threshold'] == 0.2
+            # Порог классификатора запроса не меняет общий порог
+            assert loose['detections'][0]['species'] is None
+            assert processor.class_confidence_threshold == mock_settings.classifier_confidence_threshold
+
+    def test_progress_events(self, test_image_bytes, mock_yolo_detector, mock_yolo_classifier):
+        events = []
+        with patch('lct_dendrology.backend.image_processor.settings', settings.model_copy()) as mock_settings, \
+             patch('lct_dendrology.backend.image_processor.YoloDetector', return_value=mock_yolo_detector), \
+             patch('lct_dendrology.backend.image_processor.YoloClassifier', return_value=mock_yolo_classifier):
+            mock_settings.model_enable_inference = True
+            mock_settings.classifier_confidence_threshold = 0.5
+            processor = ImageProcessor()
+            result = processor.process_image(test_image_bytes, on_progress=lambda *event: events.append(event))
+        assert [name for name, _ in events] == ['detections', 'species']
+        # Детекции отправляются до классификации и не меняются после нее
+        assert 'species' not in events[0][1]['detections'][0]
+        assert events[1][1]['detections'] == [{'id': 0, 'species': 'oak', 'species_confidence': 0.9}]
+        assert result['detections'][0]['species'] == 'oak'
+
+    def test_joint_model_skips_classifier(self, test_image_bytes, mock_yolo_detector, mock_yolo_classifier):
+        mock_yolo_detector.predict.return_value['detections'][0].update(
+            {'class_name': 'tree', 'species': 'oak', 'species_confidence': 0.8}
+        )
+        with patch('lct_dendrology.backend.image_processor.settings', settings.model_copy()) as mock_settings, \
+             patch('lct_dendrology.backend.image_processor.JointDetector', return_value=mock_yolo_detector), \
+             patch('lct_dendrology.backend.image_processor.YoloClassifier', return_value=mock_yolo_classifier) as classifier_cls:
+            mock_settings.model_enable_inference = True
+            mock_settings.joint_model_enabled = True
+            mock_settings.joint_model_path = "models/joint_v1.pt"
+            mock_settings.model_registry_dir = None
+            processor = ImageProcessor()
+            result = processor.process_image(test_image_bytes)
+            assert result['model_version'] == "joint_v1+joint"
+            assert result['detections'][0]['species'] == 'oak'
+            assert result['model_info']['classifier']['joint'] is True
+            strict = processor.process_image(test_image_bytes, species_conf=0.9)
+            assert strict['detections'][0]['species'] is None
+        classifier_cls.assert_not_called()
+
+    def test_process_image_reports_model_version(self, test_image_bytes, mock_yolo_detector, mock_yolo_classifier):
+        with patch('lct_dendrology.backend.image_processor.settings', settings.model_copy()) as mock_settings, \
+             patch('lct_dendrology.backend.image_processor.YoloDetector', return_value=mock_yolo_detector), \
+             patch('lct_dendrology.backend.image_processor.YoloClassifier', return_value=mock_yolo_classifier):
+            mock_settings.model_enable_inference = True
+            mock_settings.model_registry_dir = None
+            mock_settings.tree_detector_model_path = "models/tree_detector_v2.pt"
+            mock_settings.classifier_model_path = "models/species_classifier_v2.pt"
+            processor = ImageProcessor()
+            result = processor.process_image(test_image_bytes)
+            assert result['model_version'] == "tree_detector_v2+species_classifier_v2"
+            assert result['model_info']['model_version'] == result['model_version']
+
+    def test_reload_models_from_registry(self, tmp_path, test_image_bytes, mock_yolo_detector, mock_yolo_classifier):
+        for kind in ("detector", "classifier"):
+            (tmp_path / kind).mkdir()
+            (tmp_path / kind / "v1.pt").touch()
+        with patch('lct_dendrology.backend.image_processor.settings', settings.model_copy()) as mock_settings, \
+             patch('lct_dendrology.backend.image_processor.YoloDetector', return_value=mock_yolo_detector) as detector_cls, \
+             patch('lct_dendrology.backend.image_processor.YoloClassifier', return_value=mock_yolo_classifier):
+            mock_settings.model_enable_inference = True
+            mock_settings.model_registry_dir = str(tmp_path)
+            processor = ImageProcessor()
+            old_bundle = processor._bundle
+            assert processor.model_version == "v1+v1"
+
+            (tmp_path / "detector" / "v2.pt").touch()
+            info = processor.reload_models()
+
+            assert info == {'previous_version': "v1+v1", 'model_version': "v2+v1"}
+            assert detector_cls.call_args.kwargs['model_path'] == str(tmp_path / "detector" / "v2.pt")
+            # Старый набор моделей не изменяется: текущие запросы дорабатывают на нем
+            assert old_bundle.version == "v1+v1"
+            assert processor.process_image(test_image_bytes)['model_version'] == "v2+v1"
+
+    def test_reload_models_keeps_old_version_on_error(self, tmp_path, mock_yolo_detector, mock_yolo_classifier):
+        for kind in ("detector", "classifier"):
+            (tmp_path / kind).mkdir()
+            (tmp_path / kind / "v1.pt").touch()
+        with patch('lct_dendrology.backend.image_processor.settings', settings.model_copy()) as mock_settings, \
+             patch('lct_dendrology.backend.image_processor.YoloDetector', return_value=mock_yolo_detector), \
+             patch('lct_dendrology.backend.image_processor.YoloClassifier', return_value=mock_yolo_classifier):
+            mock_settings.model_enable_inference = True
+            mock_settings.model_registry_dir = str(tmp_path)
+            processor = ImageProcessor()
+            with pytest.raises(FileNotFoundError):
+                processor.reload_models(detector_version="v9")
+            assert processor.model_version == "v1+v1"
+            assert processor.last_reload_error is not None
+
+    @pytest.mark.parametrize("fast_conf, heavy_calls, expected_species", [
+        (0.95, 0, 'pine'),
+        (0.55, 1, 'oak'),
+    ])
+    def test_classifier_cascade(self, test_image_bytes, mock_yolo_detector, mock_yolo_classifier,
+                                fast_conf, heavy_calls, expected_species):
+        fast_classifier = Mock()
+        fast_classifier.predict.return_value = {'class_id': 2, 'class_name': 'pine', 'confidence': fast_conf}
+        with patch('lct_dendrology.backend.image_processor.settings', settings.model_copy()) as mock_settings, \
+             patch('lct_dendrology.backend.image_processor.YoloDetector', return_value=mock_yolo_detector), \
+             patch('lct_dendrology.backend.image_processor.YoloClassifier',
+                   side_effect=[mock_yolo_classifier, fast_classifier]):
+            mock_settings.model_enable_inference = True
+            mock_settings.model_registry_dir = None
+            mock_settings.classifier_confidence_threshold = 0.5
+            mock_settings.classifier_cascade_enabled = True
+            mock_settings.classifier_fast_model_path = "models/species_classifier_fast.pt"
+            mock_settings.classifier_cascade_margin = 0.8
+            processor = ImageProcessor()
+            result = processor.process_image(test_image_bytes)
+            assert result['detections'][0]['species'] == expected_species
+            assert mock_yolo_classifier.predict.call_count == heavy_calls
+            routing = result['model_info']['classifier']['routing']
+            assert routing == {'total': 1, 'cached': 0, 'fast': 1, 'heavy': heavy_calls, 'skipped': 0}
+            assert processor.get_routing_stats()['ratios']['heavy'] == heavy_calls
+
+    def test_small_crops_skip_classification(self, test_image_bytes, mock_yolo_detector, mock_yolo_classifier):
+        with patch('lct_dendrology.backend.image_processor.settings', settings.model_copy()) as mock_settings, \
+             patch('lct_dendrology.backend.image_processor.YoloDetector', return_value=mock_yolo_detector), \
+             patch('lct_dendrology.backend.image_processor.YoloClassifier', return_value=mock_yolo_classifier):
+            mock_settings.model_enable_inference = True
+            mock_settings.model_registry_dir = None
+            mock_settings.classifier_min_crop_size = 64
+            processor = ImageProcessor()
+            result = processor.process_image(test_image_bytes)
+            det = result['detections'][0]
+            assert det['species'] is None
+            assert det['species_confidence'] is None
+            mock_yolo_classifier.predict.assert_not_called()
+            assert result['model_info']['classifier']['routing']['skipped'] == 1
+
+    def test_gate_skips_detector(self, test_image_bytes, mock_yolo_detector, mock_yolo_classifier):
+        gate = Mock()
+        gate.check.return_value = {'vegetation_score': 0.0, 'skip': True}
+        with patch('lct_dendrology.backend.image_processor.settings', settings.model_copy()) as mock_settings, \
+             patch('lct_dendrology.backend.image_processor.YoloDetector', return_value=mock_yolo_detector), \
+             patch('lct_dendrology.backend.image_processor.YoloClassifier', return_value=mock_yolo_classifier), \
+             patch('lct_dendrology.backend.image_processor.VegetationGate', return_value=gate):
+            mock_settings.model_enable_inference = True
+            mock_settings.model_registry_dir = None
+            mock_settings.gate_enabled = True
+            mock_settings.gate_audit_rate = 0.0
+            processor = ImageProcessor()
+            result = processor.process_image(test_image_bytes)
+            assert result['detections'] == []
+            assert result['model_info']['status'] == 'skipped'
+            mock_yolo_detector.predict.assert_not_called()
+            assert processor.get_gate_stats()['skip_rate'] == 1.0
+
+    def test_gate_audit_counts_false_skips(self, test_image_bytes, mock_yolo_detector, mock_yolo_classifier):
+        gate = Mock()
+        gate.check.return_value = {'vegetation_score': 0.0, 'skip': True}
+        with patch('lct_dendrology.backend.image_processor.settings', settings.model_copy()) as mock_settings, \
+             patch('lct_dendrology.backend.image_processor.YoloDetector', return_value=mock_yolo_detector), \
+             patch('lct_dendrology.backend.image_processor.YoloClassifier', return_value=mock_yolo_classifier), \
+             patch('lct_dendrology.backend.image_processor.VegetationGate', return_value=gate):
+            mock_settings.model_enable_inference = True
+            mock_settings.model_registry_dir = None
+            mock_settings.gate_enabled = True
+            mock_settings.gate_audit_rate = 1.0
+            processor = ImageProcessor()
+            result = processor.process_image(test_image_bytes)
+            assert len(result['detections']) == 1
+            stats = processor.get_gate_stats()
+            assert stats['audited'] == 1
+            assert stats['false_skips'] == 1
+
+    def test_crop_cache_skips_repeated_classification(self, test_image_bytes, mock_yolo_detector, mock_yolo_classifier):
+        with patch('lct_dendrology.backend.image_processor.settings', settings.model_copy()) as mock_settings, \
+             patch('lct_dendrology.backend.image_processor.YoloDetector', return_value=mock_yolo_detector), \
+             patch('lct_dendrology.backend.image_processor.YoloClassifier', return_value=mock_yolo_classifier):
+            mock_settings.model_enable_inference = True
+            mock_settings.model_registry_dir = None
+            mock_settings.crop_cache_enabled = True
+            processor = ImageProcessor()
+            processor.process_image(test_image_bytes)
+            result = processor.process_image(test_image_bytes)
+            assert mock_yolo_classifier.predict.call_count == 1
+            assert result['detections'][0]['species'] == 'oak'
+            assert result['model_info']['classifier']['routing']['cached'] == 1
+
+    def test_near_duplicate_reuses_analysis(self, test_image_bytes, mock_yolo_detector, mock_yolo_classifier):
+        with patch('lct_dendrology.backend.image_processor.settings', settings.model_copy()) as mock_settings, \
+             patch('lct_dendrology.backend.image_processor.YoloDetector', return_value=mock_yolo_detector), \
+             patch('lct_dendrology.backend.image_processor.YoloClassifier', return_value=mock_yolo_classifier):
+            mock_settings.model_enable_inference = True
+            mock_settings.model_registry_dir = None
+            mock_settings.duplicate_index_enabled = True
+            processor = ImageProcessor()
+            first = processor.process_image(test_image_bytes)
+            second = processor.process_image(test_image_bytes)
+            assert mock_yolo_detector.predict.call_count == 1
+            assert second['detections'][0]['species'] == first['detections'][0]['species']
+            assert 'near_duplicate' in second['model_info']
+
+    @pytest.mark.parametrize("tier, imgsz, species", [
+        (0, None, 'oak'),
+        (1, 320, 'oak'),
+        (3, 320, None),
+    ])
+    def test_quality_tiers(self, test_image_bytes, mock_yolo_detector, mock_yolo_classifier, tier, imgsz, species):
+        with patch('lct_dendrology.backend.image_processor.settings', settings.model_copy()) as mock_settings, \
+             patch('lct_dendrology.backend.image_processor.YoloDetector', return_value=mock_yolo_detector), \
+             patch('lct_dendrology.backend.image_processor.YoloClassifier', return_value=mock_yolo_classifier):
+            mock_settings.model_enable_inference = True
+            mock_settings.model_registry_dir = None
+            mock_settings.degraded_detector_imgsz = 320
+            processor = ImageProcessor()
+            result = processor.process_image(test_image_bytes, quality_tier=tier)
+            assert mock_yolo_detector.predict.call_args.kwargs['imgsz'] == imgsz
+            assert result['detections'][0]['species'] == species
+            assert result['model_info']['quality_tier'] == tier
+
+    def test_get_input_size(self, mock_yolo_detector, mock_yolo_classifier):
+        mock_yolo_detector.get_model_info.return_value = {'imgsz': 640}
+        with patch('lct_dendrology.backend.image_processor.settings', settings.model_copy()) as mock_settings, \
+             patch('lct_dendrology.backend.image_processor.YoloDetector', return_value=mock_yolo_detector), \
+             patch('lct_dendrology.backend.image_processor.YoloClassifier', return_value=mock_yolo_classifier):
+            mock_settings.model_enable_inference = True
+            mock_settings.model_registry_dir = None
+            mock_settings.degraded_detector_imgsz = 320
+            processor = ImageProcessor()
+            assert processor.get_input_size(0) == 640
+            assert processor.get_input_size(1) == 320
+            mock_settings.tree_detector_imgsz = 512
+            assert processor.get_input_size(0) == 512
+
+    def test_deadline_stops_classification(self, test_image_bytes, mock_yolo_detector, mock_yolo_classifier):
+        deadline = RequestDeadline()
+        detection_result = mock_yolo_detector.predict.return_value
+
+        def predict_and_disconnect(*args, **kwargs):
+            # Клиент отключается, пока работает детектор
+            deadline.cancel()
+            return detection_result
+
+        mock_yolo_detector.predict.side_effect = predict_and_disconnect
+        with patch('lct_dendrology.backend.image_processor.settings', settings.model_copy()) as mock_settings, \
+             patch('lct_dendrology.backend.image_processor.YoloDetector', return_value=mock_yolo_detector), \
+             patch('lct_dendrology.backend.image_processor.YoloClassifier', return_value=mock_yolo_classifier):
+            mock_settings.model_enable_inference = True
+            mock_settings.model_registry_dir = None
+            processor = ImageProcessor()
+            with pytest.raises(DeadlineExceeded) as exc_info:
+                processor.process_image(test_image_bytes, deadline=deadline)
+            assert exc_info.value.stage == "classification"
+            mock_yolo_classifier.predict.assert_not_called()
@@ -0,0 +1,50 @@
+"""Юнит-тесты для совместной модели детекции и определения породы."""
+
+from unittest.mock import Mock, patch
+
+import numpy as np
+from PIL import Image
+
+from lct_dendrology.inference import JointDetector
+from lct_dendrology.inference.joint_detector import species_from_classes
+
+
+def make_model(class_ids, confidences):
+    model = Mock()
+    result = Mock()
+    boxes = np.array([[10, 10, 50, 50]] * len(class_ids), dtype=float)
+    result.boxes.xyxy.cpu.return_value.numpy.return_value = boxes
+    result.boxes.conf.cpu.return_value.numpy.return_value = np.array(confidences)
+    result.boxes.cls.cpu.return_value.numpy.return_value = np.array(class_ids)
+    result.names = {0: 'tree', 1: 'oak', 2: 'birch'}
+    model.return_value = [result]
+    model.names = result.names
+    return model
+
+
+def test_species_from_classes():
+    detections = species_from_classes([
+        {'class_name': 'oak', 'confidence': 0.7},
+        {'class_name': 'tree', 'confidence': 0.4},
+    ])
+    assert detections[0] == {'class_name': 'tree', 'confidence': 0.7, 'species': 'oak', 'species_confidence': 0.7}
+    assert detections[1]['species'] is None
+
+
+def test_predict_returns_species_in_one_pass():
+    model = make_model([1, 2], [0.9, 0.6])
+    with patch('lct_dendrology.inference.yolo_detector.YOLO', return_value=model):
+        detector = JointDetector(model_path="joint.pt")
+        result = detector.predict(Image.new('RGB', (100, 100)))
+    assert model.call_count == 1
+    # Породы конкурируют за один объект, поэтому NMS без учета классов
+    assert model.call_args.kwargs['agnostic_nms'] is True
+    assert [det['species'] for det in result['detections']] == ['oak', 'birch']
+    assert all(det['class_name'] == 'tree' for det in result['detections'])
+    assert result['model_info']['joint'] is True
+
+
+def test_model_info_lists_species():
+    with patch('lct_dendrology.inference.yolo_detector.YOLO', return_value=make_model([], [])):
+        info = JointDetector(model_path="joint.pt").get_model_info()
+    assert info['species'] == ['oak', 'birch']
@@ -0,0 +1,52 @@
+"""Юнит-тесты для адаптивного контроллера качества."""
+
+from lct_dendrology.backend.load_controller import LoadController
+
+
+class TestLoadController:
+    def make_controller(self, **kwargs):
+        params = dict(workers=1, queue_high=2, queue_low=0, latency_high=5.0, latency_low=1.0, cooldown=0.0)
+        params.update(kwargs)
+        return LoadController(**params)
+
+    def test_steps_down_on_queue_growth(self):
+        controller = self.make_controller()
+        for _ in range(3):
+            controller.enter()
+        assert controller.queue_depth == 2
+        assert controller.current_tier() >= 1
+
+    def test_steps_down_on_latency_and_recovers(self):
+        controller = self.make_controller()
+        controller.enter()
+        controller.exit(latency=20.0)
+        assert controller.current_tier() >= 1
+        tier = controller.current_tier()
+        for _ in range(50):
+            controller.enter()
+            controller.exit(latency=0.1)
+        assert controller.current_tier() < tier
+        assert controller.current_tier() == 0
+
+    def test_tier_is_bounded(self):
+        controller = self.make_controller()
+        for _ in range(20):
+            controller.enter()
+        for _ in range(10):
+            controller.current_tier()
+        assert controller.current_tier() == 3
+
+    def test_cooldown_limits_changes(self):
+        controller = self.make_controller(cooldown=60.0)
+        for _ in range(20):
+            controller.enter()
+        controller.current_tier()
+        controller.current_tier()
+        assert controller.current_tier() <= 1
+
+    def test_disabled(self):
+        controller = self.make_controller(enabled=False)
+        for _ in range(20):
+            controller.enter()
+        assert controller.current_tier() == 0
+        assert controller.get_state()['queue_depth'] == 19
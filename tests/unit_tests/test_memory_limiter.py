@@ -0,0 +1,81 @@
+"""Юнит-тесты для ограничения обработки по бюджету памяти."""
+
+import asyncio
+
+import pytest
+
+from lct_dendrology.backend.memory_limiter import MB, MemoryBudgetLimiter
+from .test_utils import create_test_image
+
+
+class TestMemoryBudgetLimiter:
+    def test_cost_scales_with_pixels(self):
+        limiter = MemoryBudgetLimiter(budget_mb=1024)
+        small, _ = create_test_image(100, 100)
+        large, _ = create_test_image(1000, 1000)
+        assert limiter.estimate_cost(large) > 50 * limiter.estimate_cost(small)
+
+    def test_cost_includes_expected_crops(self):
+        limiter = MemoryBudgetLimiter(budget_mb=1024, crop_mb=1.0, ewma_alpha=1.0)
+        image, _ = create_test_image(100, 100)
+        base = limiter.estimate_cost(image)
+        limiter.record_detections(10)
+        assert limiter.estimate_cost(image) == base + 10 * MB
+
+    def test_cost_is_clamped_to_budget(self):
+        limiter = MemoryBudgetLimiter(budget_mb=1)
+        image, _ = create_test_image(1000, 1000)
+        assert limiter.estimate_cost(image) == limiter.budget
+
+    def test_invalid_image_has_minimal_cost(self):
+        limiter = MemoryBudgetLimiter(budget_mb=1)
+        assert limiter.estimate_cost(b"garbage") == len(b"garbage")
+
+    @pytest.mark.asyncio
+    async def test_waits_until_budget_is_free(self):
+        limiter = MemoryBudgetLimiter(budget_mb=1)
+        await limiter.acquire(MB // 2 + 1)
+        waiter = asyncio.create_task(limiter.acquire(MB // 2))
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        assert limiter.get_stats()['waiting'] == 1
+        limiter.release(MB // 2 + 1)
+        await waiter
+        stats = limiter.get_stats()
+        assert stats['in_use_mb'] == 0.5
+        assert stats['waited'] == 1
+
+    @pytest.mark.asyncio
+    async def test_fifo_order(self):
+        limiter = MemoryBudgetLimiter(budget_mb=1)
+        await limiter.acquire(MB)
+        big = asyncio.create_task(limiter.acquire(MB))
+        await asyncio.sleep(0)
+        small = asyncio.create_task(limiter.acquire(1))
+        await asyncio.sleep(0)
+        limiter.release(MB)
+        await big
+        await asyncio.sleep(0)
+        assert not small.done()
+        limiter.release(MB)
+        await small
+
+    @pytest.mark.asyncio
+    async def test_fitting_requests_bypass_blocked_head_a_bounded_number_of_times(self):
+        limiter = MemoryBudgetLimiter(budget_mb=1, max_bypass=2)
+        await limiter.acquire(MB // 2)
+        big = asyncio.create_task(limiter.acquire(MB))
+        await asyncio.sleep(0)
+        # Маленькие запросы помещаются в остаток бюджета и не ждут большого
+        await asyncio.wait_for(limiter.acquire(1), 1)
+        await asyncio.wait_for(limiter.acquire(1), 1)
+        third = asyncio.create_task(limiter.acquire(1))
+        await asyncio.sleep(0)
+        assert not third.done()
+        limiter.release(MB // 2)
+        limiter.release(1)
+        limiter.release(1)
+        await big
+        assert limiter.get_stats()['bypassed'] == 2
+        limiter.release(MB)
+        await third
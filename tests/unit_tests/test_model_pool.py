@@ -0,0 +1,67 @@
+"""Юнит-тесты для пула реплик моделей."""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock
+
+import pytest
+
+from lct_dendrology.inference import ModelPool
+
+
+class SlowModel:
+    """Модель, которая фиксирует одновременные вызовы одного экземпляра."""
+
+    def __init__(self):
+        self.model_path = "slow.pt"
+        self.active = 0
+        self.overlaps = 0
+        self._lock = threading.Lock()
+
+    def predict(self, value):
+        with self._lock:
+            self.active += 1
+            if self.active > 1:
+                self.overlaps += 1
+        time.sleep(0.05)
+        with self._lock:
+            self.active -= 1
+        return value
+
+
+class TestModelPool:
+    def test_creates_replicas(self):
+        factory = Mock(side_effect=lambda: Mock(model_path="m.pt"))
+        pool = ModelPool(factory, size=3)
+        assert factory.call_count == 3
+        assert pool.available == 3
+        assert pool.model_path == "m.pt"
+
+    def test_replica_is_not_shared_between_threads(self):
+        pool = ModelPool(SlowModel, size=2)
+        started = time.monotonic()
+        with ThreadPoolExecutor(4) as executor:
+            results = list(executor.map(pool.predict, range(8)))
+        elapsed = time.monotonic() - started
+        assert results == list(range(8))
+        assert all(replica.overlaps == 0 for replica in pool.replicas)
+        # Две реплики работают параллельно: 8 вызовов по 0.05 с занимают ~0.2 с
+        assert elapsed < 0.35
+        stats = pool.get_stats()
+        assert stats['checkouts'] == 8
+        assert stats['available'] == 2
+
+    def test_checkout_timeout(self):
+        pool = ModelPool(Mock, size=1)
+        with pool.checkout():
+            with pytest.raises(TimeoutError):
+                with pool.checkout(timeout=0.01):
+                    pass
+        assert pool.available == 1
+
+    def test_model_info_reports_replicas(self):
+        replica = Mock()
+        replica.get_model_info.return_value = {'model_path': 'm.pt'}
+        pool = ModelPool(lambda: replica, size=2)
+        assert pool.get_model_info() == {'model_path': 'm.pt', 'replicas': 2}
@@ -0,0 +1,41 @@
+"""Юнит-тесты для реестра моделей."""
+
+import pytest
+
+from lct_dendrology.backend.model_registry import ModelRegistry, version_from_path
+
+
+class TestModelRegistry:
+    @pytest.fixture
+    def registry(self, tmp_path):
+        detector_dir = tmp_path / "detector"
+        detector_dir.mkdir()
+        for name in ("v2.pt", "v10.pt", "v9.onnx", "notes.txt"):
+            (detector_dir / name).touch()
+        return ModelRegistry(str(tmp_path))
+
+    def test_list_versions_natural_order(self, registry):
+        assert registry.list_versions("detector") == ["v2", "v9", "v10"]
+        assert registry.list_versions("classifier") == []
+
+    def test_resolve_latest(self, registry, tmp_path):
+        version, path = registry.resolve("detector")
+        assert version == "v10"
+        assert path == str(tmp_path / "detector" / "v10.pt")
+
+    def test_resolve_specific_version(self, registry, tmp_path):
+        version, path = registry.resolve("detector", "v9")
+        assert path == str(tmp_path / "detector" / "v9.onnx")
+
+    def test_resolve_missing(self, registry):
+        with pytest.raises(FileNotFoundError):
+            registry.resolve("detector", "v3")
+        with pytest.raises(FileNotFoundError):
+            registry.resolve("classifier")
+
+    def test_unknown_kind(self, registry):
+        with pytest.raises(ValueError):
+            registry.list_versions("segmenter")
+
+    def test_version_from_path(self):
+        assert version_from_path("models/tree_detector_v2.pt") == "tree_detector_v2"
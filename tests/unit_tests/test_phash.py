@@ -0,0 +1,82 @@
+"""Юнит-тесты для перцептивных хэшей и кэша кропов."""
+
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from lct_dendrology.inference.crop_cache import CropCache
+from lct_dendrology.inference.phash import HammingLRU, dhash, hamming_distance, phash
+
+
+@pytest.fixture
+def textured_image():
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 255, (16, 16, 3), dtype=np.uint8)
+    return Image.fromarray(pixels).resize((256, 256), Image.BILINEAR)
+
+
+def recompress(image, quality=40, size=None):
+    if size is not None:
+        image = image.resize(size, Image.BILINEAR)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return Image.open(io.BytesIO(buffer.getvalue()))
+
+
+class TestHashes:
+    @pytest.mark.parametrize("hash_func", [phash, dhash])
+    def test_robust_to_recompression_and_scale(self, hash_func, textured_image):
+        original = hash_func(textured_image)
+        distorted = hash_func(recompress(textured_image, size=(180, 180)))
+        assert hamming_distance(original, distorted) <= 6
+
+    def test_different_images_are_far(self, textured_image):
+        other = textured_image.rotate(90)
+        assert hamming_distance(phash(textured_image), phash(other)) > 10
+
+    def test_hash_fits_64_bits(self, textured_image):
+        assert phash(textured_image) < 2 ** 64
+        assert dhash(textured_image) < 2 ** 64
+
+
+class TestHammingLRU:
+    def test_near_neighbour_lookup(self):
+        index = HammingLRU(max_size=10, max_distance=3)
+        index.put(0b1010, "a")
+        assert index.get(0b1010) == (0, "a")
+        assert index.get(0b1010 ^ (1 << 40) ^ (1 << 3)) == (2, "a")
+        assert index.get(0b1010 ^ 0b1111 << 20) is None
+
+    def test_returns_closest(self):
+        index = HammingLRU(max_size=10, max_distance=4)
+        index.put(0, "zero")
+        index.put(0b111, "seven")
+        assert index.get(0b110)[1] == "seven"
+
+    def test_lru_eviction(self):
+        index = HammingLRU(max_size=2, max_distance=0)
+        index.put(1, "a")
+        index.put(2, "b")
+        index.get(1)
+        index.put(4, "c")
+        assert len(index) == 2
+        assert index.get(2) is None
+        assert index.get(1) == (0, "a")
+
+    def test_invalid_distance(self):
+        with pytest.raises(ValueError):
+            HammingLRU(max_size=1, max_distance=64)
+
+
+class TestCropCache:
+    def test_version_mismatch_is_miss(self, textured_image):
+        cache = CropCache(max_size=10, max_distance=4)
+        key = cache.hash_crop(textured_image)
+        cache.put(key, "v1", {'class_name': 'oak', 'confidence': 0.9})
+        assert cache.get(cache.hash_crop(recompress(textured_image)), "v1")['class_name'] == 'oak'
+        assert cache.get(key, "v2") is None
+        stats = cache.get_stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
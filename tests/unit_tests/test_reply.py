@@ -0,0 +1,93 @@
+"""Юнит-тесты для отправки ответа на фото."""
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from lct_dendrology.bot.reply import CAPTION_MAX_LENGTH, PHOTO_CAPTION, REPORT_CAPTION, send_reply
+
+
+def make_messages():
+    message = MagicMock(reply_photo=AsyncMock(), reply_document=AsyncMock())
+    processing_msg = MagicMock(edit_text=AsyncMock(), delete=AsyncMock())
+    return message, processing_msg
+
+
+async def make_report():
+    return b"report", "analysis.csv"
+
+
+@pytest.mark.asyncio
+async def test_long_text_replaces_processing_message():
+    message, processing_msg = make_messages()
+    text = "x" * (CAPTION_MAX_LENGTH + 1)
+
+    photo_message, document_message = await send_reply(
+        message, processing_msg, text, photo=b"image", report=asyncio.ensure_future(make_report())
+    )
+
+    assert message.reply_photo.call_args.kwargs["caption"] == PHOTO_CAPTION
+    processing_msg.edit_text.assert_awaited_once_with(text)
+    processing_msg.delete.assert_not_awaited()
+    assert message.reply_document.call_args.kwargs == {
+        "document": b"report", "filename": "analysis.csv", "caption": REPORT_CAPTION
+    }
+    assert photo_message is message.reply_photo.return_value
+    assert document_message is message.reply_document.return_value
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("text, fits", [
+    ("🌳" * (CAPTION_MAX_LENGTH // 2), True),
+    ("🌳" * (CAPTION_MAX_LENGTH // 2) + "x", False),
+    ("x" * (CAPTION_MAX_LENGTH - 1) + "🌳", False),
+    ("x" * CAPTION_MAX_LENGTH, True),
+])
+async def test_caption_limit_counts_utf16_units(text, fits):
+    message, processing_msg = make_messages()
+
+    await send_reply(message, processing_msg, text, photo=b"image")
+
+    # Эмодзи занимает в подписи две единицы, хотя len() считает его одним символом
+    assert message.reply_photo.call_args.kwargs["caption"] == (text if fits else PHOTO_CAPTION)
+    assert processing_msg.edit_text.await_count == (0 if fits else 1)
+
+
+@pytest.mark.asyncio
+async def test_report_failure_does_not_fail_reply():
+    message, processing_msg = make_messages()
+    message.reply_document.side_effect = RuntimeError("upload failed")
+
+    photo_message, document_message = await send_reply(
+        message, processing_msg, "result", photo=b"image", report=asyncio.ensure_future(make_report())
+    )
+
+    assert message.reply_photo.call_args.kwargs["caption"] == "result"
+    processing_msg.delete.assert_awaited_once()
+    assert document_message is None
+
+
+@pytest.mark.asyncio
+async def test_photo_failure_cancels_report():
+    message, processing_msg = make_messages()
+    message.reply_photo.side_effect = RuntimeError("upload failed")
+    report = asyncio.ensure_future(asyncio.sleep(1, result=(b"report", "analysis.csv")))
+
+    with pytest.raises(RuntimeError):
+        await send_reply(message, processing_msg, "result", photo=b"image", report=report)
+
+    await asyncio.sleep(0)
+    assert report.cancelled()
+    # Сообщение о ходе обработки остается для текста ошибки
+    processing_msg.delete.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_already_sent_photo_only_updates_text():
+    message, processing_msg = make_messages()
+
+    await send_reply(message, processing_msg, "result")
+
+    message.reply_photo.assert_not_awaited()
+    processing_msg.edit_text.assert_awaited_once_with("result")
@@ -0,0 +1,72 @@
+"""Юнит-тесты для файла с результатами анализа."""
+
+import csv
+import io
+import zipfile
+
+import pytest
+
+from lct_dendrology.bot.report import EMPTY_REPORT_COLUMN, build_report, flatten_detection
+
+ANALYSIS = {
+    "detections": [
+        {
+            "id": 1, "class_name": "tree", "confidence": 0.9, "species": "oak",
+            "bbox": {"x1": 1.0, "y1": 2.0, "x2": 3.0, "y2": 4.0}, "center": {"x": 2.0, "y": 3.0},
+        },
+        {"id": 2, "class_name": "tree", "confidence": 0.5, "species": None},
+    ]
+}
+
+
+def test_flatten_detection():
+    row = flatten_detection(ANALYSIS["detections"][0])
+    assert row["bbox_x1"] == 1.0 and row["center_y"] == 3.0
+    assert "bbox" not in row
+
+
+def test_build_report_xlsx():
+    output, filename = build_report(ANALYSIS, "xlsx")
+    assert filename == "analysis.xlsx"
+    with zipfile.ZipFile(output) as archive:
+        sheet = archive.read("xl/worksheets/sheet1.xml").decode("utf-8")
+    # В режиме constant_memory строки записываются прямо в лист (inlineStr)
+    assert sheet.index(">bbox_x1<") < sheet.index(">oak<")
+    assert sheet.count("<row ") == 3
+
+
+def test_build_report_csv():
+    output, filename = build_report(ANALYSIS, "csv")
+    assert filename == "analysis.csv"
+    rows = list(csv.DictReader(io.StringIO(output.getvalue().decode("utf-8-sig"))))
+    assert rows[0]["species"] == "oak" and rows[0]["center_x"] == "2.0"
+
+
+def test_build_report_parquet_round_trip():
+    pq = pytest.importorskip("pyarrow.parquet")
+    output, filename = build_report(ANALYSIS, "parquet")
+    assert filename == "analysis.parquet"
+    table = pq.read_table(output)
+    assert table.column_names[:4] == ["id", "class_name", "confidence", "species"]
+    rows = table.to_pylist()
+    assert rows[0]["species"] == "oak" and rows[0]["bbox_x1"] == 1.0
+    # Столбцы, которых нет у детекции, заполняются пустыми значениями
+    assert rows[1]["species"] is None and rows[1]["bbox_x1"] is None
+
+
+def test_report_format_is_validated_by_settings(monkeypatch):
+    from pydantic import ValidationError
+
+    from lct_dendrology.cfg.settings import Settings
+
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "token")
+    assert Settings(bot_report_format="parquet").bot_report_format == "parquet"
+    with pytest.raises(ValidationError):
+        Settings(bot_report_format="pdf")
+
+
+def test_build_report_empty_and_invalid_format():
+    output, _ = build_report({"detections": []}, "csv")
+    assert output.getvalue().decode("utf-8-sig").splitlines()[0] == EMPTY_REPORT_COLUMN
+    with pytest.raises(ValueError):
+        build_report(ANALYSIS, "pdf")
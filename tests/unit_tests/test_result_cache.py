@@ -0,0 +1,27 @@
+"""Юнит-тесты для кэша ответов бота."""
+
+from unittest.mock import patch
+
+from lct_dendrology.bot.result_cache import ResultCache
+
+
+def test_result_cache_lru_and_versions():
+    cache = ResultCache(max_size=2)
+    cache.put(ResultCache.make_key("a", "v1"), {"photo_file_id": "pa"})
+    cache.put(ResultCache.make_key("b", "v1"), {"photo_file_id": "pb"})
+    assert cache.get(ResultCache.make_key("a", "v1"))["photo_file_id"] == "pa"
+    # Другая версия моделей - другой ключ
+    assert cache.get(ResultCache.make_key("a", "v2")) is None
+    cache.put(ResultCache.make_key("c", "v1"), {"photo_file_id": "pc"})
+    assert cache.get(ResultCache.make_key("b", "v1")) is None
+    assert cache.get_stats()["size"] == 2
+
+
+def test_result_cache_ttl():
+    cache = ResultCache(ttl=10.0)
+    with patch("lct_dendrology.bot.result_cache.time.monotonic", return_value=100.0):
+        cache.put("key", {"photo_file_id": "p"})
+        assert cache.get("key") is not None
+    with patch("lct_dendrology.bot.result_cache.time.monotonic", return_value=111.0):
+        assert cache.get("key") is None
+    assert cache.get_stats() == {"size": 0, "hits": 1, "misses": 1, "hit_rate": 0.5}
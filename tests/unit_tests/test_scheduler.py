@@ -0,0 +1,111 @@
+"""Юнит-тесты для квот и справедливого планировщика."""
+
+import asyncio
+
+import pytest
+
+from lct_dendrology.backend.scheduler import ClientRateLimiter, FairScheduler, TokenBucket
+
+
+async def run_queue(scheduler, requests):
+    """Ставит запросы в очередь при занятом слоте и возвращает порядок их обслуживания."""
+    order = []
+
+    async def worker(name, client_id, lane):
+        async with scheduler.slot(client_id, lane):
+            order.append(name)
+            await asyncio.sleep(0)
+
+    await scheduler.acquire("blocker")
+    tasks = []
+    for name, client_id, lane in requests:
+        tasks.append(asyncio.create_task(worker(name, client_id, lane)))
+        await asyncio.sleep(0)
+    scheduler.release()
+    await asyncio.gather(*tasks)
+    return order
+
+
+class TestTokenBucket:
+    def test_burst_then_reject(self):
+        bucket = TokenBucket(rate=0.0001, burst=2)
+        assert bucket.try_acquire()[0]
+        assert bucket.try_acquire()[0]
+        allowed, retry_after = bucket.try_acquire()
+        assert not allowed
+        assert retry_after > 0
+
+    def test_limiter_is_per_client(self):
+        limiter = ClientRateLimiter(rate_per_minute=0.01, burst=1)
+        assert limiter.try_acquire("a")[0]
+        assert not limiter.try_acquire("a")[0]
+        assert limiter.try_acquire("b")[0]
+        assert limiter.get_stats()['rejected'] == 1
+
+    def test_limiter_disabled(self):
+        limiter = ClientRateLimiter(rate_per_minute=0.01, burst=1, enabled=False)
+        assert all(limiter.try_acquire("a")[0] for _ in range(5))
+
+
+class TestFairScheduler:
+    @pytest.mark.asyncio
+    async def test_heavy_client_does_not_starve_others(self):
+        scheduler = FairScheduler(capacity=1)
+        requests = [(f"a{i}", "a", "interactive") for i in range(5)] + [("b0", "b", "interactive")]
+        order = await run_queue(scheduler, requests)
+        assert order.index("b0") <= 1
+
+    @pytest.mark.asyncio
+    async def test_interactive_preempts_bulk(self):
+        scheduler = FairScheduler(capacity=1)
+        requests = [("bulk0", "x", "bulk"), ("bulk1", "y", "bulk"), ("chat", "z", "interactive")]
+        order = await run_queue(scheduler, requests)
+        assert order[0] == "chat"
+
+    @pytest.mark.asyncio
+    async def test_weights(self):
+        scheduler = FairScheduler(capacity=1, weights={"a": 2.0})
+        requests = [(f"a{i}", "a", "bulk") for i in range(4)] + [(f"b{i}", "b", "bulk") for i in range(4)]
+        order = await run_queue(scheduler, requests)
+        assert [name[0] for name in order[:3]].count("a") == 2
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_is_skipped(self):
+        scheduler = FairScheduler(capacity=1)
+        await scheduler.acquire("blocker")
+        task = asyncio.create_task(scheduler.acquire("a"))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        scheduler.release()
+        assert scheduler.running == 0
+        assert scheduler.queued == 0
+
+    @pytest.mark.asyncio
+    async def test_fast_path_does_not_grow_client_tags(self):
+        scheduler = FairScheduler(capacity=1, max_clients=100)
+        # Без очереди каждый запрос идет по быстрому пути, клиенты каждый раз новые (как IP)
+        for i in range(1000):
+            async with scheduler.slot(f"client-{i}"):
+                pass
+        assert scheduler.get_stats()['dispatched']['interactive'] == 1000
+        assert scheduler.get_stats()['clients']['interactive'] <= 100
+
+    @pytest.mark.asyncio
+    async def test_pruning_keeps_heavy_client_behind(self):
+        scheduler = FairScheduler(capacity=1, max_clients=4)
+        for _ in range(10):
+            async with scheduler.slot("a", cost=5.0):
+                pass
+        for i in range(10):
+            async with scheduler.slot(f"new-{i}"):
+                pass
+        # Тег клиента с наибольшим отставанием забывается последним
+        requests = [("a0", "a", "interactive"), ("b0", "b", "interactive")]
+        assert await run_queue(scheduler, requests) == ["b0", "a0"]
+
+    def test_normalize_lane(self):
+        assert FairScheduler.normalize_lane(None) == "interactive"
+        assert FairScheduler.normalize_lane("BULK") == "bulk"
+        assert FairScheduler.normalize_lane("vip", default="bulk") == "bulk"
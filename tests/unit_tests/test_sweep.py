@@ -0,0 +1,57 @@
+"""Юнит-тесты для перебора конфигураций инференса."""
+
+import argparse
+import json
+from unittest.mock import Mock, patch
+
+from lct_dendrology.training.sweep import expand_grid, mark_pareto, run_isolated, to_env
+
+
+def test_expand_grid_cartesian_product_with_defaults():
+    configs = expand_grid({'detector': ['a.pt', 'b.pt'], 'imgsz': [320, 640], 'backend': 'onnx'})
+    assert len(configs) == 4
+    assert {(c['detector'], c['imgsz']) for c in configs} == {
+        ('a.pt', 320), ('a.pt', 640), ('b.pt', 320), ('b.pt', 640)
+    }
+    assert all(c['backend'] == 'onnx' and c['int8'] is False and c['classifier'] is None for c in configs)
+
+
+def test_expand_grid_accepts_explicit_list():
+    configs = expand_grid([{'detector': 'a.pt'}, {'detector': 'b.pt', 'backend': 'openvino', 'int8': True}])
+    assert configs[0]['imgsz'] == 640 and configs[0]['backend'] == 'pt'
+    assert configs[1]['int8'] is True
+
+
+def test_mark_pareto():
+    rows = [
+        {'p50_ms': 10.0, 'map50': 0.5},
+        {'p50_ms': 20.0, 'map50': 0.7},
+        {'p50_ms': 30.0, 'map50': 0.6},
+    ]
+    mark_pareto(rows, 'p50_ms', 'map50')
+    assert [row['pareto'] for row in rows] == ['*', '*', '']
+
+
+def test_to_env():
+    config = {'detector': 'models/det.pt', 'imgsz': 512, 'classifier': 'models/cls.pt'}
+    assert to_env(config) == (
+        "TREE_DETECTOR_MODEL_PATH=models/det.pt\n"
+        "TREE_DETECTOR_IMGSZ=512\n"
+        "CLASSIFIER_MODEL_PATH=models/cls.pt\n"
+    )
+    assert to_env({**config, 'classifier': None}, "models/det_openvino_model").startswith(
+        "TREE_DETECTOR_MODEL_PATH=models/det_openvino_model\n"
+    )
+
+
+def test_run_isolated_passes_prepared_model_to_child():
+    args = argparse.Namespace(images="img", labels="lbl", device="cpu", crops=None, data=None, limit=5)
+    config = expand_grid([{'detector': 'det.pt', 'backend': 'openvino'}])[0]
+    completed = Mock(returncode=0, stdout='export log\n{"p50_ms": 12.0}\n', stderr='')
+    with patch('lct_dendrology.training.sweep.subprocess.run', return_value=completed) as run:
+        assert run_isolated(config, "det_openvino_model", args) == {'p50_ms': 12.0}
+    command = run.call_args.args[0]
+    # Дочерний процесс получает уже экспортированную модель и не экспортирует ее сам
+    assert command[command.index("--model-path") + 1] == "det_openvino_model"
+    assert json.loads(command[command.index("--measure") + 1]) == config
+    assert command[command.index("--limit") + 1] == "5"
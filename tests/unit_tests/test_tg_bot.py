@@ -2,6 +2,7 @@ import pytest
 from unittest.mock import AsyncMock, patch, MagicMock
 
 from lct_dendrology.bot.bot import handle_photo, format_analysis_result
+from .test_utils import create_test_image
 
 @pytest.mark.asyncio
 async def test_handle_photo_inference_enabled(monkeypatch):
@@ -10,13 +11,14 @@ async def test_handle_photo_inference_enabled(monkeypatch):
     mock_context = MagicMock()
     mock_message = AsyncMock()
     mock_update.effective_message = mock_message
-    mock_message.photo = [MagicMock(), MagicMock()]
+    mock_message.photo = [MagicMock(width=320, height=240), MagicMock(width=1280, height=960)]
+    mock_message.media_group_id = None
     mock_message.reply_text = AsyncMock(return_value=mock_message)
     mock_message.edit_text = AsyncMock()
 
     # Мокаем получение файла
     mock_file = MagicMock()
-    mock_file.download_as_bytearray = AsyncMock(return_value=b"imagebytes")
+    mock_file.download_as_bytearray = AsyncMock(return_value=create_test_image()[0])
     mock_context.bot.get_file = AsyncMock(return_value=mock_file)
 
     # Мокаем серверный ответ с inference_enabled=True
@@ -30,12 +32,16 @@ async def test_handle_photo_inference_enabled(monkeypatch):
     }
     mock_result = {"analysis_result": analysis_result}
     monkeypatch.setattr("lct_dendrology.bot.bot.send_image_to_server", AsyncMock(return_value=mock_result))
+    monkeypatch.setattr("lct_dendrology.bot.bot.get_processor_info", AsyncMock(return_value=None))
 
     await handle_photo(mock_update, mock_context)
 
-    # Проверяем, что edit_text вызван с форматированным результатом
+    # Результат приходит подписью к изображению с разметкой, сообщение о ходе обработки удаляется
     expected_text = format_analysis_result(analysis_result)
-    mock_message.edit_text.assert_called_with(expected_text)
+    assert mock_message.reply_photo.call_args.kwargs["caption"] == expected_text
+    mock_message.delete.assert_awaited_once()
+    mock_message.edit_text.assert_not_awaited()
+    assert mock_message.reply_document.call_args.kwargs["filename"] == "analysis.xlsx"
 
 @pytest.mark.asyncio
 async def test_handle_photo_stub(monkeypatch):
@@ -44,13 +50,16 @@ async def test_handle_photo_stub(monkeypatch):
     mock_context = MagicMock()
     mock_message = MagicMock()
     mock_update.effective_message = mock_message
-    mock_message.photo = [MagicMock(), MagicMock()]
+    mock_message.photo = [MagicMock(width=320, height=240), MagicMock(width=1280, height=960)]
+    mock_message.media_group_id = None
     mock_message.reply_text = AsyncMock(return_value=mock_message)
     mock_message.edit_text = AsyncMock()
+    mock_message.reply_photo = AsyncMock()
+    mock_message.delete = AsyncMock()
 
     # Мокаем получение файла
     mock_file = MagicMock()
-    mock_file.download_as_bytearray = AsyncMock(return_value=b"imagebytes")
+    mock_file.download_as_bytearray = AsyncMock(return_value=create_test_image()[0])
     mock_context.bot.get_file = AsyncMock(return_value=mock_file)
 
     # Мокаем серверный ответ с inference_enabled=False
@@ -60,11 +69,241 @@ async def test_handle_photo_stub(monkeypatch):
         "content_type": "image/jpeg"
     }
     monkeypatch.setattr("lct_dendrology.bot.bot.send_image_to_server", AsyncMock(return_value=mock_result))
+    monkeypatch.setattr("lct_dendrology.bot.bot.get_processor_info", AsyncMock(return_value=None))
 
     await handle_photo(mock_update, mock_context)
 
-    # Проверяем, что edit_text вызван с текстом-заглушкой
-    assert "нейросеть находится в режиме заглушки" in mock_message.edit_text.call_args[0][0]
+    # Проверяем, что изображение отправлено с текстом-заглушкой
+    assert "нейросеть находится в режиме заглушки" in mock_message.reply_photo.call_args.kwargs["caption"]
+
+
+@pytest.mark.asyncio
+async def test_process_image_streaming(monkeypatch):
+    from lct_dendrology.bot.bot import process_image_streaming
+    from .test_utils import create_test_image
+
+    image_bytes, _ = create_test_image()
+    bbox = {"x1": 10, "y1": 10, "x2": 50, "y2": 50}
+
+    async def fake_stream(*args, **kwargs):
+        yield {"event": "detections", "detections": [{"id": 1, "bbox": bbox}, {"id": 2, "bbox": bbox}]}
+        yield {"event": "species", "detections": [{"id": 1, "species": "oak", "species_confidence": 0.9}]}
+        yield {"event": "result", "analysis_result": {"inference_enabled": True, "detections": []}}
+
+    monkeypatch.setattr("lct_dendrology.bot.bot.stream_image_from_server", fake_stream)
+    mock_update = MagicMock()
+    mock_update.effective_message.reply_photo = AsyncMock()
+    processing_msg = MagicMock()
+    processing_msg.edit_text = AsyncMock()
+
+    result, photo_message = await process_image_streaming(mock_update, processing_msg, image_bytes, "photo.jpg")
+
+    assert photo_message is mock_update.effective_message.reply_photo.return_value
+    assert result["event"] == "result"
+    mock_update.effective_message.reply_photo.assert_awaited_once()
+    # Промежуточный список показан сразу после детекции
+    assert "Определено пород: 0 из 2" in processing_msg.edit_text.call_args_list[0][0][0]
+
+
+@pytest.mark.asyncio
+async def test_render_bboxes_downscales_to_telegram_size():
+    from PIL import Image
+    from lct_dendrology.bot.bot import TELEGRAM_PHOTO_MAX_SIDE, load_font, render_bboxes
+    from .test_utils import create_test_image
+
+    image_bytes, _ = create_test_image(width=2560, height=1280)
+    analysis = {"detections": [{"id": 1, "bbox": {"x1": 2000, "y1": 100, "x2": 2400, "y2": 1000}}]}
+
+    output = await render_bboxes(image_bytes, analysis)
+
+    img = Image.open(output)
+    assert img.size == (TELEGRAM_PHOTO_MAX_SIDE, 640)
+    # Рамка перенесена в уменьшенные координаты (x1 = 2000 / 2)
+    assert img.getpixel((1000, 300))[2] > img.getpixel((1100, 300))[2] + 100
+    assert load_font(26) is load_font(26)
+
+
+def test_choose_photo_size():
+    from lct_dendrology.bot.bot import choose_photo_size
+
+    photos = [MagicMock(width=w, height=w * 3 // 4) for w in (90, 320, 800, 1280)]
+    assert choose_photo_size(photos, 640) is photos[2]
+    assert choose_photo_size(photos, 0) is photos[0]
+    assert choose_photo_size(photos, 4000) is photos[-1]
+
+
+@pytest.mark.asyncio
+async def test_backend_input_size_is_cached(monkeypatch):
+    from lct_dendrology.bot import bot
+
+    get_json = AsyncMock(return_value={"input_size": 416})
+    monkeypatch.setattr(bot.backend_client, "get_json", get_json)
+    monkeypatch.setitem(bot._processor_info_cache, "expires", 0.0)
+
+    assert await bot.get_backend_input_size() == 416
+    assert await bot.get_backend_input_size() == 416
+    get_json.assert_awaited_once()
+
+
+
+def make_cached_photo_update(file_unique_id):
+    update = MagicMock()
+    message = update.effective_message
+    message.photo = [MagicMock(file_unique_id="small"), MagicMock(file_unique_id=file_unique_id)]
+    message.media_group_id = None
+    processing_msg = MagicMock(edit_text=AsyncMock(), delete=AsyncMock())
+    message.reply_text = AsyncMock(return_value=processing_msg)
+    message.reply_photo = AsyncMock()
+    message.reply_document = AsyncMock()
+    context = MagicMock()
+    context.bot.get_file = AsyncMock()
+    return update, context, processing_msg
+
+
+@pytest.mark.asyncio
+async def test_handle_photo_uses_result_cache(monkeypatch):
+    from lct_dendrology.bot import bot
+    from lct_dendrology.bot.result_cache import ResultCache
+
+    cache = ResultCache()
+    cache.put(ResultCache.make_key("unique-1", "v2"), {
+        "result": {"analysis_result": {"inference_enabled": True, "detections": [{"id": 1, "species": "oak"}]}},
+        "photo_file_id": "photo-file-id",
+        "document_file_id": "report-file-id",
+    })
+    monkeypatch.setattr(bot, "result_cache", cache)
+    monkeypatch.setattr(bot, "get_processor_info", AsyncMock(return_value={"model_version": "v2"}))
+    send = AsyncMock()
+    monkeypatch.setattr(bot, "send_image_to_server", send)
+
+    mock_update, mock_context, processing_msg = make_cached_photo_update("unique-1")
+    mock_message = mock_update.effective_message
+
+    await bot.handle_photo(mock_update, mock_context)
+
+    send.assert_not_awaited()
+    mock_context.bot.get_file.assert_not_awaited()
+    assert mock_message.reply_photo.call_args.kwargs["photo"] == "photo-file-id"
+    assert mock_message.reply_document.call_args.kwargs["document"] == "report-file-id"
+    assert "Oak" in mock_message.reply_photo.call_args.kwargs["caption"]
+    processing_msg.delete.assert_awaited_once()
+
+
+
+@pytest.mark.asyncio
+async def test_result_cache_works_while_backend_is_down(monkeypatch):
+    from lct_dendrology.bot import bot
+    from lct_dendrology.bot.result_cache import ResultCache
+
+    cache = ResultCache()
+    cache.put(ResultCache.make_key("unique-1", "v2"), {
+        "result": {"analysis_result": {"inference_enabled": True, "detections": [{"id": 1, "species": "oak"}]}},
+        "photo_file_id": "photo-file-id",
+        "document_file_id": None,
+    })
+    monkeypatch.setattr(bot, "result_cache", cache)
+    get_json = AsyncMock(side_effect=[{"model_version": "v2"}, RuntimeError("backend down")])
+    monkeypatch.setattr(bot.backend_client, "get_json", get_json)
+    monkeypatch.setattr(bot, "_processor_info_cache", {'value': None, 'expires': 0.0, 'model_version': None})
+    monkeypatch.setattr(bot.settings, "bot_processor_info_ttl", 0.0)
+    send = AsyncMock()
+    monkeypatch.setattr(bot, "send_image_to_server", send)
+
+    assert await bot.get_model_version() == "v2"
+    # /processor-info недоступен: используется последняя известная версия моделей
+    mock_update, mock_context, processing_msg = make_cached_photo_update("unique-1")
+    await bot.handle_photo(mock_update, mock_context)
+
+    assert get_json.await_count == 2
+    send.assert_not_awaited()
+    assert mock_update.effective_message.reply_photo.call_args.kwargs["photo"] == "photo-file-id"
+    processing_msg.edit_text.assert_not_awaited()
+
+
+@pytest.mark.parametrize("model_info, cached", [
+    ({"quality_tier": 0}, True),
+    ({"quality_tier": 1, "quality_tier_name": "reduced_detector_input"}, False),
+    ({"status": "skipped", "message": "На изображении не обнаружена растительность"}, False),
+    ({"quality_tier": 0, "partial": True}, False),
+])
+def test_only_complete_replies_are_cached(monkeypatch, model_info, cached):
+    from lct_dendrology.bot import bot
+    from lct_dendrology.bot.result_cache import ResultCache
+
+    cache = ResultCache()
+    monkeypatch.setattr(bot, "result_cache", cache)
+    result = {"analysis_result": {"model_version": "v2", "detections": [], "model_info": model_info}}
+    photo_message = MagicMock(photo=[MagicMock(file_id="photo-file-id")])
+
+    bot.cache_reply("unique-1", result, photo_message, None)
+
+    # Ответ пониженного качества не должен выдаваться из кэша как обычный
+    assert (cache.get(ResultCache.make_key("unique-1", "v2")) is not None) == cached
+
+
+def make_album_update(message_id, image_bytes):
+    update = MagicMock()
+    message = update.effective_message
+    message.message_id = message_id
+    message.media_group_id = "album-1"
+    message.photo = [MagicMock(width=800, height=600, file_id=f"file-{message_id}")]
+    message.reply_text = AsyncMock(return_value=MagicMock(edit_text=AsyncMock(), delete=AsyncMock()))
+    message.reply_media_group = AsyncMock()
+    message.reply_document = AsyncMock()
+    update.effective_user.id = 7
+    return update
+
+
+@pytest.mark.asyncio
+async def test_album_is_processed_with_one_request(monkeypatch):
+    import asyncio
+    from lct_dendrology.bot import bot
+    from .test_utils import create_test_image
+
+    image_bytes, _ = create_test_image()
+    bbox = {"x1": 10, "y1": 10, "x2": 50, "y2": 50}
+    results = [
+        {"analysis_result": {"inference_enabled": True, "detections": [{"id": 1, "species": "oak", "bbox": bbox}]}},
+        {"analysis_result": {"inference_enabled": True, "detections": []}},
+    ]
+    send_batch = AsyncMock(return_value=results)
+    monkeypatch.setattr(bot, "send_images_to_server", send_batch)
+    monkeypatch.setattr(bot, "get_backend_input_size", AsyncMock(return_value=640))
+    monkeypatch.setattr(bot.settings, "bot_album_window", 0.05)
+    context = MagicMock()
+    context.bot.get_file = AsyncMock(return_value=MagicMock(download_as_bytearray=AsyncMock(return_value=image_bytes)))
+
+    first, second = make_album_update(2, image_bytes), make_album_update(1, image_bytes)
+    await asyncio.gather(bot.handle_photo(first, context), bot.handle_photo(second, context))
+
+    send_batch.assert_awaited_once()
+    assert [name for _, name in send_batch.call_args[0][0]] == ["photo_file-1.jpg", "photo_file-2.jpg"]
+    # Ответ - в ветке первого по порядку сообщения альбома
+    reply_to = second.effective_message
+    media = reply_to.reply_media_group.call_args.kwargs["media"]
+    assert len(media) == 2
+    text = media[0].caption
+    assert "Фото 1:\n1. Oak" in text and "Фото 2:\nОбъекты не обнаружены." in text
+    assert reply_to.reply_document.call_args.kwargs["filename"] == "analysis.xlsx"
+    first.effective_message.reply_text.assert_not_awaited()
+    assert bot._pending_albums == {}
+
+
+@pytest.mark.asyncio
+async def test_album_request_uses_interactive_lane(monkeypatch):
+    from contextlib import asynccontextmanager
+    from lct_dendrology.bot import bot
+
+    sent = {}
+
+    @asynccontextmanager
+    async def post_files(path, files, headers=None, deadline=None):
+        sent['headers'] = headers
+        yield MagicMock(status=200, json=AsyncMock(return_value={'results': []}))
+
+    monkeypatch.setattr(bot.backend_client, "post_files", post_files)
+    assert await bot.send_images_to_server([(b"image", "a.jpg")], client_id="7") == []
+    assert sent['headers'][bot.PRIORITY_HEADER] == "interactive"
 
 
 if __name__ == "__main__":
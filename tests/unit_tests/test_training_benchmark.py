@@ -0,0 +1,70 @@
+"""Юнит-тесты для функций оценки моделей."""
+
+import pytest
+
+from lct_dendrology.training.benchmark import (
+    EvalSample,
+    evaluate_predictions,
+    latency_stats,
+    load_crop_labels,
+    load_eval_set,
+    match_boxes,
+    pareto_front,
+    percentile,
+)
+from .test_utils import create_test_image
+
+
+def det(x1, y1, x2, y2, confidence=0.9, species=None):
+    return {'bbox': {'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2}, 'confidence': confidence, 'species': species}
+
+
+def test_load_eval_set(tmp_path):
+    images, labels, crops = tmp_path / "images", tmp_path / "labels", tmp_path / "crops"
+    for directory in (images, labels, crops / "oak", crops / "unknown"):
+        directory.mkdir(parents=True)
+    image_bytes, _ = create_test_image(200, 100)
+    (images / "a.jpg").write_bytes(image_bytes)
+    (images / "b.jpg").write_bytes(image_bytes)  # без разметки - пропускается
+    (labels / "a.txt").write_text("0 0.5 0.5 0.5 0.5\n0 0.25 0.25 0.1 0.1\n")
+    (crops / "oak" / "a_obj0.jpg").write_bytes(b"")
+    (crops / "unknown" / "a_obj1.jpg").write_bytes(b"")
+
+    assert load_crop_labels(str(crops)) == {("a", 0): "oak", ("a", 1): "unknown"}
+    samples = load_eval_set(str(images), str(labels), str(crops))
+    assert len(samples) == 1
+    assert samples[0].boxes[0] == pytest.approx((50, 25, 150, 75))
+    assert samples[0].species == ["oak", None]
+
+
+def test_match_boxes_is_one_to_one():
+    gt = [(0, 0, 10, 10)]
+    assert match_boxes([(0, 0, 10, 10), (1, 1, 10, 10)], gt) == [(0, 0)]
+    assert match_boxes([(20, 20, 30, 30)], gt) == []
+
+
+def test_evaluate_predictions():
+    samples = [EvalSample("a.jpg", [(0, 0, 10, 10), (20, 20, 30, 30)], ["oak", None])]
+    predictions = [[det(0, 0, 10, 10, species="oak"), det(50, 50, 60, 60, 0.5)]]
+    metrics = evaluate_predictions(samples, predictions)
+    assert metrics['precision'] == 0.5
+    assert metrics['recall'] == 0.5
+    assert metrics['species_accuracy'] == 1.0
+    assert metrics['species_evaluated'] == 1
+
+
+def test_latency_stats():
+    assert percentile([1, 2, 3, 4], 50) == 2.5
+    stats = latency_stats([0.1, 0.1, 0.2, 0.2])
+    assert stats['mean_ms'] == pytest.approx(150)
+    assert stats['throughput'] == pytest.approx(4 / 0.6)
+
+
+def test_pareto_front():
+    rows = [
+        {'name': 'n', 'p50_ms': 10, 'accuracy': 0.7},
+        {'name': 's', 'p50_ms': 20, 'accuracy': 0.8},
+        {'name': 'slow', 'p50_ms': 30, 'accuracy': 0.75},
+        {'name': 'none', 'p50_ms': 5, 'accuracy': None},
+    ]
+    assert [row['name'] for row in pareto_front(rows, 'p50_ms', 'accuracy')] == ['n', 's']
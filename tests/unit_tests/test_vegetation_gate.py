@@ -0,0 +1,103 @@
+"""Юнит-тесты для фильтра изображений без растительности."""
+
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock, patch
+
+from PIL import Image
+
+from lct_dendrology.inference.vegetation_gate import VegetationGate
+from .test_utils import create_test_image
+
+
+def make_image_bytes(color, width=200, height=200):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), color).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+class TestVegetationGate:
+    def test_green_image_passes(self):
+        gate = VegetationGate(threshold=0.2)
+        result = gate.check(make_image_bytes((40, 140, 40)))
+        assert result['skip'] is False
+        assert result['heuristic_score'] == 1.0
+        assert result['model_score'] is None
+
+    def test_autumn_tree_passes(self):
+        # Оранжевая крона и коричневый ствол на голубом небе, без зеленого цвета
+        image = Image.new('RGB', (200, 200), (135, 206, 235))
+        image.paste((200, 120, 30), (50, 20, 150, 110))
+        image.paste((101, 67, 33), (90, 110, 110, 200))
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG')
+        gate = VegetationGate(threshold=0.2)
+        result = gate.check(buffer.getvalue())
+        assert result['skip'] is False
+        assert result['heuristic_score'] == 1.0
+
+    def test_skin_tone_is_not_vegetation(self):
+        gate = VegetationGate(threshold=0.2)
+        assert gate.check(make_image_bytes((230, 190, 160)))['heuristic_score'] == 0.0
+
+    def test_document_like_image_skipped(self):
+        gate = VegetationGate(threshold=0.2)
+        result = gate.check(make_image_bytes('white'))
+        assert result['skip'] is True
+        assert result['vegetation_score'] == 0.0
+
+    def test_thumbnail_size(self):
+        gate = VegetationGate(thumbnail_size=64)
+        image_bytes, _ = create_test_image(width=1000, height=500)
+        assert max(gate.make_thumbnail(image_bytes).size) <= 64
+
+    def test_model_overrides_heuristics(self):
+        classifier = Mock()
+        classifier.predict.return_value = {'class_id': 1, 'class_name': 'trees', 'confidence': 0.9}
+        with patch('lct_dendrology.inference.yolo_classifier.YoloClassifier', return_value=classifier):
+            gate = VegetationGate(model_path='gate.pt', threshold=0.2)
+        result = gate.check(make_image_bytes('white'))
+        assert result['model_score'] == 0.9
+        assert result['skip'] is False
+
+    def test_model_negative_class(self):
+        classifier = Mock()
+        classifier.predict.return_value = {'class_id': 0, 'class_name': 'no_trees', 'confidence': 0.95}
+        with patch('lct_dendrology.inference.yolo_classifier.YoloClassifier', return_value=classifier):
+            gate = VegetationGate(model_path='gate.pt', threshold=0.2)
+        result = gate.check(make_image_bytes('white'))
+        assert abs(result['model_score'] - 0.05) < 1e-9
+        assert result['skip'] is True
+
+    def test_model_replicas_are_not_shared_between_threads(self):
+        active = set()
+        overlaps = []
+        lock = threading.Lock()
+
+        def make_classifier(**kwargs):
+            classifier = Mock()
+
+            def predict(thumbnail):
+                with lock:
+                    overlaps.append(id(classifier) in active)
+                    active.add(id(classifier))
+                time.sleep(0.01)
+                with lock:
+                    active.discard(id(classifier))
+                return {'class_id': 1, 'class_name': 'trees', 'confidence': 0.9}
+
+            classifier.predict.side_effect = predict
+            return classifier
+
+        with patch('lct_dendrology.inference.yolo_classifier.YoloClassifier', side_effect=make_classifier) as cls:
+            gate = VegetationGate(model_path='gate.pt', pool_size=3)
+        assert cls.call_count == 3
+        image_bytes = make_image_bytes('white')
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            results = list(executor.map(lambda _: gate.check(image_bytes), range(12)))
+        # Каждая реплика в любой момент используется не более чем одним потоком
+        assert not any(overlaps)
+        assert all(result['model_score'] == 0.9 for result in results)
+        assert gate.classifier.get_stats()['checkouts'] == 12
@@ -0,0 +1,166 @@
+"""Юнит-тесты для приема обновлений Telegram через webhook."""
+
+import asyncio
+import socket
+from unittest.mock import Mock
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+from lct_dendrology.bot.backend_client import BackendClient
+from lct_dendrology.bot.webhook import (
+    SECRET_TOKEN_HEADER,
+    DedupStore,
+    MemoryDedupStore,
+    create_dedup_store,
+    create_webhook_app,
+)
+
+
+def make_update(update_id: int, user_id: int = 42) -> dict:
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': 1,
+            'date': 0,
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': 'user'},
+            'text': '/start',
+        },
+    }
+
+
+def make_application():
+    application = Mock()
+    application.bot = None
+    application.update_queue = asyncio.Queue()
+    return application
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def start_app(app, port: int = 0):
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", port)
+    await site.start()
+    return runner, f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+
+@pytest.mark.asyncio
+async def test_memory_dedup_store_expires():
+    store = MemoryDedupStore(ttl=0.05)
+    assert await store.add(1) is True
+    assert await store.add(1) is False
+    await asyncio.sleep(0.06)
+    assert await store.add(1) is True
+
+
+def test_create_dedup_store():
+    assert isinstance(create_dedup_store(None), MemoryDedupStore)
+    with pytest.raises(ValueError):
+        create_dedup_store("memcached://localhost")
+
+
+def test_redis_dedup_store_without_package_points_to_extra(monkeypatch):
+    import sys
+
+    # None в sys.modules заставляет import redis завершиться ImportError
+    monkeypatch.setitem(sys.modules, "redis", None)
+    monkeypatch.setitem(sys.modules, "redis.asyncio", None)
+    with pytest.raises(RuntimeError, match=r"lct-dendrology\[redis\]"):
+        create_dedup_store("redis://localhost:6379/0")
+
+
+def test_incomplete_dedup_store_cannot_be_created():
+    class IncompleteStore(DedupStore):
+        pass
+
+    with pytest.raises(TypeError):
+        IncompleteStore()
+
+
+@pytest.mark.asyncio
+async def test_webhook_enqueues_each_update_once():
+    application = make_application()
+    app = create_webhook_app(application, "/hook", secret_token="secret")
+    runner, url = await start_app(app)
+    headers = {SECRET_TOKEN_HEADER: "secret"}
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.post(f"{url}/hook", json=make_update(1)) as response:
+                assert response.status == 403
+            # Повтор доставки того же обновления передается боту один раз
+            for update_id in (1, 1, 2):
+                async with session.post(f"{url}/hook", json=make_update(update_id), headers=headers) as response:
+                    assert response.status == 200
+            async with session.post(f"{url}/hook", data=b"not json", headers=headers) as response:
+                assert response.status == 400
+            async with session.get(f"{url}/health") as response:
+                health = await response.json()
+        assert [application.update_queue.get_nowait().update_id for _ in range(2)] == [1, 2]
+        assert application.update_queue.empty()
+        assert health['received'] == 2
+        assert health['duplicates'] == 1
+        assert health['rejected'] == 1
+    finally:
+        await runner.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_health_reports_backend_stats_at_runtime():
+    backend_client = BackendClient(["http://backend-1:8000", "http://backend-2:8000"])
+    app = create_webhook_app(
+        make_application(), "/hook", health_stats=lambda: {'backend': backend_client.get_stats()}
+    )
+    runner, url = await start_app(app)
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"{url}/health") as response:
+                before = await response.json()
+            # Метрики читаются при каждом запросе, а не только при остановке клиента
+            backend_client.backends[1].eject()
+            backend_client.backends[0].record_failure()
+            async with session.get(f"{url}/health") as response:
+                after = await response.json()
+        assert before['status'] == 'ok'
+        assert [backend['healthy'] for backend in before['backend']['backends']] == [True, True]
+        assert [backend['healthy'] for backend in after['backend']['backends']] == [True, False]
+        assert after['backend']['backends'][0]['errors'] == 1
+    finally:
+        await runner.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_updates_are_routed_to_owner_instance():
+    urls = [f"http://127.0.0.1:{free_port()}" for _ in range(2)]
+    applications = [make_application(), make_application()]
+    runners = []
+    try:
+        for application, url in zip(applications, urls):
+            app = create_webhook_app(application, "/hook", secret_token="secret", peers=urls, self_url=url)
+            runners.append((await start_app(app, int(url.rsplit(":", 1)[1])))[0])
+        headers = {SECRET_TOKEN_HEADER: "secret"}
+        async with aiohttp.ClientSession() as session:
+            # Прокси раздает обновления по кругу, но каждый пользователь обрабатывается одним экземпляром
+            for update_id, user_id in enumerate([10, 11, 10, 11, 10], start=1):
+                url = urls[update_id % 2]
+                async with session.post(f"{url}/hook", json=make_update(update_id, user_id), headers=headers) as response:
+                    assert response.status == 200
+            # Повтор доставки через другой экземпляр тоже приходит владельцу и отсеивается
+            async with session.post(f"{urls[1]}/hook", json=make_update(1, 10), headers=headers) as response:
+                assert response.status == 200
+        received = [[application.update_queue.get_nowait().effective_user.id
+                     for _ in range(application.update_queue.qsize())] for application in applications]
+        assert received == [[10, 10, 10], [11, 11]]
+    finally:
+        for runner in runners:
+            await runner.cleanup()
+
+    with pytest.raises(ValueError):
+        create_webhook_app(make_application(), "/hook", peers=urls, self_url="http://other:8081")
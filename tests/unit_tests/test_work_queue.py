@@ -0,0 +1,95 @@
+"""Юнит-тесты для очереди обработки фото в боте."""
+
+import asyncio
+
+import pytest
+
+from lct_dendrology.bot.work_queue import QueueOverflow, WorkQueue
+
+
+async def hold(queue, user_id, release, log, positions=None):
+    async def on_position(position):
+        if positions is not None:
+            positions.append(position)
+
+    async with queue.slot(user_id, on_position=on_position):
+        log.append(user_id)
+        await release.wait()
+
+
+@pytest.mark.asyncio
+async def test_global_and_per_user_limits():
+    queue = WorkQueue(max_concurrent=2, max_per_user=1)
+    release = asyncio.Event()
+    log, positions = [], []
+    tasks = [
+        asyncio.create_task(hold(queue, "a", release, log)),
+        asyncio.create_task(hold(queue, "a", release, log, positions)),
+        asyncio.create_task(hold(queue, "b", release, log)),
+    ]
+    await asyncio.sleep(0.01)
+    # Второе фото пользователя a ждет, фото пользователя b проходит мимо него
+    assert log == ["a", "b"]
+    assert queue.get_stats()["running"] == 2 and queue.queued == 1
+    assert positions == [1]
+    release.set()
+    await asyncio.gather(*tasks)
+    assert log == ["a", "b", "a"]
+    assert queue.get_stats()["completed"] == 3
+
+
+@pytest.mark.asyncio
+async def test_overflow_reject():
+    queue = WorkQueue(max_concurrent=1, max_queued=1)
+    release = asyncio.Event()
+    log = []
+    tasks = [asyncio.create_task(hold(queue, user, release, log)) for user in ("a", "b")]
+    await asyncio.sleep(0.01)
+    with pytest.raises(QueueOverflow):
+        async with queue.slot("c"):
+            pass
+    release.set()
+    await asyncio.gather(*tasks)
+    assert log == ["a", "b"]
+    assert queue.get_stats()["rejected"] == 1
+
+
+@pytest.mark.asyncio
+async def test_overflow_drop_oldest():
+    queue = WorkQueue(max_concurrent=1, max_queued=1, overflow="drop_oldest")
+    release = asyncio.Event()
+    log = []
+    running = asyncio.create_task(hold(queue, "a", release, log))
+    await asyncio.sleep(0.01)
+    oldest = asyncio.create_task(hold(queue, "b", release, log))
+    await asyncio.sleep(0.01)
+    newest = asyncio.create_task(hold(queue, "c", release, log))
+    await asyncio.sleep(0.01)
+    with pytest.raises(QueueOverflow):
+        await oldest
+    release.set()
+    await asyncio.gather(running, newest)
+    assert log == ["a", "c"]
+    assert queue.get_stats()["dropped"] == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_leaves_queue():
+    queue = WorkQueue(max_concurrent=1)
+    release = asyncio.Event()
+    log = []
+    running = asyncio.create_task(hold(queue, "a", release, log))
+    await asyncio.sleep(0.01)
+    waiting = asyncio.create_task(hold(queue, "b", release, log))
+    await asyncio.sleep(0.01)
+    waiting.cancel()
+    await asyncio.sleep(0.01)
+    assert queue.queued == 0
+    release.set()
+    await running
+    assert queue.get_stats()["running"] == 0
+
+
+def test_unknown_overflow_policy():
+    with pytest.raises(ValueError):
+        WorkQueue(overflow="drop_newest")
@@ -7,6 +7,7 @@ import io
 from unittest.mock import Mock, patch, MagicMock
 
 from lct_dendrology.inference import YoloDetector
+from lct_dendrology.inference.yolo_detector import RAW_IOU_THRESHOLD, apply_thresholds, nms
 from .test_utils import create_test_image
 
 
@@ -157,6 +158,15 @@ class TestYoloDetector:
         assert info['iou_threshold'] == 0.45
         assert info['model_loaded'] is True
     
+    def test_get_train_imgsz(self, yolo_detector):
+        """Тест размера входа, с которым обучалась модель."""
+        yolo_detector._model.overrides = {'imgsz': 640}
+        assert yolo_detector.get_model_info()['imgsz'] == 640
+        yolo_detector._model.overrides = {'imgsz': [480, 640]}
+        assert yolo_detector.get_train_imgsz() == 640
+        yolo_detector._model.overrides = {}
+        assert yolo_detector.get_train_imgsz() is None
+    
     def test_update_thresholds(self, yolo_detector):
         """Тест обновления порогов."""
         yolo_detector.update_thresholds(confidence=0.7, iou=0.3)
@@ -190,6 +200,69 @@ class TestYoloDetector:
         with pytest.raises(RuntimeError, match="Ошибка инференса"):
             yolo_detector.predict(image)
     
+    def test_predict_raw_does_not_filter(self, yolo_detector, mock_yolo_model):
+        """Тест сырого предсказания без порогов пользователя."""
+        raw = yolo_detector.predict_raw(Image.new('RGB', (100, 100)))
+        call_kwargs = mock_yolo_model.call_args.kwargs
+        assert call_kwargs['iou'] == RAW_IOU_THRESHOLD
+        assert call_kwargs['conf'] < yolo_detector.confidence_threshold
+        assert raw['boxes'].shape == (1, 4)
+        assert raw['names'] == {0: 'person'}
+
+    def test_raw_predictions_match_predict_on_dense_image(self):
+        """Тест: на плотном снимке фильтрация сырых предсказаний совпадает с обычным предсказанием."""
+        rng = np.random.default_rng(0)
+        # 225 объектов в сетке, у каждого 5 почти совпадающих боксов (как от соседних якорей)
+        centers = np.array([(20 + 40 * i, 20 + 40 * j) for i in range(15) for j in range(15)], dtype=float)
+        object_conf = rng.uniform(0.3, 0.95, len(centers))
+        boxes, confidences = [], []
+        for (cx, cy), conf in zip(centers, object_conf):
+            for k in range(5):
+                boxes.append([cx - 15 + k * 0.2, cy - 15, cx + 15 + k * 0.2, cy + 15])
+                confidences.append(conf - k * 0.01)
+        boxes, confidences = np.array(boxes), np.array(confidences)
+
+        def fake_model(image, conf, iou, max_det=300, **kwargs):
+            # Постобработка как в ultralytics: порог уверенности, NMS, затем лимит детекций
+            mask = confidences >= conf
+            keep = nms(boxes[mask], confidences[mask], iou)[:max_det]
+            result = Mock()
+            for attr, value in (('xyxy', boxes[mask][keep]), ('conf', confidences[mask][keep]),
+                                ('cls', np.zeros(len(keep)))):
+                getattr(result.boxes, attr).cpu.return_value.numpy.return_value = value
+            result.names = {0: 'tree'}
+            return [result]
+
+        with patch('lct_dendrology.inference.yolo_detector.YOLO', return_value=fake_model):
+            detector = YoloDetector(confidence_threshold=0.25, iou_threshold=0.45)
+        image = Image.new('RGB', (600, 600))
+        expected = detector.predict(image)['detections']
+        detections = apply_thresholds(detector.predict_raw(image), 0.25, 0.45)
+        assert len(expected) == len(centers)
+        assert detections == expected
+
+    def test_nms(self):
+        """Тест подавления немаксимумов."""
+        boxes = np.array([[0, 0, 10, 10], [1, 1, 10, 10], [20, 20, 30, 30]], dtype=float)
+        scores = np.array([0.6, 0.9, 0.5])
+        assert list(nms(boxes, scores, 0.5)) == [1, 2]
+        assert list(nms(boxes, scores, 0.9)) == [1, 0, 2]
+
+    def test_apply_thresholds(self):
+        """Тест повторной фильтрации сырых предсказаний с разными порогами."""
+        raw = {
+            'boxes': np.array([[0, 0, 10, 10], [1, 1, 10, 10], [20, 20, 30, 30], [0, 0, 10, 10]], dtype=float),
+            'confidences': np.array([0.6, 0.9, 0.3, 0.7]),
+            'class_ids': np.array([0, 0, 0, 1]),
+            'names': {0: 'tree', 1: 'bush'},
+        }
+        detections = apply_thresholds(raw, 0.5, 0.5)
+        # Боксы разных классов не подавляют друг друга
+        assert [(d['class_name'], d['confidence']) for d in detections] == [('tree', 0.9), ('bush', 0.7)]
+        assert [d['id'] for d in detections] == [1, 2]
+        assert len(apply_thresholds(raw, 0.2, 0.95)) == 4
+        assert apply_thresholds(raw, 0.95, 0.5) == []
+
     def test_detection_structure(self, yolo_detector):
         """Тест структуры детекции."""
         image = Image.new('RGB', (100, 100), 'blue')